@@ -1,10 +1,13 @@
-from database import get_row
+from database import get_row, scoped_user
 import config
 
 
 def get_api_key(user_id: int) -> str:
     """Resolve the OpenAI API key: prefer user's own key, fall back to system key."""
-    row = get_row("users", user_id)
-    if row and row["data"].get("openai_api_key"):
-        return row["data"]["openai_api_key"]
+    user = scoped_user(user_id)
+    if user is None:
+        row = get_row("users", user_id)
+        user = row["data"] if row else {}
+    if user.get("openai_api_key"):
+        return user["openai_api_key"]
     return config.OPENAI_API_KEY
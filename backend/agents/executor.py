@@ -0,0 +1,164 @@
+"""Dedicated worker pool for agent turns, with admission control.
+
+A turn holds a thread for tens of seconds across several LLM calls. Running
+turns on the default executor let a burst of chats starve everything else
+that uses it (asyncio.to_thread, sync endpoints' dependencies), so turns get
+their own AGENT_WORKERS threads instead.
+
+When every worker is busy a turn waits in a priority queue: interactive
+turns (web chat, Discord DMs) are started before background ones (test and
+scheduled runs), first come first served within a priority. Each waiter has
+a deadline (AGENT_QUEUE_TIMEOUT_S, AGENT_BACKGROUND_TIMEOUT_S). At most
+AGENT_QUEUE_MAX turns wait; past that, or once a deadline passes, the turn is
+refused with a 429 and a Retry-After estimate.
+
+Slots are handed out on the event loop and returned when the thread
+finishes, so a caller that goes away doesn't free a worker that is still busy.
+"""
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from config import AGENT_WORKERS, AGENT_QUEUE_MAX, AGENT_QUEUE_TIMEOUT_S, AGENT_BACKGROUND_TIMEOUT_S
+
+PRIORITIES = {"interactive": 0, "background": 1}
+_TIMEOUTS = {"interactive": AGENT_QUEUE_TIMEOUT_S, "background": AGENT_BACKGROUND_TIMEOUT_S}
+
+_agent_executor = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix="agent")
+_waiters: list[tuple[int, int, asyncio.Future]] = []  # heap of (priority, seq, slot future)
+_seq = itertools.count()
+_running = 0
+_stats = {
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "timed_out": 0,
+    "waiting_max": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "run_ms_total": 0.0,
+    "by_priority": {p: {"started": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0} for p in PRIORITIES},
+}
+
+
+def _waiting() -> int:
+    return sum(1 for _, _, f in _waiters if not f.done())
+
+
+def _retry_after_seconds() -> int:
+    finished = _stats["completed"] + _stats["failed"]
+    run_s = _stats["run_ms_total"] / finished / 1000 if finished else 30
+    return max(1, math.ceil((_waiting() + 1) * run_s / AGENT_WORKERS))
+
+
+def _busy(detail: str) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail,
+                         headers={"Retry-After": str(_retry_after_seconds())})
+
+
+def check_capacity():
+    """Refuse up front (429) when the wait queue is full — for routes that start streaming before the turn runs."""
+    if _running >= AGENT_WORKERS and _waiting() >= AGENT_QUEUE_MAX:
+        _stats["rejected"] += 1
+        raise _busy("The assistant is busy, please retry shortly")
+
+
+def _release():
+    global _running
+    while _waiters:
+        _, _, slot = heapq.heappop(_waiters)
+        if not slot.done():  # skip waiters that timed out or went away
+            slot.set_result(None)  # the slot passes straight to the waiter
+            return
+    _running -= 1
+
+
+async def _acquire(priority: str):
+    global _running
+    if _running < AGENT_WORKERS and not _waiting():
+        _running += 1
+        return
+    if _waiting() >= AGENT_QUEUE_MAX:
+        _stats["rejected"] += 1
+        raise _busy("The assistant is busy, please retry shortly")
+    slot = asyncio.get_running_loop().create_future()
+    heapq.heappush(_waiters, (PRIORITIES[priority], next(_seq), slot))
+    _stats["waiting_max"] = max(_stats["waiting_max"], _waiting())
+    try:
+        await asyncio.wait_for(asyncio.shield(slot), _TIMEOUTS[priority])
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if slot.done() and not slot.cancelled():
+            _release()  # granted just as we gave up — pass it on
+        else:
+            slot.cancel()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        _stats["timed_out"] += 1
+        raise _busy("The assistant is busy, please retry shortly")
+
+
+async def run_agent_job(fn, *args, priority: str = "interactive"):
+    """Run a blocking agent turn on the agent pool. Raises 429 when the queue is full or the wait times out."""
+    queued_at = time.monotonic()
+    await _acquire(priority)
+    started = time.monotonic()
+    waited_ms = (started - queued_at) * 1000
+    _stats["wait_ms_total"] += waited_ms
+    _stats["wait_ms_max"] = max(_stats["wait_ms_max"], waited_ms)
+    by_priority = _stats["by_priority"][priority]
+    by_priority["started"] += 1
+    by_priority["wait_ms_total"] += waited_ms
+    by_priority["wait_ms_max"] = max(by_priority["wait_ms_max"], waited_ms)
+
+    def done(f):
+        _stats["completed" if not f.cancelled() and f.exception() is None else "failed"] += 1
+        _stats["run_ms_total"] += (time.monotonic() - started) * 1000
+        _release()
+
+    def thread_done(f):
+        # Fires when the worker thread is finished with the job (or it was
+        # cancelled before starting) — not when the awaiting caller goes away
+        try:
+            loop.call_soon_threadsafe(done, f)
+        except RuntimeError:
+            pass  # loop closed at shutdown
+
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    job = _agent_executor.submit(functools.partial(ctx.run, fn, *args))
+    job.add_done_callback(thread_done)
+    return await asyncio.wrap_future(job)
+
+
+def agent_executor_stats() -> dict:
+    """Snapshot of agent pool counters for the admin metrics endpoint."""
+    finished = _stats["completed"] + _stats["failed"]
+    started = sum(p["started"] for p in _stats["by_priority"].values())
+    return {
+        "workers": AGENT_WORKERS,
+        "queue_max": AGENT_QUEUE_MAX,
+        "running": _running,
+        "waiting": _waiting(),
+        **{k: v for k, v in _stats.items() if k != "by_priority"},
+        "wait_ms_total": round(_stats["wait_ms_total"], 2),
+        "wait_ms_max": round(_stats["wait_ms_max"], 2),
+        "run_ms_total": round(_stats["run_ms_total"], 2),
+        "wait_ms_avg": round(_stats["wait_ms_total"] / started, 2) if started else None,
+        "run_ms_avg": round(_stats["run_ms_total"] / finished, 2) if finished else None,
+        "by_priority": {
+            name: {
+                "started": p["started"],
+                "wait_ms_avg": round(p["wait_ms_total"] / p["started"], 2) if p["started"] else None,
+                "wait_ms_max": round(p["wait_ms_max"], 2),
+            }
+            for name, p in _stats["by_priority"].items()
+        },
+    }
@@ -4,12 +4,18 @@ Routes each user message to the correct agent based on who is currently
 active for that user+session. Supports multiple chat sessions per user.
 """
 
-import asyncio
+import threading
+import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from langchain_core.messages import HumanMessage, AIMessage
-from database import insert_row, get_rows, get_db
+from database import insert_row, get_rows, query_all, connection_scope, read_snapshot, user_scope, run_db
+from agents.session_store import SessionStore
+from agents.turn_queue import TurnQueue
+from agents.executor import run_agent_job
+from agents.user_context import load_context
+from agents import get_api_key, handoff, history, pre_router
+from config import HISTORY_KEEP_TURNS, HISTORY_TOKEN_BUDGETS
 from file_logger import logger, log_conversation_turn
 
 from agents.hydrogen import run_hydrogen
@@ -26,9 +32,32 @@ from agents.tools.journal_tools import fetch_recent_journal_entries
 
 
 def _fetch_oldest_todo_date(user_id: int):
-    rows = get_rows("todo_lists", filters={"user_id": user_id}, limit=1, order_desc=False)
+    rows = get_rows("todo_lists", filters={"user_id": user_id}, limit=1, order_desc=False, fields=[])
     return rows[0]["created_at"][:10] if rows else None
 
+# Context every agent prompt draws on, loaded before the first turn of a session
+PREFETCH = {
+    "recent_states":          fetch_recent_states,
+    "life_goals":             fetch_life_goals,
+    "last_weekly_review":     fetch_last_weekly_review,
+    "tasks":                  fetch_tasks,
+    "oldest_todo_date":       _fetch_oldest_todo_date,
+    "recent_journal_entries": fetch_recent_journal_entries,
+}
+
+
+def prefetch_context(user_id: int) -> dict:
+    """Every PREFETCH entry, current as of one consistent snapshot.
+
+    Entries come from the user's shared cache (user_context.py); only those
+    whose tables changed are read again. All reads share the turn's connection
+    inside a single read transaction, so the bundle can't mix data from before
+    and after a concurrent write.
+    """
+    with read_snapshot():
+        return load_context(user_id, PREFETCH)
+
+
 AGENT_RUNNERS = {
     "hydrogen": run_hydrogen,
     "helium": run_helium,
@@ -51,66 +80,44 @@ AGENT_LABELS = {
 
 
 def create_graph_runner():
-    # In-memory state keyed by (user_id, session_id)
-    sessions: dict[tuple[int, str], dict] = {}
-
-    def _get_session(user_id: int, session_id: str) -> dict:
-        key = (user_id, session_id)
-        if key not in sessions:
-            sessions[key] = {
-                "messages": [],
-                "active_agent": None,
-                "context_cache": {},  # {tool_name: {result, timestamp}}
-            }
-        return sessions[key]
-
-    def invalidate_goals_cache(user_id: int):
-        """Clear cached life goals for all in-memory sessions belonging to this user."""
-        for key, session in sessions.items():
-            if key[0] == user_id:
-                session["context_cache"].pop("life_goals", None)
+    # Session state keyed by (user_id, session_id) — bounded, see session_store.py
+    store = SessionStore()
+    # Turns for one session run one at a time, in arrival order
+    turns = TurnQueue()
+    # Token savings from history windowing, summed over all turns
+    history_lock = threading.Lock()
+    history_totals = {"turns": 0, "agent_calls": 0, "tokens_sent": 0, "tokens_saved": 0,
+                      "compactions": 0, "summarized_turns": 0}
 
     def reset(user_id: int, session_id: str = None):
-        if session_id:
-            key = (user_id, session_id)
-            if key in sessions:
-                del sessions[key]
-        else:
-            # Reset all sessions for user
-            to_delete = [k for k in sessions if k[0] == user_id]
-            for k in to_delete:
-                del sessions[k]
+        # No session_id resets all sessions for the user
+        store.drop(user_id, session_id)
         logger.info(f"[user={user_id}] Session(s) reset")
 
     def get_active_agent(user_id: int, session_id: str) -> str | None:
-        key = (user_id, session_id)
-        if key in sessions:
-            return sessions[key].get("active_agent")
-        return None
+        return store.active_agent(user_id, session_id)
 
     def list_sessions(user_id: int) -> list[dict]:
         """List chat sessions for a user from the DB (excludes 'default' which is shown separately in UI)."""
-        conn = get_db()
-        rows = conn.execute("""
-            SELECT json_extract(data, '$.session_id') as sid,
+        rows = query_all("""
+            SELECT session_id as sid,
                    MIN(created_at) as started,
                    MAX(created_at) as last_msg,
                    COUNT(*) as msg_count
             FROM chat_contexts
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.session_id') != 'default'
-              AND json_extract(data, '$.role') != 'session_meta'
-            GROUP BY json_extract(data, '$.session_id')
+            WHERE user_id = ?
+              AND session_id != 'default'
+              AND role != 'session_meta'
+            GROUP BY session_id
             ORDER BY MAX(created_at) DESC
-        """, (user_id,)).fetchall()
-        name_rows = conn.execute("""
-            SELECT json_extract(data, '$.session_id') as sid,
+        """, (user_id,))
+        name_rows = query_all("""
+            SELECT session_id as sid,
                    json_extract(data, '$.name') as name
             FROM chat_contexts
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.role') = 'session_meta'
-        """, (user_id,)).fetchall()
-        conn.close()
+            WHERE user_id = ?
+              AND role = 'session_meta'
+        """, (user_id,))
         names = {r["sid"]: r["name"] for r in name_rows}
         result = []
         for r in rows:
@@ -123,56 +130,51 @@ def create_graph_runner():
             })
         return result
 
-    def _run_core(user_id: int, message: str, session_id: str = "default", on_event=None) -> dict:
-        """Core routing logic. Runs synchronously. on_event is optional callback."""
-        state = _get_session(user_id, session_id)
+    def _run_core(user_id: int, message: str, session_id: str = "default", on_event=None,
+                  user: dict | None = None) -> dict:
+        """Core routing logic. Runs synchronously. on_event is optional callback.
+
+        The turn runs in one DB scope; a connection is only held while a query or
+        transaction runs, never across LLM calls.
+        `user` is the caller's already-loaded user record; agents read the API key
+        and timezone from it instead of the users table.
+        """
+        with connection_scope(), user_scope(user), store.use(user_id, session_id) as state:
+            return _run_turn(user_id, message, session_id, state, on_event)
+
+    def _call_agent(agent_fn, agent: str, user_id: int, state: dict, on_event, usage: dict) -> dict:
+        """Run one agent on the windowed history (summary + recent turns within its token budget)."""
+        messages, tokens = history.window(state, agent)
+        usage["agent_calls"] += 1
+        usage["tokens_sent"] += tokens["sent"]
+        usage["tokens_saved"] += tokens["saved"]
+        return agent_fn(user_id, messages, state["context_cache"], on_event)
+
+    def _refresh_context(user_id: int, state: dict):
+        state["context_cache"].update(prefetch_context(user_id))
+        # Derive has_tasks from pre-fetched tasks (no extra DB call needed)
+        _t = state["context_cache"].get("tasks", {})
+        state["context_cache"]["has_tasks"] = bool(
+            _t.get("one_time_tasks") or _t.get("recurring_tasks")
+        )
+
+    def _run_turn(user_id: int, message: str, session_id: str, state: dict, on_event) -> dict:
         state["messages"].append(HumanMessage(content=message))
+        usage = {"agent_calls": 0, "tokens_sent": 0, "tokens_saved": 0}
 
         active = state["active_agent"] or "hydrogen"
         now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
-        # Parallel pre-fetch: all independent DB reads run concurrently on cold session start
-        _prefetch = {
-            "recent_states":          fetch_recent_states,
-            "life_goals":             fetch_life_goals,
-            "last_weekly_review":     fetch_last_weekly_review,
-            "tasks":                  fetch_tasks,
-            "oldest_todo_date":       _fetch_oldest_todo_date,
-            "recent_journal_entries": fetch_recent_journal_entries,
-        }
-        missing = {k: fn for k, fn in _prefetch.items() if k not in state["context_cache"]}
-        if missing:
-            with ThreadPoolExecutor(max_workers=len(missing)) as _pool:
-                _futures = {k: _pool.submit(fn, user_id) for k, fn in missing.items()}
-                for k, fut in _futures.items():
-                    state["context_cache"][k] = fut.result()
+        # Bring the context up to date: anything written since the last turn
+        # (by this session, another one or the REST API) is re-read
+        _refresh_context(user_id, state)
 
-        # Derive has_tasks from pre-fetched tasks (no extra DB call needed)
-        if "has_tasks" not in state["context_cache"]:
-            _t = state["context_cache"].get("tasks", {})
-            state["context_cache"]["has_tasks"] = bool(
-                _t.get("one_time_tasks") or _t.get("recurring_tasks")
-            )
-
-        # Code-level pre-routing: skip Hydrogen LLM for unambiguous cases
-        if active == "hydrogen" and not state["context_cache"].get("life_goals"):
-            logger.info(f"[user={user_id}|{session_id}] Pre-routing -> helium (no life goals)")
-            active = "helium"
-        elif active == "hydrogen" and state["context_cache"].get("life_goals"):
-            # First human message of the session + state is stale → skip Hydrogen, go to Lithium.
-            # This is exactly what Hydrogen's rule 8 would decide anyway.
-            _recent = state["context_cache"].get("recent_states", [])
-            _state_fresh = False
-            if _recent:
-                try:
-                    _ts = datetime.fromisoformat(_recent[0]["created_at"].replace("Z", "+00:00"))
-                    _state_fresh = (datetime.now(timezone.utc) - _ts).total_seconds() < 14400
-                except Exception:
-                    _state_fresh = bool(_recent)  # unreadable timestamp → assume fresh, don't pre-route
-            _first_msg = sum(1 for m in state["messages"] if isinstance(m, HumanMessage)) == 1
-            if not _state_fresh and _first_msg:
-                logger.info(f"[user={user_id}|{session_id}] Pre-routing -> lithium (stale state, session start)")
-                active = "lithium"
+        # Deterministic pre-routing: skip the Hydrogen LLM when a rule is confident
+        if active == "hydrogen":
+            first_message = sum(1 for m in state["messages"] if isinstance(m, HumanMessage)) == 1
+            decision = pre_router.route(message, {**state["context_cache"], "first_message": first_message},
+                                        f"[user={user_id}|{session_id}]")
+            active = decision.agent or "hydrogen"
 
         logger.info(f"[user={user_id}|{session_id}] >>> Active: {active}")
 
@@ -183,7 +185,7 @@ def create_graph_runner():
                 on_event("agent_start", {"agent": active, "label": AGENT_LABELS[active]})
 
             agent_fn = AGENT_RUNNERS[active]
-            result = agent_fn(user_id, state["messages"], state["context_cache"], on_event)
+            result = _call_agent(agent_fn, active, user_id, state, on_event, usage)
 
             response = result["response"]
             context_log = result["context_log"]
@@ -204,8 +206,8 @@ def create_graph_runner():
                     if on_event:
                         on_event("agent_start", {"agent": hand_off_to, "label": AGENT_LABELS[hand_off_to]})
 
-                    spec_result = AGENT_RUNNERS[hand_off_to](
-                        user_id, state["messages"], state["context_cache"], on_event)
+                    spec_result = _call_agent(AGENT_RUNNERS[hand_off_to], hand_off_to,
+                                              user_id, state, on_event, usage)
                     response = spec_result["response"]
                     context_log = context_log + spec_result["context_log"]
                     spec_hand_off = spec_result.get("hand_off_to")
@@ -215,38 +217,13 @@ def create_graph_runner():
                                           [e for e in spec_result["context_log"] if e.get("type") == "tool_call"])
 
                     if spec_hand_off == "hydrogen":
-                        # Specialist finished and handed back — call Hydrogen to compose the follow-up
-                        state["active_agent"] = None
-                        if response:
-                            state["messages"].append(AIMessage(content=response))
-                        if on_event:
-                            on_event("agent_start", {"agent": "hydrogen", "label": AGENT_LABELS["hydrogen"]})
-                        h_result = run_hydrogen(user_id, state["messages"], state["context_cache"], on_event)
-                        h_response = h_result["response"]
-                        h_hand_off = h_result.get("hand_off_to")
-                        context_log = context_log + h_result["context_log"]
-                        log_conversation_turn(user_id, session_id, "hydrogen", "output",
-                                              h_response,
-                                              [e for e in h_result["context_log"] if e.get("type") == "tool_call"])
-                        if h_hand_off and h_hand_off in SPECIALISTS:
-                            if h_response:
-                                response = response + "\n\n" + h_response
-                                state["messages"].append(AIMessage(content=h_response))
-                            if on_event:
-                                on_event("agent_start", {"agent": h_hand_off, "label": AGENT_LABELS[h_hand_off]})
-                            next_result = AGENT_RUNNERS[h_hand_off](
-                                user_id, state["messages"], state["context_cache"], on_event)
-                            response = (response + "\n\n" if response else "") + next_result["response"]
-                            context_log = context_log + next_result["context_log"]
-                            state["active_agent"] = h_hand_off
-                            log_conversation_turn(user_id, session_id, h_hand_off, "output",
-                                                  next_result["response"])
-                        elif h_response:
-                            response = response + "\n\n" + h_response
+                        # Specialist finished and handed back -> follow-up per the handoff policy
+                        response, context_log = _follow_up(
+                            user_id, session_id, hand_off_to, message, state, response, context_log, on_event, usage)
                     elif spec_hand_off and spec_hand_off in SPECIALISTS and spec_hand_off != hand_off_to:
                         state["active_agent"] = spec_hand_off
                         response, context_log = _chain_to(
-                            user_id, session_id, spec_hand_off, state, response, context_log, on_event)
+                            user_id, session_id, spec_hand_off, state, response, context_log, on_event, usage)
                     else:
                         state["active_agent"] = hand_off_to
                 else:
@@ -258,50 +235,14 @@ def create_graph_runner():
                     state["active_agent"] = active
 
                 elif hand_off_to == "hydrogen":
-                    # Specialist done -> auto-call hydrogen for follow-up
-                    state["active_agent"] = None
-                    logger.info(f"[user={user_id}|{session_id}] {active} finished -> auto-calling hydrogen")
-
-                    if response:
-                        state["messages"].append(AIMessage(content=response))
-
-                    if on_event:
-                        on_event("agent_start", {"agent": "hydrogen", "label": AGENT_LABELS["hydrogen"]})
-
-                    h_result = run_hydrogen(user_id, state["messages"], state["context_cache"], on_event)
-                    h_response = h_result["response"]
-                    h_hand_off = h_result.get("hand_off_to")
-                    context_log = context_log + h_result["context_log"]
-
-                    log_conversation_turn(user_id, session_id, "hydrogen", "output",
-                                          h_response,
-                                          [e for e in h_result["context_log"] if e.get("type") == "tool_call"])
-
-                    if h_hand_off and h_hand_off in SPECIALISTS:
-                        # Hydrogen wants to route to next specialist
-                        if h_response:
-                            response = response + "\n\n" + h_response
-                            state["messages"].append(AIMessage(content=h_response))
-
-                        if on_event:
-                            on_event("agent_start", {"agent": h_hand_off, "label": AGENT_LABELS[h_hand_off]})
-
-                        next_result = AGENT_RUNNERS[h_hand_off](
-                            user_id, state["messages"], state["context_cache"], on_event)
-                        response = (response + "\n\n" if response else "") + next_result["response"]
-                        context_log = context_log + next_result["context_log"]
-                        state["active_agent"] = h_hand_off
-
-                        log_conversation_turn(user_id, session_id, h_hand_off, "output",
-                                              next_result["response"])
-                    elif h_response:
-                        response = response + "\n\n" + h_response
-                    # else hydrogen had nothing to add
+                    # Specialist done -> follow-up per the handoff policy
+                    response, context_log = _follow_up(
+                        user_id, session_id, active, message, state, response, context_log, on_event, usage)
 
                 elif hand_off_to in SPECIALISTS and hand_off_to != active:
                     state["active_agent"] = hand_off_to
                     response, context_log = _chain_to(
-                        user_id, session_id, hand_off_to, state, response, context_log, on_event)
+                        user_id, session_id, hand_off_to, state, response, context_log, on_event, usage)
                 else:
                     state["active_agent"] = active
 
@@ -327,13 +268,21 @@ def create_graph_runner():
                 "agent": state["active_agent"] or "hydrogen",
             })
 
-            logger.info(f"[user={user_id}|{session_id}] <<< Done. Active: {state['active_agent']}")
+            with history_lock:
+                history_totals["turns"] += 1
+                for k in ("agent_calls", "tokens_sent", "tokens_saved"):
+                    history_totals[k] += usage[k]
+
+            logger.info(f"[user={user_id}|{session_id}] <<< Done. Active: {state['active_agent']} "
+                        f"history: sent~{usage['tokens_sent']} saved~{usage['tokens_saved']} tokens "
+                        f"over {usage['agent_calls']} call(s)")
 
             return {
                 "response": response,
                 "context_log": context_log,
                 "active_agent": state["active_agent"] or "hydrogen",
                 "active_agent_label": AGENT_LABELS.get(state["active_agent"] or "hydrogen"),
+                "history": usage,
             }
 
         except Exception as e:
@@ -342,14 +291,65 @@ def create_graph_runner():
                 state["messages"].pop()
             raise
 
-    def _chain_to(user_id, session_id, specialist, state, prev_response, context_log, on_event=None):
+    def _follow_up(user_id, session_id, finished, message, state, response, context_log, on_event, usage):
+        """A specialist handed back to Hydrogen: compose the follow-up. Returns updated (response, context_log).
+
+        Hydrogen is only called when handoff.decide() says it has work to do;
+        otherwise the follow-up is templated (or written by the small model).
+        """
+        state["active_agent"] = None
+        if response:
+            state["messages"].append(AIMessage(content=response))
+        started = time.monotonic()
+        _refresh_context(user_id, state)  # the specialist may have just written goals, tasks or a state
+        path, reason = handoff.decide(finished, message, state["context_cache"])
+        logger.info(f"[user={user_id}|{session_id}] {finished} finished -> follow-up via {path} ({reason})")
+
+        if on_event:
+            on_event("agent_start", {"agent": "hydrogen", "label": AGENT_LABELS["hydrogen"]})
+        if path != "hydrogen":
+            text, path = handoff.compose(path, finished, message, response, state["context_cache"],
+                                         get_api_key(user_id))
+            log_conversation_turn(user_id, session_id, "hydrogen", "output", text)
+            if on_event:
+                on_event("token", {"content": ("\n\n" if response else "") + text, "agent": "hydrogen"})
+            handoff.record(path, reason, (time.monotonic() - started) * 1000)
+            return (response + "\n\n" if response else "") + text, context_log
+
+        h_result = _call_agent(run_hydrogen, "hydrogen", user_id, state, on_event, usage)
+        h_response = h_result["response"]
+        h_hand_off = h_result.get("hand_off_to")
+        context_log = context_log + h_result["context_log"]
+        log_conversation_turn(user_id, session_id, "hydrogen", "output",
+                              h_response,
+                              [e for e in h_result["context_log"] if e.get("type") == "tool_call"])
+
+        if h_hand_off and h_hand_off in SPECIALISTS:
+            # Hydrogen wants to route to next specialist
+            if h_response:
+                response = response + "\n\n" + h_response
+                state["messages"].append(AIMessage(content=h_response))
+            if on_event:
+                on_event("agent_start", {"agent": h_hand_off, "label": AGENT_LABELS[h_hand_off]})
+            next_result = _call_agent(AGENT_RUNNERS[h_hand_off], h_hand_off, user_id, state, on_event, usage)
+            response = (response + "\n\n" if response else "") + next_result["response"]
+            context_log = context_log + next_result["context_log"]
+            state["active_agent"] = h_hand_off
+            log_conversation_turn(user_id, session_id, h_hand_off, "output", next_result["response"])
+        elif h_response:
+            response = response + "\n\n" + h_response
+        # else hydrogen had nothing to add
+        handoff.record("hydrogen", reason, (time.monotonic() - started) * 1000)
+        return response, context_log
+
+    def _chain_to(user_id, session_id, specialist, state, prev_response, context_log, on_event, usage):
         """Call a chained specialist, return updated (response, context_log)."""
         logger.info(f"[user={user_id}|{session_id}] Chaining -> {specialist}")
         if prev_response:
             state["messages"].append(AIMessage(content=prev_response))
         if on_event:
             on_event("agent_start", {"agent": specialist, "label": AGENT_LABELS[specialist]})
-        result = AGENT_RUNNERS[specialist](user_id, state["messages"], state["context_cache"], on_event)
+        result = _call_agent(AGENT_RUNNERS[specialist], specialist, user_id, state, on_event, usage)
         new_response = (prev_response + "\n\n" if prev_response else "") + result["response"]
         new_context = context_log + result["context_log"]
         log_conversation_turn(user_id, session_id, specialist, "output", result["response"])
@@ -360,25 +360,74 @@ def create_graph_runner():
             state["active_agent"] = specialist
         return new_response, new_context
 
-    async def run(user_id: int, message: str, session_id: str = "default") -> dict:
-        """Backward-compatible blocking run (no streaming)."""
-        return _run_core(user_id, message, session_id)
+    async def run(user_id: int, message: str, session_id: str = "default", user: dict | None = None,
+                  priority: str = "interactive") -> dict:
+        """Backward-compatible run (no streaming)."""
+        return await run_stream(user_id, message, session_id, None, user, priority)
 
-    async def run_stream(user_id: int, message: str, session_id: str = "default", on_event=None) -> dict:
-        """Streaming run — executes _run_core in a thread with on_event callback."""
-        return await asyncio.to_thread(_run_core, user_id, message, session_id, on_event)
+    async def run_stream(user_id: int, message: str, session_id: str = "default", on_event=None,
+                         user: dict | None = None, priority: str = "interactive") -> dict:
+        """Streaming run — queued behind the session's other turns, then _run_core on the agent pool.
 
-    def set_active_agent(user_id: int, session_id: str, agent: str):
-        """Pre-set the active agent for a session (e.g., for proactive Discord routing)."""
+        Raises a 429 HTTPException when the agent pool is saturated (see executor.py).
+        """
         key = (user_id, session_id)
-        if key not in sessions:
-            sessions[key] = {"messages": [], "active_agent": None, "context_cache": {}}
-        sessions[key]["active_agent"] = agent if agent in AGENT_RUNNERS else None
+
+        async def turn(text, events):
+            result = await run_agent_job(_run_core, user_id, text, session_id, events, user, priority=priority)
+            # Fold older turns into the rolling summary once enough have built
+            # up — after this response is returned, before the session's next turn
+            state = store.peek(user_id, session_id)
+            if state is not None and history.due(state):
+                turns.defer(key, lambda: _compact_later(user_id, session_id, user))
+            return result
+        return await turns.turn(key, message, turn, on_event)
+
+    def _compact(user_id: int, session_id: str, user: dict | None) -> int:
+        with connection_scope(), user_scope(user), store.use(user_id, session_id) as state:
+            folded = history.compact(state, get_api_key(user_id))
+        with history_lock:
+            history_totals["compactions"] += bool(folded)
+            history_totals["summarized_turns"] += folded
+        return folded
+
+    async def _compact_later(user_id: int, session_id: str, user: dict | None):
+        """history.compact() for a session on the agent pool at background priority."""
+        try:
+            await run_agent_job(_compact, user_id, session_id, user, priority="background")
+        except Exception as e:
+            logger.warning(f"[user={user_id}|{session_id}] History compaction skipped: {e}")
+
+    def _set_active_agent(user_id: int, session_id: str, agent: str):
+        with store.use(user_id, session_id) as state:
+            state["active_agent"] = agent if agent in AGENT_RUNNERS else None
+
+    async def set_active_agent(user_id: int, session_id: str, agent: str):
+        """Pre-set the active agent for a session (e.g., for proactive Discord routing).
+
+        Queued like a turn, so it never lands in the middle of one.
+        """
+        await turns.call((user_id, session_id),
+                         lambda: run_db(_set_active_agent, user_id, session_id, agent))
+
+    def history_stats() -> dict:
+        with history_lock:
+            t = dict(history_totals)
+        sent_full = t["tokens_sent"] + t["tokens_saved"]
+        return {
+            "keep_turns": HISTORY_KEEP_TURNS,
+            "budgets": HISTORY_TOKEN_BUDGETS,
+            **t,
+            "tokens_saved_per_turn": round(t["tokens_saved"] / t["turns"], 1) if t["turns"] else None,
+            "saved_ratio": round(t["tokens_saved"] / sent_full, 3) if sent_full else None,
+        }
 
     run.reset = reset
     run.get_active_agent = get_active_agent
     run.set_active_agent = set_active_agent
     run.list_sessions = list_sessions
     run.run_stream = run_stream
-    run.invalidate_goals_cache = invalidate_goals_cache
+    run.session_stats = store.stats
+    run.turn_stats = turns.stats
+    run.history_stats = history_stats
     return run
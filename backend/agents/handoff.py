@@ -0,0 +1,143 @@
+"""Handoff policy: what happens when a specialist hands back to Hydrogen.
+
+A specialist that calls finish_conversation used to trigger a full Hydrogen
+call on the big model just to write the follow-up — and that follow-up could
+route on to another specialist, so one message could cost four sequential
+LLM rounds. Hydrogen only has real work to do after a handoff when
+  multi_intent — the user's message also asked for another specialist
+                 (pre_router.intents), which Hydrogen must route to
+  veto         — the message was emotional or a negation; Hydrogen answers
+  onboarding   — goals, a recent state or tasks are still missing, so
+                 Hydrogen moves the user to the next setup step
+Otherwise the follow-up is a short per-specialist template, or, with
+HANDOFF_FOLLOWUP_MODEL set, a one-or-two sentence note from that (small)
+model, falling back to the template if the call fails.
+
+decide() is pure. record() keeps per-path latency for the admin metrics.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from config import HANDOFF_FOLLOWUP_MODEL
+from runtime_config import get_agent_model
+from file_logger import logger
+from agents import pre_router
+
+PATHS = ("hydrogen", "template", "small_model")
+
+_TEMPLATES = {
+    "helium": "Your goals are saved. Want me to put together a plan for today?",
+    "lithium": "Thanks for checking in. Want me to put together a plan for today based on how you're feeling?",
+    "beryllium": "Your tasks are up to date. Want me to put together a plan for today, or is there anything else?",
+    "boron": "Your weekly review is saved. Want me to put together a plan for today?",
+    "carbon": "Thanks for reflecting on your day. Anything else before you wrap up?",
+}
+
+_FOLLOWUP_PROMPT = """You are the manager of a life-management assistant. A specialist just finished \
+helping the user. Write the follow-up: one or two short sentences, no greeting, no re-introduction, \
+no health advice. Offer this next step in your own words: "{offer}"
+
+User's last message:
+{message}
+
+Specialist's reply:
+{reply}"""
+
+
+def weekly_review_days(context: dict) -> int | None:
+    """Days since the last weekly review (-1 if there never was one) when one is due, else None.
+
+    Same eligibility as Hydrogen's prompt: the app is 7+ days old and the last
+    review was 7+ days ago.
+    """
+    today = datetime.now(timezone.utc).date()
+    try:
+        oldest = context.get("oldest_todo_date")
+        if not oldest or (today - datetime.fromisoformat(oldest).date()).days < 7:
+            return None
+        last = context.get("last_weekly_review")
+        if not last:
+            return -1
+        days = (today - datetime.fromisoformat(last["created_at"][:10]).date()).days
+        return days if days >= 7 else None
+    except Exception:
+        return None
+
+
+def decide(finished: str, message: str, context: dict) -> tuple[str, str]:
+    """(path, reason) for the follow-up after `finished` handed back on `message`."""
+    wanted = pre_router.intents(message)
+    if "hydrogen" in wanted:
+        return "hydrogen", "veto"
+    if wanted - {finished, "hydrogen"}:
+        return "hydrogen", "multi_intent"
+    if not context.get("life_goals") or not context.get("has_tasks") or pre_router.state_is_stale(context):
+        return "hydrogen", "onboarding"
+    return ("small_model" if HANDOFF_FOLLOWUP_MODEL else "template"), "done"
+
+
+def template(finished: str, context: dict) -> str:
+    text = _TEMPLATES.get(finished, "Anything else I can help with?")
+    days = weekly_review_days(context) if finished != "boron" else None
+    if days == -1:
+        text += " Also, you haven't done a weekly review yet — want to do that now or after your plan?"
+    elif days is not None:
+        text += f" Also, it's been {days} days since your last weekly review — want to do that now or after your plan?"
+    return text
+
+
+def compose(path: str, finished: str, message: str, reply: str, context: dict, api_key: str) -> tuple[str, str]:
+    """Write the follow-up for a non-Hydrogen path. Returns (text, path actually taken)."""
+    offer = template(finished, context)
+    if path == "small_model" and api_key:
+        try:
+            llm = ChatOpenAI(model=HANDOFF_FOLLOWUP_MODEL, api_key=api_key)
+            prompt = _FOLLOWUP_PROMPT.format(offer=offer, message=message, reply=reply)
+            text = llm.invoke([HumanMessage(content=prompt)]).content
+            if text:
+                return text, "small_model"
+        except Exception as e:
+            logger.warning(f"Handoff follow-up model failed, using template: {e}")
+    return offer, "template"
+
+
+_lock = threading.Lock()
+_stats = {
+    "paths": {p: {"count": 0, "ms_total": 0.0, "ms_max": 0.0} for p in PATHS},
+    "reasons": {"veto": 0, "multi_intent": 0, "onboarding": 0, "done": 0},
+    "avoided_calls": {},  # Hydrogen model -> follow-up calls skipped
+}
+
+
+def record(path: str, reason: str, elapsed_ms: float):
+    with _lock:
+        p = _stats["paths"][path]
+        p["count"] += 1
+        p["ms_total"] += elapsed_ms
+        p["ms_max"] = max(p["ms_max"], elapsed_ms)
+        _stats["reasons"][reason] += 1
+        if path != "hydrogen":
+            model = get_agent_model("hydrogen")
+            _stats["avoided_calls"][model] = _stats["avoided_calls"].get(model, 0) + 1
+
+
+def handoff_stats() -> dict:
+    """Snapshot of handoff counters and per-path follow-up latency for the admin metrics endpoint."""
+    with _lock:
+        return {
+            "followup_model": HANDOFF_FOLLOWUP_MODEL or None,
+            "paths": {
+                name: {
+                    "count": p["count"],
+                    "ms_avg": round(p["ms_total"] / p["count"], 2) if p["count"] else None,
+                    "ms_max": round(p["ms_max"], 2),
+                }
+                for name, p in _stats["paths"].items()
+            },
+            "reasons": dict(_stats["reasons"]),
+            "avoided_calls": dict(_stats["avoided_calls"]),
+        }
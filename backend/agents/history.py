@@ -0,0 +1,134 @@
+"""Conversation windowing: what part of a session's history each agent call sees.
+
+Agents used to receive every message of the session on every ReAct
+iteration, so long-lived sessions (default, discord) grew without bound in
+input tokens and latency. Now:
+
+  window()  — per agent call: a rolling summary of earlier turns (if any)
+              plus the recent turns verbatim, newest first until the
+              agent's HISTORY_TOKEN_BUDGETS entry is spent. The current
+              turn is always included.
+  compact() — once more than HISTORY_KEEP_TURNS + HISTORY_COMPACT_TURNS
+              turns are held (due()), the oldest are folded into the
+              summary and dropped from the session, leaving
+              HISTORY_KEEP_TURNS. The summary is written by
+              HISTORY_SUMMARY_MODEL, or extractively when that is unset or
+              the call fails. Compaction runs every few turns, not every
+              turn, and after the turn's response has been returned: the
+              graph queues it behind the turn in the session's TurnQueue,
+              at background priority on the agent pool.
+
+Token counts are estimates (about four characters per token) — enough for
+budgeting and reporting savings, not billing.
+"""
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+
+from config import (
+    HISTORY_KEEP_TURNS, HISTORY_COMPACT_TURNS, HISTORY_TOKEN_BUDGETS, HISTORY_SUMMARY_MODEL,
+    HISTORY_SUMMARY_MAX_TOKENS,
+)
+from file_logger import logger
+
+_SUMMARY_HEADER = "## Earlier in this conversation\n"
+
+_SUMMARY_PROMPT = """You maintain a running summary of a coaching conversation between a user and \
+a life-management assistant. Merge the earlier summary and the new exchanges into one updated summary.
+Keep: facts the user shared about themselves, decisions, commitments, open questions, anything \
+the assistant promised to follow up on. Drop greetings and small talk. Write terse bullet points, \
+at most {max_words} words.
+
+Earlier summary:
+{summary}
+
+New exchanges:
+{exchanges}"""
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _message_tokens(message) -> int:
+    return estimate_tokens(message.content if isinstance(message.content, str) else str(message.content)) + 4
+
+
+def _turn_starts(messages: list) -> list[int]:
+    return [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)] or [0]
+
+
+def window(state: dict, agent: str) -> tuple[list, dict]:
+    """Messages to send `agent` for this call, plus {"sent", "saved"} token estimates."""
+    messages = state["messages"]
+    budget = HISTORY_TOKEN_BUDGETS.get(agent, HISTORY_TOKEN_BUDGETS["default"])
+    summary = state.get("history_summary")
+    prefix = [SystemMessage(content=_SUMMARY_HEADER + summary)] if summary else []
+    sent = sum(_message_tokens(m) for m in prefix)
+
+    starts = _turn_starts(messages)
+    first = len(messages)
+    for start in reversed(starts):
+        cost = sum(_message_tokens(m) for m in messages[start:first])
+        if first < len(messages) and sent + cost > budget:
+            break  # the current turn always goes in, older ones only while they fit
+        sent += cost
+        first = start
+    # What the whole history, compacted turns included, would have cost
+    full = state.get("compacted_tokens", 0) + sum(_message_tokens(m) for m in messages)
+    return prefix + messages[first:], {"sent": sent, "saved": max(full - sent, 0)}
+
+
+def _exchanges_text(messages: list) -> str:
+    lines = []
+    for m in messages:
+        who = "User" if isinstance(m, HumanMessage) else "Assistant"
+        lines.append(f"{who}: {m.content}")
+    return "\n".join(lines)
+
+
+def _extractive_summary(summary: str | None, messages: list) -> str:
+    lines = [summary] if summary else []
+    for m in messages:
+        who = "User" if isinstance(m, HumanMessage) else "Assistant"
+        text = " ".join(str(m.content).split())
+        lines.append(f"- {who}: {text[:200]}{'…' if len(text) > 200 else ''}")
+    text = "\n".join(lines)
+    limit = HISTORY_SUMMARY_MAX_TOKENS * 4
+    return text if len(text) <= limit else "…" + text[-limit:]
+
+
+def _summarize(summary: str | None, messages: list, api_key: str) -> str:
+    if HISTORY_SUMMARY_MODEL and api_key:
+        try:
+            llm = ChatOpenAI(model=HISTORY_SUMMARY_MODEL, api_key=api_key)
+            prompt = _SUMMARY_PROMPT.format(
+                max_words=int(HISTORY_SUMMARY_MAX_TOKENS * 0.75),
+                summary=summary or "(none)",
+                exchanges=_exchanges_text(messages),
+            )
+            text = llm.invoke([HumanMessage(content=prompt)]).content
+            if text:
+                return text
+        except Exception as e:
+            logger.warning(f"History summary failed, using extractive summary: {e}")
+    return _extractive_summary(summary, messages)
+
+
+def due(state: dict) -> bool:
+    """True once enough turns have built up for compact() to fold some."""
+    return len(_turn_starts(state["messages"])) > HISTORY_KEEP_TURNS + HISTORY_COMPACT_TURNS
+
+
+def compact(state: dict, api_key: str) -> int:
+    """Fold the oldest turns into the rolling summary once enough have built up. Returns turns folded."""
+    if not due(state):
+        return 0
+    messages = state["messages"]
+    starts = _turn_starts(messages)
+    cut = starts[-HISTORY_KEEP_TURNS]
+    old = messages[:cut]
+    state["history_summary"] = _summarize(state.get("history_summary"), old, api_key)
+    state["compacted_tokens"] = state.get("compacted_tokens", 0) + sum(_message_tokens(m) for m in old)
+    state["messages"] = messages[cut:]
+    return len(starts) - HISTORY_KEEP_TURNS
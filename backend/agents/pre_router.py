@@ -0,0 +1,191 @@
+"""Deterministic pre-routing: pick the agent for a message without asking Hydrogen.
+
+Most of Hydrogen's routing rules are mechanical ("weekly review" -> Boron,
+"log my workout" -> Beryllium), yet each one costs a full Hydrogen call on
+the big model before the specialist even starts. When no specialist is
+active, the turn first runs the message through RULES:
+
+  - every rule that matches votes for its agent with its confidence; an
+    agent's score is its best vote
+  - the top agent wins if its score reaches PRE_ROUTER_MIN_CONFIDENCE and
+    beats every other agent by at least PRE_ROUTER_MARGIN
+  - otherwise (no match, weak match, two intents) Hydrogen decides as before
+
+Rules that vote for "hydrogen" are vetoes: emotional content and negations
+must reach the LLM, so they make any comparable match ambiguous.
+
+evaluate() is pure — it only looks at the message and the context it is
+given — so rules can be tested without a database or a model. route() is
+what the graph calls; it also logs and counts decisions.
+"""
+
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple
+
+from config import PRE_ROUTER_MIN_CONFIDENCE, PRE_ROUTER_MARGIN
+from runtime_config import get_agent_model
+from file_logger import logger
+
+STALE_STATE_SECONDS = 4 * 3600  # Hydrogen's "no state in past 4 hours"
+
+
+class Rule(NamedTuple):
+    name: str
+    agent: str  # "hydrogen" = the LLM must decide
+    confidence: float
+    match: Callable[[str, dict], bool]  # (message, context) -> bool
+    kind: str = "message"  # "context" rules look only at the user's data, not what they asked
+
+
+class Decision(NamedTuple):
+    agent: str | None  # None = fall back to the Hydrogen LLM
+    rule: str | None
+    confidence: float
+    reason: str  # matched | no_match | below_threshold | ambiguous | deferred
+
+
+RULES: list[Rule] = []
+
+
+def rule(name: str, agent: str, confidence: float, kind: str = "message"):
+    """Register `fn(message, context) -> bool` as a routing rule."""
+    def register(fn):
+        RULES.append(Rule(name, agent, confidence, fn, kind))
+        return fn
+    return register
+
+
+def phrases(*patterns: str) -> Callable[[str, dict], bool]:
+    """Match function for case-insensitive regex patterns."""
+    compiled = re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+    return lambda message, context: compiled.search(message) is not None
+
+
+def state_is_stale(context: dict) -> bool:
+    recent = context.get("recent_states") or []
+    if not recent:
+        return True
+    try:
+        ts = datetime.fromisoformat(recent[0]["created_at"].replace("Z", "+00:00"))
+        return (datetime.now(timezone.utc) - ts).total_seconds() >= STALE_STATE_SECONDS
+    except Exception:
+        return False  # unreadable timestamp -> assume fresh, don't pre-route
+
+
+# ---------------------------------------------------------------------------
+# Rules (mirror Hydrogen's routing section in agents/hydrogen.py)
+# ---------------------------------------------------------------------------
+
+@rule("no_life_goals", "helium", 1.0, kind="context")
+def _no_life_goals(message, context):
+    return not context.get("life_goals")
+
+
+RULES += [
+    Rule("emotional", "hydrogen", 0.9, phrases(
+        r"\boverwhelm", r"\bdemotivat", r"\bburn(?:ed|t)?[ -]?out\b", r"\bstressed\b", r"\banxious\b",
+        r"\bdiscourag")),
+    Rule("negation", "hydrogen", 0.9, phrases(
+        r"\bdon'?t\b", r"\bdo not\b", r"\bnot now\b", r"\bnever ?mind\b", r"\bcancel\b")),
+    Rule("weekly_review", "boron", 0.95, phrases(
+        r"\bweekly review\b", r"\breview (?:my|the|this|last) week\b")),
+    Rule("reflection", "carbon", 0.9, phrases(
+        r"\bjournal(?:ing)?\b", r"\breflect(?:ion)?\b", r"\bevening check[- ]?in\b")),
+    Rule("goals", "helium", 0.9, phrases(
+        r"\b(?:add|update|change|edit|revise|set|new|delete|remove)\b[^.?!]{0,30}\bgoals?\b")),
+    Rule("task_change", "beryllium", 0.9, phrases(
+        r"\b(?:add|create|new|delete|remove|edit|update|rename|complete|finish(?:ed)?|mark|manage)\b"
+        r"[^.?!]{0,30}\b(?:tasks?|habits?)\b")),
+    Rule("log_activity", "beryllium", 0.95, phrases(
+        r"\blog\b[^.?!]{0,20}\b(?:workout|run|walk|exercise|gym|meal|food|habit)s?\b",
+        r"\blog what i (?:ate|had|did)\b")),
+    Rule("tasks_mentioned", "beryllium", 0.6, phrases(r"\btasks?\b")),
+    Rule("state_check_in", "lithium", 0.9, phrases(
+        r"(?<!evening )\bcheck[- ]?in\b", r"\bcheck my state\b", r"\bhow i'?m feeling\b",
+        r"\bmy (?:energy|soreness|sickness)\b")),
+]
+
+
+@rule("stale_state_session_start", "lithium", 0.8, kind="context")
+def _stale_state_session_start(message, context):
+    return bool(context.get("first_message")) and state_is_stale(context)
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+def evaluate(message: str, context: dict, rules: list[Rule] | None = None,
+             min_confidence: float = PRE_ROUTER_MIN_CONFIDENCE, margin: float = PRE_ROUTER_MARGIN) -> Decision:
+    """Decide from `rules` (default RULES) alone. `context` is the turn's context cache plus `first_message`."""
+    best: dict[str, Rule] = {}
+    for r in RULES if rules is None else rules:
+        if r.match(message, context) and (r.agent not in best or r.confidence > best[r.agent].confidence):
+            best[r.agent] = r
+    ranked = sorted(best.values(), key=lambda r: r.confidence, reverse=True)
+    if not ranked:
+        return Decision(None, None, 0.0, "no_match")
+    top = ranked[0]
+    runner_up = ranked[1].confidence if len(ranked) > 1 else 0.0
+    if top.confidence < min_confidence:
+        return Decision(None, top.name, top.confidence, "below_threshold")
+    if round(top.confidence - runner_up, 3) < margin:
+        return Decision(None, top.name, top.confidence, "ambiguous")
+    if top.agent == "hydrogen":
+        return Decision(None, top.name, top.confidence, "deferred")
+    return Decision(top.agent, top.name, top.confidence, "matched")
+
+
+def intents(message: str, min_confidence: float = PRE_ROUTER_MIN_CONFIDENCE) -> set[str]:
+    """Agents the message itself clearly asks for; includes "hydrogen" when a veto matched."""
+    return {r.agent for r in RULES
+            if r.kind == "message" and r.confidence >= min_confidence and r.match(message, {})}
+
+
+_lock = threading.Lock()
+_stats = {
+    "evaluated": 0,
+    "pre_routed": 0,
+    "fallbacks": {"no_match": 0, "below_threshold": 0, "ambiguous": 0, "deferred": 0},
+    "by_rule": {},
+    "avoided_calls": {},  # Hydrogen model -> calls skipped
+}
+
+
+def route(message: str, context: dict, log_prefix: str = "") -> Decision:
+    """evaluate() with logging and counters. decision.agent is None when Hydrogen should decide."""
+    decision = evaluate(message, context)
+    with _lock:
+        _stats["evaluated"] += 1
+        if decision.agent is None:
+            _stats["fallbacks"][decision.reason] += 1
+        else:
+            _stats["pre_routed"] += 1
+            _stats["by_rule"][decision.rule] = _stats["by_rule"].get(decision.rule, 0) + 1
+            model = get_agent_model("hydrogen")
+            _stats["avoided_calls"][model] = _stats["avoided_calls"].get(model, 0) + 1
+    if decision.agent is None:
+        logger.debug(f"{log_prefix} Pre-routing: {decision.reason} ({decision.rule}) -> hydrogen decides")
+    else:
+        logger.info(f"{log_prefix} Pre-routing -> {decision.agent} "
+                    f"({decision.rule}, confidence {decision.confidence}), hydrogen call skipped")
+    return decision
+
+
+def pre_router_stats() -> dict:
+    """Snapshot of pre-routing counters for the admin metrics endpoint."""
+    with _lock:
+        evaluated = _stats["evaluated"]
+        return {
+            "min_confidence": PRE_ROUTER_MIN_CONFIDENCE,
+            "margin": PRE_ROUTER_MARGIN,
+            "rules": len(RULES),
+            "evaluated": evaluated,
+            "pre_routed": _stats["pre_routed"],
+            "pre_route_rate": round(_stats["pre_routed"] / evaluated, 3) if evaluated else None,
+            "fallbacks": dict(_stats["fallbacks"]),
+            "by_rule": dict(_stats["by_rule"]),
+            "avoided_calls": dict(_stats["avoided_calls"]),
+        }
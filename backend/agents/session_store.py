@@ -0,0 +1,264 @@
+"""Bounded in-memory store for agent session state, checkpointed to SQLite.
+
+Each (user_id, session_id) holds an AgentState: the conversation's LangChain
+messages, the active agent and the context cache. Sessions are kept in
+least-recently-used order and evicted when
+  idle      — unused for AGENT_SESSION_TTL_MINUTES
+  count     — more than AGENT_SESSION_MAX sessions are held
+  memory    — the estimated size of all sessions exceeds AGENT_SESSION_MAX_MB
+A session with a turn in flight is never evicted.
+
+After every turn the session is checkpointed to agent_sessions in compact
+form: the active agent, its last AGENT_SESSION_PERSIST_MESSAGES messages and
+the conversation-only cache keys (CHECKPOINT_CACHE_KEYS, e.g. Boron's
+task_plan), plus the rolling summary of older turns (history.py). A session
+that isn't in memory — evicted, or lost when the machine stopped — is
+rehydrated from its checkpoint on first access, so a cold start resumes
+mid-conversation without replaying history through the LLM. The rest of the
+context cache is re-fetched by the next turn.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from config import (
+    AGENT_SESSION_TTL_MINUTES, AGENT_SESSION_MAX, AGENT_SESSION_MAX_MB, AGENT_SESSION_PERSIST_MESSAGES,
+)
+from database import _now, decode_json, encode_json, execute, query_one
+from file_logger import logger
+from agents.state import AgentState, CHECKPOINT_CACHE_KEYS, SessionCheckpoint
+
+_MESSAGE_OVERHEAD = 400  # rough per-message cost of the LangChain object beyond its content
+
+
+def new_state() -> AgentState:
+    return {
+        "messages": [],
+        "active_agent": None,
+        "context_cache": {},  # {tool_name: {result, timestamp}}
+        "history_summary": None,
+        "compacted_tokens": 0,
+    }
+
+
+def _estimate_bytes(value) -> int:
+    """Approximate memory held by a session's plain-data values."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_bytes(k) + _estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def estimate_session_bytes(state: AgentState) -> int:
+    messages = sum(_MESSAGE_OVERHEAD + sys.getsizeof(m.content) for m in state["messages"])
+    return messages + _estimate_bytes(state["context_cache"]) + sys.getsizeof(state["history_summary"])
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def _message_to_dict(message) -> dict:
+    return {"type": message.type, "content": message.content}
+
+
+def _message_from_dict(d: dict):
+    return HumanMessage(content=d["content"]) if d["type"] == "human" else AIMessage(content=d["content"])
+
+
+def save_session(user_id: int, session_id: str, state: AgentState):
+    now = _now()
+    cache = state["context_cache"]
+    data: SessionCheckpoint = {
+        "user_id": user_id,
+        "session_id": session_id,
+        "active_agent": state["active_agent"],
+        "messages": [_message_to_dict(m) for m in state["messages"][-AGENT_SESSION_PERSIST_MESSAGES:]],
+        "context_cache": {k: cache[k] for k in CHECKPOINT_CACHE_KEYS if k in cache},
+        "history_summary": state["history_summary"],
+        "compacted_tokens": state["compacted_tokens"],
+    }
+    execute(
+        "INSERT INTO agent_sessions (data, created_at, updated_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (user_id, session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+        (encode_json(data), now, now),
+    )
+
+
+def load_session(user_id: int, session_id: str) -> AgentState | None:
+    row = query_one("SELECT data FROM agent_sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id))
+    if row is None:
+        return None
+    data: SessionCheckpoint = decode_json(row["data"])
+    state = new_state()
+    state["active_agent"] = data.get("active_agent")
+    state["messages"] = [_message_from_dict(m) for m in data.get("messages", [])]
+    state["context_cache"].update(data.get("context_cache") or {})
+    state["history_summary"] = data.get("history_summary")
+    state["compacted_tokens"] = data.get("compacted_tokens", 0)
+    return state
+
+
+def delete_saved_sessions(user_id: int, session_id: str | None = None):
+    if session_id is None:
+        execute("DELETE FROM agent_sessions WHERE user_id = ?", (user_id,))
+    else:
+        execute("DELETE FROM agent_sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id))
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class _Entry:
+    __slots__ = ("state", "last_used", "bytes", "busy")
+
+    def __init__(self, state: AgentState):
+        self.state = state
+        self.last_used = time.monotonic()
+        self.bytes = estimate_session_bytes(state)
+        self.busy = 0
+
+
+class SessionStore:
+    def __init__(self, ttl_seconds: float = AGENT_SESSION_TTL_MINUTES * 60, max_sessions: int = AGENT_SESSION_MAX,
+                 max_bytes: int = int(AGENT_SESSION_MAX_MB * 1024 * 1024)):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[int, str], _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "rehydrated": 0, "checkpoints": 0, "checkpoint_errors": 0,
+                       "evictions": {"idle": 0, "count": 0, "memory": 0}}
+
+    @contextmanager
+    def use(self, user_id: int, session_id: str):
+        """Hold a session's state for one turn and checkpoint it afterwards.
+
+        The state is created or rehydrated if it isn't in memory, and can't be
+        evicted while held.
+        """
+        key = (user_id, session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._stats["hits"] += 1
+                self._entries.move_to_end(key)
+                entry.busy += 1
+        if entry is None:
+            # Rehydrate outside the lock — it reads the database
+            revived = load_session(user_id, session_id)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _Entry(revived or new_state())
+                    self._entries[key] = entry
+                    self._bytes += entry.bytes
+                    self._stats["misses"] += 1
+                    if revived is not None:
+                        self._stats["rehydrated"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                entry.busy += 1
+        try:
+            yield entry.state
+        finally:
+            with self._lock:
+                held = self._entries.get(key) is entry
+            if held:  # not dropped by a reset while the turn ran
+                self._checkpoint(user_id, session_id, entry.state)
+            with self._lock:
+                entry.busy -= 1
+                entry.last_used = time.monotonic()
+                size = estimate_session_bytes(entry.state)
+                if self._entries.get(key) is entry:
+                    self._bytes += size - entry.bytes
+                entry.bytes = size
+            self.evict()
+
+    def _checkpoint(self, user_id: int, session_id: str, state: AgentState):
+        if not state["messages"] and state["active_agent"] is None:
+            return  # nothing worth resuming
+        try:
+            save_session(user_id, session_id, state)
+        except Exception as e:
+            with self._lock:
+                self._stats["checkpoint_errors"] += 1
+            logger.error(f"[user={user_id}|{session_id}] Could not checkpoint session: {e}")
+            return
+        with self._lock:
+            self._stats["checkpoints"] += 1
+
+    def peek(self, user_id: int, session_id: str) -> AgentState | None:
+        """In-memory state for a session, without rehydrating or touching its LRU position."""
+        with self._lock:
+            entry = self._entries.get((user_id, session_id))
+            return entry.state if entry is not None else None
+
+    def active_agent(self, user_id: int, session_id: str) -> str | None:
+        state = self.peek(user_id, session_id)
+        if state is None:
+            row = query_one(
+                "SELECT json_extract(data, '$.active_agent') FROM agent_sessions WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id),
+            )
+            return row[0] if row else None
+        return state.get("active_agent")
+
+    def drop(self, user_id: int, session_id: str | None = None):
+        """Forget a session (or all of a user's sessions), in memory and checkpointed."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == user_id and (session_id is None or k[1] == session_id)]
+            for k in keys:
+                self._bytes -= self._entries.pop(k).bytes
+        delete_saved_sessions(user_id, session_id)
+
+    def evict(self) -> int:
+        """Evict idle sessions, then the least recently used past the count and memory caps.
+
+        Every session was checkpointed after its last turn, so eviction only frees memory.
+        """
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.busy:
+                    continue
+                if now - entry.last_used > self.ttl_seconds:
+                    reason = "idle"
+                elif len(self._entries) > self.max_sessions:
+                    reason = "count"
+                elif self._bytes > self.max_bytes:
+                    reason = "memory"
+                else:
+                    break
+                del self._entries[key]
+                self._bytes -= entry.bytes
+                self._stats["evictions"][reason] += 1
+                evicted += 1
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "busy": sum(1 for e in self._entries.values() if e.busy),
+                "bytes": self._bytes,
+                "largest_bytes": max((e.bytes for e in self._entries.values()), default=0),
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "rehydrated": self._stats["rehydrated"],
+                "checkpoints": self._stats["checkpoints"],
+                "checkpoint_errors": self._stats["checkpoint_errors"],
+                "evictions": dict(self._stats["evictions"]),
+            }
@@ -1,11 +1,34 @@
-from typing import TypedDict, Annotated, Literal
+from typing import TypedDict, Literal
 from langchain_core.messages import BaseMessage
-from langgraph.graph.message import add_messages
+
+AgentName = Literal["hydrogen", "helium", "lithium", "beryllium", "boron", "carbon"]
+
+# context_cache entries that only exist in the conversation (set by agent
+# tools during the session). Everything else in the cache is a snapshot of
+# user data that the next turn re-fetches, so it isn't checkpointed.
+CHECKPOINT_CACHE_KEYS = ("task_plan", "session_state_id", "last_todo_list_id")
 
 
 class AgentState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
+    """One chat session's conversation state, held by the session store between turns."""
+    messages: list[BaseMessage]
+    active_agent: AgentName | None
+    context_cache: dict
+    history_summary: str | None  # rolling summary of turns compacted out of messages (history.py)
+    compacted_tokens: int  # estimated tokens of those turns
+
+
+class CheckpointMessage(TypedDict):
+    type: Literal["human", "ai"]
+    content: str
+
+
+class SessionCheckpoint(TypedDict):
+    """Compact AgentState as stored in agent_sessions.data after each turn."""
     user_id: int
-    next_agent: Literal["hydrogen", "helium", "lithium", "beryllium", "__end__"]
-    agent_context: dict
-    full_context_log: list[dict]
+    session_id: str
+    active_agent: AgentName | None
+    messages: list[CheckpointMessage]
+    context_cache: dict
+    history_summary: str | None
+    compacted_tokens: int
@@ -1,5 +1,5 @@
 from langchain_core.tools import tool
-from database import insert_row, get_rows, get_db
+from database import insert_row, get_rows, query_all, decode_json
 from datetime import datetime, timezone, timedelta
 import json
 
@@ -18,18 +18,16 @@ def make_review_tools(user_id: int):
     @tool
     def get_week_completions(days_back: int = 7) -> str:
         """Fetch all tasks completed in the past N days, including metric values logged."""
-        conn = get_db()
         cutoff = (datetime.now(timezone.utc) - timedelta(days=days_back)).isoformat()
-        rows = conn.execute("""
-            SELECT * FROM one_time_tasks
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.completed') = 1
-              AND json_extract(data, '$.completed_at') >= ?
-            ORDER BY json_extract(data, '$.completed_at') DESC
+        rows = query_all("""
+            SELECT id, data, created_at, updated_at FROM one_time_tasks
+            WHERE user_id = ?
+              AND completed = 1
+              AND completed_at >= ?
+            ORDER BY completed_at DESC
             LIMIT 200
-        """, (user_id, cutoff)).fetchall()
-        conn.close()
-        completions = [{"id": r["id"], "created_at": r["created_at"], **json.loads(r["data"])} for r in rows]
+        """, (user_id, cutoff))
+        completions = [{"id": r["id"], "created_at": r["created_at"], **decode_json(r["data"])} for r in rows]
         return json.dumps(completions)
 
     @tool
@@ -40,7 +38,8 @@ def make_review_tools(user_id: int):
         now = datetime.now(timezone.utc)
 
         # --- Incomplete one-time tasks ---
-        ot_rows = get_rows("one_time_tasks", filters={"user_id": user_id, "completed": False}, limit=200)
+        ot_rows = get_rows("one_time_tasks", filters={"user_id": user_id, "completed": False}, limit=200,
+                           fields=["title", "description", "deadline", "cognitive_load", "estimated_minutes"])
         incomplete = []
         for r in ot_rows:
             d = r["data"]
@@ -63,23 +62,22 @@ def make_review_tools(user_id: int):
             })
 
         # --- Recurring tasks: overdue check ---
-        rec_rows = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200)
+        rec_rows = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200,
+                            fields=["title", "status", "interval_days"])
         if rec_rows:
             ids = [r["id"] for r in rec_rows]
             placeholders = ",".join(["?"] * len(ids))
-            conn = get_db()
-            done_rows = conn.execute(f"""
-                SELECT json_extract(data, '$.from_recurring_id') as task_id,
+            done_rows = query_all(f"""
+                SELECT from_recurring_id as task_id,
                        MAX(COALESCE(
                            json_extract(data, '$.completed_date'),
-                           substr(json_extract(data, '$.completed_at'), 1, 10)
+                           substr(completed_at, 1, 10)
                        )) as last_done
                 FROM one_time_tasks
-                WHERE json_extract(data, '$.user_id') = ?
-                  AND json_extract(data, '$.from_recurring_id') IN ({placeholders})
-                GROUP BY json_extract(data, '$.from_recurring_id')
-            """, [user_id] + ids).fetchall()
-            conn.close()
+                WHERE user_id = ?
+                  AND from_recurring_id IN ({placeholders})
+                GROUP BY from_recurring_id
+            """, [user_id] + ids)
             last_done_map = {int(r["task_id"]): r["last_done"] for r in done_rows if r["task_id"] is not None}
         else:
             last_done_map = {}
@@ -87,16 +85,14 @@ def make_review_tools(user_id: int):
         # 7-day streak counts
         if rec_rows:
             cutoff_7 = (now - timedelta(days=7)).isoformat()
-            conn2 = get_db()
-            raw_streaks = conn2.execute(f"""
-                SELECT json_extract(data, '$.from_recurring_id') as task_id, COUNT(*) as count
+            raw_streaks = query_all(f"""
+                SELECT from_recurring_id as task_id, COUNT(*) as count
                 FROM one_time_tasks
-                WHERE json_extract(data, '$.user_id') = ?
-                  AND json_extract(data, '$.from_recurring_id') IN ({placeholders})
-                  AND json_extract(data, '$.completed_at') >= ?
-                GROUP BY json_extract(data, '$.from_recurring_id')
-            """, [user_id] + ids + [cutoff_7]).fetchall()
-            conn2.close()
+                WHERE user_id = ?
+                  AND from_recurring_id IN ({placeholders})
+                  AND completed_at >= ?
+                GROUP BY from_recurring_id
+            """, [user_id] + ids + [cutoff_7])
             streak_map = {int(r["task_id"]): r["count"] for r in raw_streaks if r["task_id"]}
         else:
             streak_map = {}
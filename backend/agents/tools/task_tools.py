@@ -1,5 +1,5 @@
 from langchain_core.tools import tool
-from database import insert_row, update_row, delete_row, get_rows, get_row, get_db, user_today
+from database import insert_row, update_row, delete_row, get_rows, get_row, query_one, query_all, transaction, user_today, decode_json
 from datetime import datetime, timezone, timedelta
 import json
 
@@ -53,15 +53,12 @@ def make_task_tools(user_id: int, context_cache: dict = None):
     def _get_streak(task_id: int) -> int:
         """Count completions of a recurring task in the last 7 days."""
         cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-        conn = get_db()
-        count = conn.execute("""
+        return query_one("""
             SELECT COUNT(*) FROM one_time_tasks
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.from_recurring_id') = ?
-              AND json_extract(data, '$.completed_at') >= ?
-        """, (user_id, task_id, cutoff)).fetchone()[0]
-        conn.close()
-        return count
+            WHERE user_id = ?
+              AND from_recurring_id = ?
+              AND completed_at >= ?
+        """, (user_id, task_id, cutoff))[0]
 
     def _check_and_graduate(task_id: int) -> dict:
         """Check streak and graduate to habit status if >= 6/7 days."""
@@ -80,18 +77,16 @@ def make_task_tools(user_id: int, context_cache: dict = None):
     def _mark_todo_item_completed(source_task_id: int, source_type: str):
         """Check off the matching item in today's active todo list."""
         today = user_today(user_id)
-        conn = get_db()
-        row = conn.execute("""
+        row = query_one("""
             SELECT id, data FROM todo_lists
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.date') = ?
+            WHERE user_id = ?
+              AND date = ?
             ORDER BY id DESC LIMIT 1
-        """, (user_id, today)).fetchone()
-        conn.close()
+        """, (user_id, today))
         if not row:
             return
         try:
-            data = json.loads(row["data"])
+            data = decode_json(row["data"])
         except Exception:
             return
         changed = False
@@ -107,22 +102,21 @@ def make_task_tools(user_id: int, context_cache: dict = None):
     def get_habit_progress() -> str:
         """Get all recurring tasks with their 7-day completion streak and status.
         Use this to see which habits are active vs graduated, and track progress."""
-        rows = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200)
+        rows = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200,
+                        fields=["title", "status", "life_goal_ids"])
         if not rows:
             return json.dumps([])
         ids = [r["id"] for r in rows]
         placeholders = ",".join(["?"] * len(ids))
         cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-        conn = get_db()
-        streak_rows = conn.execute(f"""
-            SELECT json_extract(data, '$.from_recurring_id') as task_id, COUNT(*) as count
+        streak_rows = query_all(f"""
+            SELECT from_recurring_id as task_id, COUNT(*) as count
             FROM one_time_tasks
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.from_recurring_id') IN ({placeholders})
-              AND json_extract(data, '$.completed_at') >= ?
-            GROUP BY json_extract(data, '$.from_recurring_id')
-        """, [user_id] + ids + [cutoff]).fetchall()
-        conn.close()
+            WHERE user_id = ?
+              AND from_recurring_id IN ({placeholders})
+              AND completed_at >= ?
+            GROUP BY from_recurring_id
+        """, [user_id] + ids + [cutoff])
         streak_map = {int(r["task_id"]): r["count"] for r in streak_rows if r["task_id"]}
         result = []
         for r in rows:
@@ -199,15 +193,16 @@ def make_task_tools(user_id: int, context_cache: dict = None):
     @tool
     def complete_one_time_task(task_id: int) -> str:
         """Mark a one-time task as completed."""
-        row = get_row("one_time_tasks", task_id)
-        if not row:
-            return json.dumps({"success": False, "message": "Task not found."})
-        if row["data"].get("user_id") != user_id:
-            return json.dumps({"success": False, "message": "You do not own this task."})
-        merged = {**row["data"], "completed": True, "completed_at": datetime.now(timezone.utc).isoformat()}
-        update_row("one_time_tasks", task_id, merged)
+        with transaction():
+            row = get_row("one_time_tasks", task_id)
+            if not row:
+                return json.dumps({"success": False, "message": "Task not found."})
+            if row["data"].get("user_id") != user_id:
+                return json.dumps({"success": False, "message": "You do not own this task."})
+            merged = {**row["data"], "completed": True, "completed_at": datetime.now(timezone.utc).isoformat()}
+            update_row("one_time_tasks", task_id, merged)
+            _mark_todo_item_completed(task_id, "one_time")
         context_cache.pop("tasks", None)
-        _mark_todo_item_completed(task_id, "one_time")
         return json.dumps({"success": True, "message": f"Task {task_id} marked as completed."})
 
     @tool
@@ -278,26 +273,28 @@ def make_task_tools(user_id: int, context_cache: dict = None):
     ) -> str:
         """Mark a recurring habit task as completed for today. Streak is checked automatically —
         at 6/7 completions in the last 7 days the task graduates to established habit status."""
-        row = get_row("recurring_tasks", task_id)
-        if not row:
-            return json.dumps({"success": False, "message": "Recurring task not found."})
-        if row["data"].get("user_id") != user_id:
-            return json.dumps({"success": False, "message": "You do not own this task."})
-        completed_data = {
-            "user_id": user_id,
-            "title": row["data"]["title"],
-            "description": row["data"].get("description", ""),
-            "from_recurring_id": task_id,
-            "completed": True,
-            "completed_at": datetime.now(timezone.utc).isoformat(),
-            "completed_date": user_today(user_id),
-            "life_goal_ids": row["data"].get("life_goal_ids", []),
-        }
-        if notes:
-            completed_data["notes"] = notes
-        completed_id = insert_row("one_time_tasks", completed_data)
-        _mark_todo_item_completed(task_id, "recurring")
-        graduation = _check_and_graduate(task_id)
+        # Completion record, todo check-off and graduation commit together
+        with transaction():
+            row = get_row("recurring_tasks", task_id)
+            if not row:
+                return json.dumps({"success": False, "message": "Recurring task not found."})
+            if row["data"].get("user_id") != user_id:
+                return json.dumps({"success": False, "message": "You do not own this task."})
+            completed_data = {
+                "user_id": user_id,
+                "title": row["data"]["title"],
+                "description": row["data"].get("description", ""),
+                "from_recurring_id": task_id,
+                "completed": True,
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "completed_date": user_today(user_id),
+                "life_goal_ids": row["data"].get("life_goal_ids", []),
+            }
+            if notes:
+                completed_data["notes"] = notes
+            completed_id = insert_row("one_time_tasks", completed_data)
+            _mark_todo_item_completed(task_id, "recurring")
+            graduation = _check_and_graduate(task_id)
         msg = f"'{row['data']['title']}' completed. Streak: {graduation['streak']}/7 this week."
         if graduation["graduated"]:
             msg += " This habit has graduated to established status — it's now part of who you are."
@@ -1,5 +1,5 @@
 from langchain_core.tools import tool
-from database import insert_row, get_rows, update_row, get_row, get_db
+from database import insert_row, get_rows, update_row, get_row, query_all
 from datetime import datetime, timezone, timedelta
 import json
 
@@ -11,7 +11,8 @@ def make_todo_tools(user_id: int, context_cache: dict = None):
 
     def _get_active_habits_with_streaks(exclude_ids: set) -> list:
         """Return active (building) recurring tasks that are due, with 7-day streak info."""
-        recurring = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200)
+        recurring = get_rows("recurring_tasks", filters={"user_id": user_id, "active": True}, limit=200,
+                             fields=["title", "description", "status", "interval_days"])
         active_habits = [t for t in recurring if t["data"].get("status", "active") == "active"]
         if not active_habits:
             return []
@@ -21,28 +22,26 @@ def make_todo_tools(user_id: int, context_cache: dict = None):
         placeholders = ",".join(["?"] * len(ids))
         cutoff_7 = (now - timedelta(days=7)).isoformat()
 
-        conn = get_db()
-        last_done_rows = conn.execute(f"""
-            SELECT json_extract(data, '$.from_recurring_id') as task_id,
+        last_done_rows = query_all(f"""
+            SELECT from_recurring_id as task_id,
                    MAX(COALESCE(
                        json_extract(data, '$.completed_date'),
-                       substr(json_extract(data, '$.completed_at'), 1, 10)
+                       substr(completed_at, 1, 10)
                    )) as last_done
             FROM one_time_tasks
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.from_recurring_id') IN ({placeholders})
-            GROUP BY json_extract(data, '$.from_recurring_id')
-        """, [user_id] + ids).fetchall()
+            WHERE user_id = ?
+              AND from_recurring_id IN ({placeholders})
+            GROUP BY from_recurring_id
+        """, [user_id] + ids)
 
-        streak_rows = conn.execute(f"""
-            SELECT json_extract(data, '$.from_recurring_id') as task_id, COUNT(*) as count
+        streak_rows = query_all(f"""
+            SELECT from_recurring_id as task_id, COUNT(*) as count
             FROM one_time_tasks
-            WHERE json_extract(data, '$.user_id') = ?
-              AND json_extract(data, '$.from_recurring_id') IN ({placeholders})
-              AND json_extract(data, '$.completed_at') >= ?
-            GROUP BY json_extract(data, '$.from_recurring_id')
-        """, [user_id] + ids + [cutoff_7]).fetchall()
-        conn.close()
+            WHERE user_id = ?
+              AND from_recurring_id IN ({placeholders})
+              AND completed_at >= ?
+            GROUP BY from_recurring_id
+        """, [user_id] + ids + [cutoff_7])
 
         last_done_map = {}
         for r in last_done_rows:
@@ -0,0 +1,139 @@
+"""Per-session serialization of agent turns.
+
+A turn reads and mutates its session's messages and context cache from a
+worker thread, so two turns for the same (user_id, session_id) — a double
+submit from the web UI, a Discord DM landing while the tick switches the
+active agent — must never overlap. Every session gets a FIFO queue drained by
+one task at a time; work for different sessions still runs concurrently.
+
+With AGENT_COALESCE_MESSAGES on, messages that queue up behind a running turn
+are joined into one turn instead of one turn each: every waiting caller gets
+the same result (marked `coalesced` with the number of messages merged) and
+the LLM is called once.
+
+defer() puts session work (history compaction) at the front of the queue
+without waiting for it, so it runs after the current turn has answered and
+before any turn still waiting.
+
+The queue lives on the event loop; nothing here needs a lock.
+"""
+
+import asyncio
+from collections import deque
+
+from config import AGENT_COALESCE_MESSAGES
+
+
+class _Job:
+    __slots__ = ("message", "on_event", "run", "fn", "future")
+
+    def __init__(self, future, message=None, on_event=None, run=None, fn=None):
+        self.future = future
+        self.message = message  # turn jobs
+        self.on_event = on_event
+        self.run = run
+        self.fn = fn  # other session work (e.g. set_active_agent)
+
+
+def _fan_out(callbacks):
+    callbacks = [cb for cb in callbacks if cb]
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def on_event(event_type, data):
+        for cb in callbacks:
+            cb(event_type, data)
+    return on_event
+
+
+class TurnQueue:
+    def __init__(self, coalesce: bool = AGENT_COALESCE_MESSAGES):
+        self.coalesce = coalesce
+        self._queues: dict[tuple[int, str], deque[_Job]] = {}
+        self._drainers: set[asyncio.Task] = set()
+        self._stats = {"turns": 0, "queued": 0, "coalesced_messages": 0, "max_depth": 0}
+
+    async def turn(self, key: tuple[int, str], message: str, run, on_event=None) -> dict:
+        """Queue a message for the session and await its result.
+
+        `run(message, on_event)` is awaited to execute the turn.
+        """
+        job = _Job(asyncio.get_running_loop().create_future(), message=message, on_event=on_event, run=run)
+        return await self._submit(key, job)
+
+    async def call(self, key: tuple[int, str], fn):
+        """Run `await fn()` in the session's queue, between turns."""
+        job = _Job(asyncio.get_running_loop().create_future(), fn=fn)
+        return await self._submit(key, job)
+
+    def defer(self, key: tuple[int, str], fn):
+        """Run `await fn()` next in the session's queue, ahead of waiting turns, without waiting for it.
+
+        Errors are dropped.
+        """
+        self._enqueue(key, _Job(asyncio.get_running_loop().create_future(), fn=fn), first=True)
+
+    async def _submit(self, key, job: _Job):
+        self._enqueue(key, job)
+        # shield: a caller that goes away (client disconnect) doesn't cancel
+        # the turn, which is already committed to the session's history
+        return await asyncio.shield(job.future)
+
+    def _enqueue(self, key, job: _Job, first: bool = False):
+        pending = self._queues.get(key)
+        if pending is None:
+            pending = self._queues[key] = deque()
+            task = asyncio.create_task(self._drain(key, pending))
+            self._drainers.add(task)
+            task.add_done_callback(self._drainers.discard)
+        else:
+            self._stats["queued"] += 1
+        if first:
+            pending.appendleft(job)
+        else:
+            pending.append(job)
+        self._stats["max_depth"] = max(self._stats["max_depth"], len(pending))
+
+    async def _drain(self, key, pending: deque[_Job]):
+        try:
+            while pending:
+                job = pending.popleft()
+                if job.fn is not None:
+                    await self._settle([job], job.fn())
+                    continue
+                batch = [job]
+                while self.coalesce and pending and pending[0].fn is None:
+                    batch.append(pending.popleft())
+                if len(batch) > 1:
+                    self._stats["coalesced_messages"] += len(batch)
+                message = "\n\n".join(j.message for j in batch)
+                self._stats["turns"] += 1
+                await self._settle(batch, job.run(message, _fan_out([j.on_event for j in batch])), len(batch))
+        finally:
+            del self._queues[key]
+
+    @staticmethod
+    async def _settle(batch: list[_Job], awaitable, merged: int = 1):
+        try:
+            result = await awaitable
+        except Exception as e:
+            for j in batch:
+                if not j.future.done():
+                    j.future.set_exception(e)
+                    j.future.exception()  # mark retrieved: the caller may have gone away
+            return
+        if merged > 1:
+            result = {**result, "coalesced": merged}
+        for j in batch:
+            if not j.future.done():
+                j.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "coalesce": self.coalesce,
+            "active_sessions": len(self._queues),
+            "waiting": sum(len(q) for q in self._queues.values()),
+            **self._stats,
+        }
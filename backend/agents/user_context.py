@@ -0,0 +1,103 @@
+"""Per-user context cache shared by all of a user's agent sessions.
+
+The context an agent prompt is built from (goals, tasks, recent states, ...)
+is the same for every session of a user — web tabs and Discord alike — so
+it's cached once per user rather than per session.
+
+Freshness comes from data_versions: triggers (migration 7) bump a per-user,
+per-table counter on every insert, update and delete, whether the write came
+from an agent tool, a REST endpoint or an admin. Each cached entry remembers
+the versions of the tables it was read from; at the start of a turn one
+query reads the user's current versions and only entries whose tables moved
+are fetched again. USER_CONTEXT_TTL bounds how long any entry is trusted
+regardless, and the USER_CONTEXT_MAX_USERS least recently used users are kept.
+
+Cached values are shared between sessions; callers treat them as read-only
+and replace, never mutate, their own copies.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import USER_CONTEXT_TTL, USER_CONTEXT_MAX_USERS
+from database import query_all
+
+# Context entry -> tables it reads
+DEPENDS_ON = {
+    "recent_states": ("user_states",),
+    "life_goals": ("life_goals",),
+    "last_weekly_review": ("weekly_reviews",),
+    "tasks": ("one_time_tasks", "recurring_tasks"),
+    "oldest_todo_date": ("todo_lists",),
+    "recent_journal_entries": ("journal_entries",),
+}
+
+# user_id -> {key: (value, versions, fetched_at)}
+_entries: OrderedDict[int, dict[str, tuple]] = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evictions": 0}
+
+
+def data_versions(user_id: int) -> dict[str, int]:
+    rows = query_all("SELECT tbl, version FROM data_versions WHERE user_id = ?", (user_id,))
+    return {r["tbl"]: r["version"] for r in rows}
+
+
+def load_context(user_id: int, fetchers: dict) -> dict:
+    """Current value of every entry in `fetchers` ({key: fn(user_id)}), refetching only what changed.
+
+    Call inside database.read_snapshot() so the versions and the data come
+    from the same point in time.
+    """
+    versions = data_versions(user_id)
+    now = time.monotonic()
+    with _lock:
+        cached = dict(_entries.get(user_id, {}))
+    result, fetched = {}, {}
+    for key, fn in fetchers.items():
+        current = tuple(versions.get(t, 0) for t in DEPENDS_ON.get(key, ()))
+        entry = cached.get(key)
+        if entry is not None and entry[1] == current and now - entry[2] < USER_CONTEXT_TTL:
+            result[key] = entry[0]
+            _count("hits")
+            continue
+        _count("misses" if entry is None else "stale" if entry[1] != current else "expired")
+        result[key] = fn(user_id)
+        fetched[key] = (result[key], current, now)
+    if fetched:
+        with _lock:
+            _entries.setdefault(user_id, {}).update(fetched)
+    with _lock:
+        if user_id in _entries:
+            _entries.move_to_end(user_id)
+        while len(_entries) > USER_CONTEXT_MAX_USERS:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return result
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+def clear(user_id: int | None = None):
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(user_id, None)
+
+
+def user_context_stats() -> dict:
+    """Snapshot of cache counters for the admin metrics endpoint."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"] + _stats["stale"] + _stats["expired"]
+        return {
+            "ttl_seconds": USER_CONTEXT_TTL,
+            "max_users": USER_CONTEXT_MAX_USERS,
+            "users": len(_entries),
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+        }
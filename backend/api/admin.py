@@ -2,20 +2,27 @@ from fastapi import APIRouter, Request, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import Optional
 from models import HelpArticleCreate, DataUpdate
-from auth import require_admin
-from database import get_rows, get_row, delete_row, insert_row, update_row, count_rows, get_db
+from auth import require_admin, invalidate_user, session_cache_stats, session_sweeper_stats, password_pool_stats
+from database import get_rows, get_row, delete_row, insert_row, update_row, get_db, query_one, execute, pool_stats, writer_stats, run_db
+from api.pagination import paginate, TotalMode
 from file_logger import is_debug_enabled, set_debug_enabled
+from retention import run_retention, retention_stats, get_archived_rows, ARCHIVED_TABLES
+from agents.executor import agent_executor_stats
+from agents.user_context import user_context_stats
+from agents.pre_router import pre_router_stats
+from agents.handoff import handoff_stats
 import json
 import os as _os
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 @router.get("/users")
-def list_users(request: Request, limit: int = 50, offset: int = 0):
+def list_users(request: Request, limit: int = 50, offset: int = 0, cursor: str | None = None, total: TotalMode = "exact"):
     require_admin(request)
-    rows = get_rows("users", limit=limit, offset=offset)
+    page = paginate("users", limit=limit, offset=offset, cursor=cursor, total=total,
+                    fields=["username", "display_name", "is_admin"])
     result = []
-    for row in rows:
+    for row in page["items"]:
         d = row["data"]
         result.append({
             "id": row["id"],
@@ -24,8 +31,8 @@ def list_users(request: Request, limit: int = 50, offset: int = 0):
             "is_admin": d.get("is_admin", False),
             "created_at": row["created_at"],
         })
-    total = count_rows("users")
-    return {"items": result, "total": total}
+    page["items"] = result
+    return page
 
 @router.delete("/users/{user_id}")
 def delete_user(request: Request, user_id: int):
@@ -33,19 +40,49 @@ def delete_user(request: Request, user_id: int):
     if admin["id"] == user_id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     delete_row("users", user_id)
+    invalidate_user(user_id)
     return {"ok": True}
 
 @router.get("/logs")
-def list_logs(request: Request, limit: int = 100, offset: int = 0, level: str = None, source: str = None):
+def list_logs(request: Request, limit: int = 100, offset: int = 0, level: str = None, source: str = None,
+              cursor: str | None = None, total: TotalMode = "approx"):
     require_admin(request)
     filters = {}
     if level:
         filters["level"] = level
     if source:
         filters["source"] = source
-    rows = get_rows("logs", filters=filters, limit=limit, offset=offset)
-    total = count_rows("logs", filters=filters)
-    return {"items": rows, "total": total}
+    return paginate("logs", filters=filters, limit=limit, offset=offset, cursor=cursor, total=total)
+
+@router.get("/metrics")
+def get_metrics(request: Request):
+    require_admin(request)
+    import api.chat as chat_module
+    runner = chat_module.graph_runner
+    return {"db_pool": pool_stats(), "db_writer": writer_stats(), "retention": retention_stats(),
+            "session_cache": session_cache_stats(), "session_sweeper": session_sweeper_stats(),
+            "password_pool": password_pool_stats(),
+            "agent_sessions": runner.session_stats() if runner and hasattr(runner, "session_stats") else None,
+            "agent_turns": runner.turn_stats() if runner and hasattr(runner, "turn_stats") else None,
+            "agent_history": runner.history_stats() if runner and hasattr(runner, "history_stats") else None,
+            "agent_executor": agent_executor_stats(), "user_context": user_context_stats(),
+            "pre_router": pre_router_stats(), "handoff": handoff_stats()}
+
+@router.post("/retention/run")
+def trigger_retention(request: Request, dry_run: bool = False):
+    require_admin(request)
+    report = run_retention(dry_run)
+    if "skipped" in report:
+        raise HTTPException(status_code=409, detail=report["skipped"])
+    return report
+
+@router.get("/archive/{table}")
+def list_archived(request: Request, table: str, user_id: int | None = None,
+                  before_id: int | None = None, limit: int = 50):
+    require_admin(request)
+    if table not in ARCHIVED_TABLES:
+        raise HTTPException(status_code=404, detail="Not found")
+    return get_archived_rows(table, user_id=user_id, before_id=before_id, limit=limit)
 
 @router.get("/debug-logging")
 def get_debug_logging(request: Request):
@@ -110,12 +147,10 @@ def _get_test_user_id() -> int:
     if _test_user_id_cache is not None:
         return _test_user_id_cache
     from config import TEST_USER_USERNAME
-    conn = get_db()
-    row = conn.execute(
+    row = query_one(
         "SELECT id FROM users WHERE json_extract(data, '$.username') = ?",
         (TEST_USER_USERNAME,)
-    ).fetchone()
-    conn.close()
+    )
     if row is None:
         raise HTTPException(status_code=500, detail="Test user not found — check server startup logs")
     _test_user_id_cache = row["id"]
@@ -132,8 +167,8 @@ async def test_chat(body: TestChatRequest):
     import api.chat as chat_module
     if chat_module.graph_runner is None:
         raise HTTPException(status_code=503, detail="Agent system not initialized")
-    user_id = _get_test_user_id()
-    result = await chat_module.graph_runner(user_id, body.message, body.session_id)
+    user_id = await run_db(_get_test_user_id)
+    result = await chat_module.graph_runner(user_id, body.message, body.session_id, priority="background")
     return result
 
 
@@ -143,13 +178,10 @@ def test_reset_session(session_id: str):
     user_id = _get_test_user_id()
     if chat_module.graph_runner and hasattr(chat_module.graph_runner, "reset"):
         chat_module.graph_runner.reset(user_id, session_id)
-    conn = get_db()
-    conn.execute(
-        "DELETE FROM chat_contexts WHERE json_extract(data, '$.user_id') = ? AND json_extract(data, '$.session_id') = ?",
+    execute(
+        "DELETE FROM chat_contexts WHERE user_id = ? AND session_id = ?",
         (user_id, session_id)
     )
-    conn.commit()
-    conn.close()
     return {"ok": True, "session_id": session_id}
 
 
@@ -186,16 +218,17 @@ def test_whoami():
 
 @router.post("/test/db/query", dependencies=[Depends(_require_api_key)])
 def test_db_query(body: TestDbQueryRequest):
+    conn = get_db()
     try:
-        conn = get_db()
         cursor = conn.execute(body.sql, body.params)
         cols = [d[0] for d in cursor.description] if cursor.description else []
         rows = cursor.fetchall()
         conn.commit()
-        conn.close()
         return {"rows": [{cols[i]: row[i] for i in range(len(cols))} for row in rows], "count": len(rows)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
 
 
 @router.get("/test/config", dependencies=[Depends(_require_api_key)])
@@ -7,12 +7,14 @@ from fastapi import APIRouter, Request, Response, HTTPException
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
 from models import RegisterRequest, LoginRequest
-from auth import hash_password, verify_password, create_session, get_current_user, delete_session, get_session_user
-from database import insert_row, get_row, update_row, get_db
+from auth import (
+    hash_password_async, verify_password_async, create_session, get_current_user, delete_session,
+    get_session_user, revoke_all_sessions,
+)
+from database import insert_row, get_row, update_row, query_one, decode_json, run_db
 from config import COOKIE_SECURE, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM, SMTP_FROM_NAME, APP_URL
 from logging_service import log_info
 from file_logger import logger
-import json
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -46,21 +48,14 @@ This link expires in 24 hours and can only be used once.
         s.sendmail(SMTP_FROM, [to_email], msg.as_string())
 
 
-@router.post("/register")
-def register(req: RegisterRequest, response: Response):
-    conn = get_db()
-    existing = conn.execute(
-        "SELECT id FROM users WHERE json_extract(data, '$.username') = ?",
-        (req.username,)
-    ).fetchone()
-    if existing:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Username already taken")
-    conn.close()
+def _username_taken(username: str) -> bool:
+    return query_one("SELECT id FROM users WHERE json_extract(data, '$.username') = ?", (username,)) is not None
 
+
+def _create_user(req: RegisterRequest, password_hash: str) -> tuple[int, dict, str]:
     user_data = {
         "username": req.username,
-        "password_hash": hash_password(req.password),
+        "password_hash": password_hash,
         "display_name": req.display_name or req.username,
         "is_admin": False,
         "openai_api_key": None,
@@ -69,27 +64,40 @@ def register(req: RegisterRequest, response: Response):
     }
     user_id = insert_row("users", user_data)
     token = create_session(user_id)
-    response.set_cookie("session_token", token, httponly=True, secure=COOKIE_SECURE, samesite="lax", max_age=72*3600)
     log_info("auth", "register", f"User {req.username} registered", user_id=user_id)
+    return user_id, user_data, token
+
+
+@router.post("/register")
+async def register(req: RegisterRequest, response: Response):
+    if await run_db(_username_taken, req.username):
+        raise HTTPException(status_code=400, detail="Username already taken")
+    password_hash = await hash_password_async(req.password)
+    user_id, user_data, token = await run_db(_create_user, req, password_hash)
+    response.set_cookie("session_token", token, httponly=True, secure=COOKIE_SECURE, samesite="lax", max_age=72*3600)
     return {"id": user_id, "username": req.username, "display_name": user_data["display_name"]}
 
 
+def _start_login(user_id: int, username: str) -> str:
+    token = create_session(user_id)
+    log_info("auth", "login", f"User {username} logged in", user_id=user_id)
+    return token
+
+
 @router.post("/login")
-def login(req: LoginRequest, response: Response):
-    conn = get_db()
-    row = conn.execute(
-        "SELECT * FROM users WHERE json_extract(data, '$.username') = ?",
-        (req.username,)
-    ).fetchone()
-    conn.close()
+async def login(req: LoginRequest, response: Response):
+    row = await run_db(
+        query_one,
+        "SELECT id, data, created_at, updated_at FROM users WHERE json_extract(data, '$.username') = ?",
+        (req.username,),
+    )
     if row is None:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user_data = json.loads(row["data"])
-    if not verify_password(req.password, user_data["password_hash"]):
+    user_data = decode_json(row["data"])
+    if not await verify_password_async(req.password, user_data["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_session(row["id"])
+    token = await run_db(_start_login, row["id"], req.username)
     response.set_cookie("session_token", token, httponly=True, secure=COOKIE_SECURE, samesite="lax", max_age=72*3600)
-    log_info("auth", "login", f"User {req.username} logged in", user_id=row["id"])
     return {
         "id": row["id"],
         "username": user_data["username"],
@@ -108,6 +116,15 @@ def logout(request: Request, response: Response):
     return {"ok": True}
 
 
+@router.post("/logout-all")
+def logout_all(request: Request, response: Response):
+    """End every session for the current user, on all devices."""
+    user = get_current_user(request)
+    revoke_all_sessions(user["id"])
+    response.delete_cookie("session_token")
+    return {"ok": True}
+
+
 @router.get("/me")
 def me(request: Request):
     user = get_current_user(request)
@@ -133,10 +150,7 @@ def magic_link(token: str):
         return RedirectResponse(url=f"/#/setup-password?token={token}", status_code=302)
 
     # Returning user: burn token, create session, redirect to welcome
-    conn = get_db()
-    conn.execute("DELETE FROM sessions WHERE json_extract(data, '$.session_token') = ?", (token,))
-    conn.commit()
-    conn.close()
+    delete_session(token)
 
     session_token = create_session(user["id"])
     log_info("auth", "magic_login", f"Magic link login for user {user['id']}", user_id=user["id"])
@@ -146,10 +160,26 @@ def magic_link(token: str):
     return redirect
 
 
+def _finish_password_setup(user_id: int, password_hash: str) -> str:
+    # Save password, clear setup flag
+    row = get_row("users", user_id)
+    data = row["data"]
+    data["password_hash"] = password_hash
+    data["needs_password_setup"] = False
+    update_row("users", user_id, data)
+
+    # A password change ends every other session, the magic token included
+    revoke_all_sessions(user_id)
+
+    session_token = create_session(user_id)
+    log_info("auth", "setup_password", f"User {user_id} set password", user_id=user_id)
+    return session_token
+
+
 @router.post("/setup-password")
-def setup_password(req: SetPasswordRequest, response: Response):
+async def setup_password(req: SetPasswordRequest, response: Response):
     """Complete first-time setup: validate magic token, set password, create session."""
-    user = get_session_user(req.token)
+    user = await run_db(get_session_user, req.token)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid or expired link")
     if not user.get("needs_password_setup"):
@@ -157,22 +187,9 @@ def setup_password(req: SetPasswordRequest, response: Response):
     if len(req.password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
-    # Save password, clear setup flag
-    row = get_row("users", user["id"])
-    data = row["data"]
-    data["password_hash"] = hash_password(req.password)
-    data["needs_password_setup"] = False
-    update_row("users", user["id"], data)
-
-    # Burn the magic token
-    conn = get_db()
-    conn.execute("DELETE FROM sessions WHERE json_extract(data, '$.session_token') = ?", (req.token,))
-    conn.commit()
-    conn.close()
-
-    session_token = create_session(user["id"])
+    password_hash = await hash_password_async(req.password)
+    session_token = await run_db(_finish_password_setup, user["id"], password_hash)
     response.set_cookie("session_token", session_token, httponly=True, secure=COOKIE_SECURE, samesite="lax", max_age=72*3600)
-    log_info("auth", "setup_password", f"User {user['id']} set password", user_id=user["id"])
 
     return {
         "id": user["id"],
@@ -185,12 +202,10 @@ def setup_password(req: SetPasswordRequest, response: Response):
 @router.post("/request-magic-link")
 def request_magic_link(req: RequestMagicLinkRequest):
     """Send a magic sign-in link to an existing user's email."""
-    conn = get_db()
-    row = conn.execute(
-        "SELECT id, data FROM users WHERE json_extract(data, '$.email') = ?",
+    row = query_one(
+        "SELECT id, data FROM users WHERE email = ?",
         (req.email,)
-    ).fetchone()
-    conn.close()
+    )
 
     # Always return ok — don't leak whether email exists
     if not row:
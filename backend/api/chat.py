@@ -4,8 +4,9 @@ import json
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from models import ChatRequest, SessionRenameRequest
-from auth import get_current_user
-from database import insert_row, get_rows, get_row, count_rows, get_db, _row_to_dict
+from auth import get_current_user, get_current_user_async
+from agents.executor import check_capacity
+from database import insert_row, get_rows, get_row, count_rows, query_all, execute, run_db, _row_to_dict
 from logging_service import log_info, log_error
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
@@ -15,24 +16,28 @@ graph_runner = None
 
 @router.post("")
 async def chat(request: Request, body: ChatRequest):
-    user = get_current_user(request)
+    user = await get_current_user_async(request)
     if graph_runner is None:
         raise HTTPException(status_code=503, detail="Agent system not initialized")
     try:
-        result = await graph_runner(user["id"], body.message, body.session_id or "default")
-        log_info("chat", "message", f"Chat message processed", user_id=user["id"])
+        result = await graph_runner(user["id"], body.message, body.session_id or "default", user=user)
+        await run_db(log_info, "chat", "message", f"Chat message processed", user_id=user["id"])
         return result
+    except HTTPException:
+        raise  # 429 from the agent pool
     except Exception as e:
-        log_error("chat", "error", str(e), user_id=user["id"])
+        await run_db(log_error, "chat", "error", str(e), user_id=user["id"])
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/stream")
 async def chat_stream(request: Request, body: ChatRequest):
-    user = get_current_user(request)
+    user = await get_current_user_async(request)
     if graph_runner is None:
         raise HTTPException(status_code=503, detail="Agent system not initialized")
     if not hasattr(graph_runner, 'run_stream'):
         raise HTTPException(status_code=503, detail="Streaming not available")
+    # Refuse before the 200 goes out; once streaming, a refusal can only be an error event
+    check_capacity()
 
     queue = asyncio.Queue()
     loop = asyncio.get_event_loop()
@@ -43,10 +48,15 @@ async def chat_stream(request: Request, body: ChatRequest):
     async def run_graph():
         try:
             result = await graph_runner.run_stream(
-                user["id"], body.message, body.session_id or "default", on_event)
+                user["id"], body.message, body.session_id or "default", on_event, user=user)
             loop.call_soon_threadsafe(queue.put_nowait, ("done", result))
+        except HTTPException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", {
+                "detail": e.detail, "status": e.status_code,
+                "retry_after": int((e.headers or {}).get("Retry-After", 0)) or None,
+            }))
         except Exception as e:
-            log_error("chat", "stream_error", str(e), user_id=user["id"])
+            await run_db(log_error, "chat", "stream_error", str(e), user_id=user["id"])
             loop.call_soon_threadsafe(queue.put_nowait, ("error", {"detail": str(e)}))
         finally:
             loop.call_soon_threadsafe(queue.put_nowait, ("__end__", None))
@@ -61,7 +71,7 @@ async def chat_stream(request: Request, body: ChatRequest):
             yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
         await task
 
-    log_info("chat", "stream", "Streaming chat started", user_id=user["id"])
+    await run_db(log_info, "chat", "stream", "Streaming chat started", user_id=user["id"])
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
@@ -79,31 +89,26 @@ def get_sessions(request: Request):
 @router.get("/history")
 def get_history(request: Request, session_id: str = "default"):
     user = get_current_user(request)
-    conn = get_db()
-    rows = conn.execute("""
-        SELECT * FROM chat_contexts
-        WHERE json_extract(data, '$.user_id') = ?
-          AND json_extract(data, '$.session_id') = ?
-          AND json_extract(data, '$.role') != 'session_meta'
+    rows = query_all("""
+        SELECT id, data, created_at, updated_at FROM chat_contexts
+        WHERE user_id = ?
+          AND session_id = ?
+          AND role != 'session_meta'
         ORDER BY id ASC
         LIMIT 200
-    """, (user["id"], session_id)).fetchall()
-    conn.close()
+    """, (user["id"], session_id))
     return {"items": [_row_to_dict(r) for r in rows]}
 
 @router.patch("/sessions/{session_id}/rename")
 def rename_session(request: Request, session_id: str, body: SessionRenameRequest):
     user = get_current_user(request)
     name = body.name.strip()[:80]
-    conn = get_db()
-    conn.execute("""
+    execute("""
         DELETE FROM chat_contexts
-        WHERE json_extract(data, '$.user_id') = ?
-          AND json_extract(data, '$.session_id') = ?
-          AND json_extract(data, '$.role') = 'session_meta'
+        WHERE user_id = ?
+          AND session_id = ?
+          AND role = 'session_meta'
     """, (user["id"], session_id))
-    conn.commit()
-    conn.close()
     if name:
         insert_row("chat_contexts", {
             "user_id": user["id"],
@@ -126,13 +131,10 @@ def delete_message(request: Request, message_id: int):
 @router.delete("/history")
 def clear_history(request: Request, session_id: str = "default"):
     user = get_current_user(request)
-    conn = get_db()
-    conn.execute(
-        "DELETE FROM chat_contexts WHERE json_extract(data, '$.user_id') = ? AND json_extract(data, '$.session_id') = ?",
+    execute(
+        "DELETE FROM chat_contexts WHERE user_id = ? AND session_id = ?",
         (user["id"], session_id)
     )
-    conn.commit()
-    conn.close()
     # Also reset in-memory conversation state
     if graph_runner and hasattr(graph_runner, 'reset'):
         graph_runner.reset(user["id"], session_id)
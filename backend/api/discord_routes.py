@@ -9,23 +9,22 @@ POST /api/discord/schedule     — queue a proactive ping (authenticated)
 
 import hashlib
 import hmac as _hmac
-import json
 import time
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlencode
 from zoneinfo import ZoneInfo
 
 import httpx
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import RedirectResponse
 
-from auth import get_current_user
+from auth import current_user_row, get_current_user, invalidate_user
 from config import (
     ADMIN_API_KEY, APP_URL,
     DISCORD_BOT_TOKEN, DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET,
     SECRET_KEY,
 )
-from database import get_db, get_row, insert_row, update_row
+from database import query_one, query_all, get_row, insert_row, update_row, run_db, _row_to_dict
 from file_logger import logger
 
 router = APIRouter(prefix="/api/discord", tags=["discord"])
@@ -128,28 +127,33 @@ async def discord_callback(code: str = None, state: str = None, error: str = Non
         logger.error(f"[discord/oauth] Token exchange failed: {e}")
         return RedirectResponse("/#/settings?discord=error")
 
-    row = get_row("users", user_id)
-    if not row:
+    if not await run_db(_save_discord_user, user_id, discord_user):
         return RedirectResponse("/#/settings?discord=error")
 
+    logger.info(f"[discord/oauth] user={user_id} connected as {discord_user.get('username')}")
+    return RedirectResponse("/#/settings?discord=connected")
+
+
+def _save_discord_user(user_id: int, discord_user: dict) -> bool:
+    row = get_row("users", user_id)
+    if not row:
+        return False
     data = row["data"]
     data["discord_user_id"] = discord_user["id"]
     data["discord_username"] = discord_user.get("global_name") or discord_user.get("username", "")
     update_row("users", user_id, data)
-
-    logger.info(f"[discord/oauth] user={user_id} connected as {discord_user.get('username')}")
-    return RedirectResponse("/#/settings?discord=connected")
+    invalidate_user(user_id)
+    return True
 
 
 @router.delete("/disconnect")
-def discord_disconnect(request: Request):
+def discord_disconnect(row: dict = Depends(current_user_row)):
     """Remove Discord connection for the current user."""
-    user = get_current_user(request)
-    row = get_row("users", user["id"])
     data = row["data"]
     data.pop("discord_user_id", None)
     data.pop("discord_username", None)
-    update_row("users", user["id"], data)
+    update_row("users", row["id"], data)
+    invalidate_user(row["id"])
     return {"ok": True}
 
 
@@ -176,29 +180,29 @@ async def discord_tick(x_api_key: str = Header(...)):
     DISCORD_SESSION_ID = "discord"
 
     sent = 0
-    for user in _discord_users():
+    for user in await run_db(_discord_users):
         uid = user["id"]
         did = user["data"]["discord_user_id"]
 
-        if _should_send_morning(uid):
+        if await run_db(_should_send_morning, uid):
             await bot.send_dm(did, MORNING_GREETING)
-            _record_morning_sent(uid)
+            await run_db(_record_morning_sent, uid)
             sent += 1
             logger.info(f"[discord/tick] Morning greeting → user={uid}")
 
-        if _should_send_evening(uid):
+        if await run_db(_should_send_evening, uid):
             await bot.send_dm(did, EVENING_GREETING)
-            _record_evening_sent(uid)
+            await run_db(_record_evening_sent, uid)
             if _gr:
-                _gr.set_active_agent(uid, DISCORD_SESSION_ID, "carbon")
+                await _gr.set_active_agent(uid, DISCORD_SESSION_ID, "carbon")
             sent += 1
             logger.info(f"[discord/tick] Evening greeting → user={uid}")
 
-        for ping in _due_pings(uid):
+        for ping in await run_db(_due_pings, uid):
             msg = ping["data"].get("message") or "Hey, checking in — what are you up to?"
             await bot.send_dm(did, msg)
             ping["data"]["sent"] = True
-            update_row("discord_schedules", ping["id"], ping["data"])
+            await run_db(update_row, "discord_schedules", ping["id"], ping["data"])
             sent += 1
             logger.info(f"[discord/tick] Ping → user={uid}: {msg[:60]}")
 
@@ -228,32 +232,15 @@ def schedule_ping(request: Request, minutes: int, message: str = "Hey, checking
 # ---------------------------------------------------------------------------
 
 def _discord_users() -> list[dict]:
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT id, data FROM users WHERE json_extract(data, '$.discord_user_id') IS NOT NULL"
-    ).fetchall()
-    conn.close()
-    result = []
-    for r in rows:
-        d = {"id": r["id"]}
-        try:
-            d["data"] = json.loads(r["data"])
-        except Exception:
-            d["data"] = {}
-        result.append(d)
-    return result
+    rows = query_all(
+        "SELECT id, discord_user_id FROM users WHERE discord_user_id IS NOT NULL"
+    )
+    return [{"id": r["id"], "data": {"discord_user_id": r["discord_user_id"]}} for r in rows]
 
 
 def _user_local_hour(user_id: int) -> int:
-    conn = get_db()
-    row = conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
-    conn.close()
-    tz_str = "UTC"
-    if row:
-        try:
-            tz_str = json.loads(row["data"]).get("timezone") or "UTC"
-        except Exception:
-            pass
+    row = query_one("SELECT json_extract(data, '$.timezone') FROM users WHERE id = ?", (user_id,))
+    tz_str = (row[0] if row else None) or "UTC"
     try:
         tz = ZoneInfo(tz_str)
     except Exception:
@@ -265,14 +252,12 @@ def _should_send_morning(user_id: int) -> bool:
     if not (MORNING_HOUR_START <= _user_local_hour(user_id) < MORNING_HOUR_END):
         return False
     today = datetime.now(timezone.utc).date().isoformat()
-    conn = get_db()
-    row = conn.execute("""
+    row = query_one("""
         SELECT id FROM discord_schedules
-        WHERE json_extract(data, '$.user_id') = ?
-          AND json_extract(data, '$.type') = 'morning'
-          AND json_extract(data, '$.sent_date') = ?
-    """, (user_id, today)).fetchone()
-    conn.close()
+        WHERE user_id = ?
+          AND type = 'morning'
+          AND sent_date = ?
+    """, (user_id, today))
     return row is None
 
 
@@ -289,14 +274,12 @@ def _should_send_evening(user_id: int) -> bool:
     if not (EVENING_HOUR_START <= _user_local_hour(user_id) < EVENING_HOUR_END):
         return False
     today = datetime.now(timezone.utc).date().isoformat()
-    conn = get_db()
-    row = conn.execute("""
+    row = query_one("""
         SELECT id FROM discord_schedules
-        WHERE json_extract(data, '$.user_id') = ?
-          AND json_extract(data, '$.type') = 'evening'
-          AND json_extract(data, '$.sent_date') = ?
-    """, (user_id, today)).fetchone()
-    conn.close()
+        WHERE user_id = ?
+          AND type = 'evening'
+          AND sent_date = ?
+    """, (user_id, today))
     return row is None
 
 
@@ -311,23 +294,13 @@ def _record_evening_sent(user_id: int):
 
 def _due_pings(user_id: int) -> list[dict]:
     now = datetime.now(timezone.utc).isoformat()
-    conn = get_db()
-    rows = conn.execute("""
-        SELECT * FROM discord_schedules
-        WHERE json_extract(data, '$.user_id') = ?
-          AND json_extract(data, '$.type') = 'ping'
-          AND json_extract(data, '$.sent') = 0
-          AND json_extract(data, '$.send_at') <= ?
-        ORDER BY json_extract(data, '$.send_at') ASC
+    rows = query_all("""
+        SELECT id, data, created_at, updated_at FROM discord_schedules
+        WHERE user_id = ?
+          AND type = 'ping'
+          AND sent = 0
+          AND send_at <= ?
+        ORDER BY send_at ASC
         LIMIT 20
-    """, (user_id, now)).fetchall()
-    conn.close()
-    result = []
-    for r in rows:
-        d = dict(r)
-        try:
-            d["data"] = json.loads(d["data"])
-        except Exception:
-            pass
-        result.append(d)
-    return result
+    """, (user_id, now))
+    return [_row_to_dict(r) for r in rows]
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from database import get_rows, get_db
-import json
+from database import get_rows, query_one, _row_to_dict
 
 router = APIRouter(prefix="/api/help", tags=["help"])
 
@@ -14,17 +13,10 @@ def list_articles(category: str = None):
 
 @router.get("/articles/{slug}")
 def get_article(slug: str):
-    conn = get_db()
-    row = conn.execute(
-        "SELECT * FROM help_articles WHERE json_extract(data, '$.slug') = ?",
+    row = query_one(
+        "SELECT id, data, created_at, updated_at FROM help_articles WHERE json_extract(data, '$.slug') = ?",
         (slug,)
-    ).fetchone()
-    conn.close()
+    )
     if row is None:
         raise HTTPException(status_code=404, detail="Article not found")
-    d = dict(row)
-    try:
-        d["data"] = json.loads(d["data"])
-    except (json.JSONDecodeError, TypeError):
-        pass
-    return d
+    return _row_to_dict(row)
@@ -18,8 +18,8 @@ from fastapi import APIRouter, UploadFile, File, Form
 from pydantic import BaseModel
 from openai import OpenAI
 
-from auth import hash_password
-from database import insert_row, get_row, update_row, get_db
+from auth import hash_password, hash_password_async
+from database import insert_row, get_row, update_row, query_one, run_db
 from config import (
     OPENAI_API_KEY, COOKIE_SECURE,
     SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM, SMTP_FROM_NAME,
@@ -149,14 +149,16 @@ This link expires in 24 hours and can only be used once.
         s.sendmail(SMTP_FROM, [to_email], msg.as_string())
 
 
-@router.post("/claim")
-async def onboarding_claim(req: ClaimRequest):
-    conn = get_db()
+def _claim_account(req: ClaimRequest, password_hash: str | None) -> str:
+    """Find or create the user for this email and issue a magic-link token.
 
-    existing = conn.execute(
-        "SELECT id FROM users WHERE json_extract(data, '$.email') = ?",
+    password_hash is the placeholder for a new account, hashed on the
+    password pool beforehand; None when the email already had an account.
+    """
+    existing = query_one(
+        "SELECT id FROM users WHERE email = ?",
         (req.email,)
-    ).fetchone()
+    )
 
     if existing:
         user_id = existing["id"]
@@ -164,16 +166,17 @@ async def onboarding_claim(req: ClaimRequest):
         username_base = req.email.split("@")[0].lower().replace(".", "_").replace("+", "_")
         username = username_base
         suffix = 1
-        while conn.execute(
+        while query_one(
             "SELECT id FROM users WHERE json_extract(data, '$.username') = ?", (username,)
-        ).fetchone():
+        ):
             username = f"{username_base}{suffix}"
             suffix += 1
 
         user_data = {
             "username": username,
             "email": req.email,
-            "password_hash": hash_password(secrets.token_urlsafe(16)),
+            # Unusable until the magic link's setup-password step replaces it
+            "password_hash": password_hash or hash_password(secrets.token_urlsafe(16)),
             "display_name": username_base.replace("_", " ").title(),
             "is_admin": False,
             "openai_api_key": None,
@@ -193,8 +196,6 @@ async def onboarding_claim(req: ClaimRequest):
             "status": "active",
         })
 
-    conn.close()
-
     if req.aspirational_image_b64:
         row = get_row("users", user_id)
         data = row["data"]
@@ -209,7 +210,14 @@ async def onboarding_claim(req: ClaimRequest):
         "expires_at": expires_at,
         "type": "magic",
     })
+    return token
 
+
+@router.post("/claim")
+async def onboarding_claim(req: ClaimRequest):
+    existing = await run_db(query_one, "SELECT id FROM users WHERE email = ?", (req.email,))
+    password_hash = None if existing else await hash_password_async(secrets.token_urlsafe(16))
+    token = await run_db(_claim_account, req, password_hash)
     magic_url = f"{APP_URL}/api/auth/magic?token={token}"
 
     try:
@@ -0,0 +1,74 @@
+"""Cursor pagination for list endpoints.
+
+List responses carry opaque `next_cursor` / `prev_cursor` tokens. Passing one
+back as `?cursor=` pages by id key (constant cost at any depth) instead of
+OFFSET. `offset` is still accepted for the first request so existing clients
+keep working.
+
+`total` controls the count that accompanies each page:
+  exact  — COUNT(*) over the filter (default, what the UI shows)
+  approx — bounded estimate (see database.estimate_rows), flagged total_approx
+  none   — skip counting; total is null
+"""
+
+import base64
+import json
+from typing import Literal
+
+from fastapi import HTTPException
+from database import get_rows, count_rows, estimate_rows
+
+TotalMode = Literal["exact", "approx", "none"]
+
+
+def encode_cursor(row_id: int, direction: str) -> str:
+    raw = json.dumps({"id": row_id, "d": direction}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        row_id, direction = int(data["id"]), data["d"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if direction not in ("next", "prev"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return row_id, direction
+
+
+def paginate(table: str, filters: dict = None, limit: int = 50, offset: int = 0,
+             cursor: str | None = None, total: TotalMode = "exact", order_desc: bool = True,
+             fields: list[str] | None = None) -> dict:
+    """One page of rows plus cursors for the neighbouring pages."""
+    key, direction = decode_cursor(cursor) if cursor else (None, "next")
+    # "next" continues past the key in display order, "prev" comes back before it
+    forward = (direction == "next") == order_desc
+    rows = get_rows(
+        table, filters=filters, limit=limit + 1, offset=0 if cursor else offset, order_desc=order_desc,
+        before_id=key if key is not None and forward else None,
+        after_id=key if key is not None and not forward else None,
+        fields=fields,
+    )
+    more = len(rows) > limit
+    if direction == "prev":
+        rows = rows[1:] if more else rows
+        has_prev, has_next = more, True
+    else:
+        rows = rows[:limit]
+        has_prev, has_next = cursor is not None or offset > 0, more
+
+    page = {
+        "items": rows,
+        "next_cursor": encode_cursor(rows[-1]["id"], "next") if rows and has_next else None,
+        "prev_cursor": encode_cursor(rows[0]["id"], "prev") if rows and has_prev else None,
+    }
+    if total == "exact":
+        page["total"] = count_rows(table, filters=filters)
+    elif total == "approx":
+        page["total"] = estimate_rows(table, filters=filters)
+        page["total_approx"] = True
+    else:
+        page["total"] = None
+    return page
@@ -2,18 +2,17 @@ from fastapi import APIRouter, Request, HTTPException
 from typing import Optional
 from models import OneTimeTaskCreate, RecurringTaskCreate, RecurringCompleteRequest, DataUpdate
 from auth import get_current_user
-from database import insert_row, get_row, get_rows, update_row, delete_row, count_rows, _now
+from database import insert_row, get_row, update_row, delete_row, _now
+from api.pagination import paginate, TotalMode
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
 # --- One-time tasks ---
 
 @router.get("/one-time")
-def list_one_time(request: Request, limit: int = 50, offset: int = 0):
+def list_one_time(request: Request, limit: int = 50, offset: int = 0, cursor: str | None = None, total: TotalMode = "exact"):
     user = get_current_user(request)
-    rows = get_rows("one_time_tasks", filters={"user_id": user["id"]}, limit=limit, offset=offset)
-    total = count_rows("one_time_tasks", filters={"user_id": user["id"]})
-    return {"items": rows, "total": total}
+    return paginate("one_time_tasks", filters={"user_id": user["id"]}, limit=limit, offset=offset, cursor=cursor, total=total)
 
 @router.post("/one-time")
 def create_one_time(request: Request, body: OneTimeTaskCreate):
@@ -65,11 +64,9 @@ def complete_one_time(request: Request, task_id: int):
 # --- Recurring tasks ---
 
 @router.get("/recurring")
-def list_recurring(request: Request, limit: int = 50, offset: int = 0):
+def list_recurring(request: Request, limit: int = 50, offset: int = 0, cursor: str | None = None, total: TotalMode = "exact"):
     user = get_current_user(request)
-    rows = get_rows("recurring_tasks", filters={"user_id": user["id"]}, limit=limit, offset=offset)
-    total = count_rows("recurring_tasks", filters={"user_id": user["id"]})
-    return {"items": rows, "total": total}
+    return paginate("recurring_tasks", filters={"user_id": user["id"]}, limit=limit, offset=offset, cursor=cursor, total=total)
 
 @router.post("/recurring")
 def create_recurring(request: Request, body: RecurringTaskCreate):
@@ -1,16 +1,15 @@
 from fastapi import APIRouter, Request, HTTPException
 from models import UserStateCreate, DataUpdate
 from auth import get_current_user
-from database import insert_row, get_row, get_rows, update_row, delete_row, count_rows
+from database import insert_row, get_row, update_row, delete_row
+from api.pagination import paginate, TotalMode
 
 router = APIRouter(prefix="/api/user-states", tags=["user_states"])
 
 @router.get("")
-def list_states(request: Request, limit: int = 50, offset: int = 0):
+def list_states(request: Request, limit: int = 50, offset: int = 0, cursor: str | None = None, total: TotalMode = "exact"):
     user = get_current_user(request)
-    rows = get_rows("user_states", filters={"user_id": user["id"]}, limit=limit, offset=offset)
-    total = count_rows("user_states", filters={"user_id": user["id"]})
-    return {"items": rows, "total": total}
+    return paginate("user_states", filters={"user_id": user["id"]}, limit=limit, offset=offset, cursor=cursor, total=total)
 
 @router.post("")
 def create_state(request: Request, body: UserStateCreate):
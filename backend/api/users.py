@@ -1,18 +1,16 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends
 from models import ApiKeyUpdate, DataUpdate
-from auth import get_current_user
-from database import get_row, update_row, count_rows
+from auth import current_user_row, invalidate_user
+from database import update_row, count_rows
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 @router.get("/me")
-def get_profile(request: Request):
-    user = get_current_user(request)
-    row = get_row("users", user["id"])
+def get_profile(row: dict = Depends(current_user_row)):
     data = row["data"]
-    is_new = count_rows("user_states", filters={"user_id": user["id"]}) == 0
+    is_new = count_rows("user_states", filters={"user_id": row["id"]}) == 0
     return {
-        "id": user["id"],
+        "id": row["id"],
         "username": data["username"],
         "display_name": data.get("display_name", data["username"]),
         "theme": data.get("theme", "dark"),
@@ -26,22 +24,20 @@ def get_profile(request: Request):
     }
 
 @router.put("/me")
-def update_profile(request: Request, body: DataUpdate):
-    user = get_current_user(request)
-    row = get_row("users", user["id"])
+def update_profile(body: DataUpdate, row: dict = Depends(current_user_row)):
     data = row["data"]
     allowed = {"display_name", "theme", "settings", "timezone"}
     for key in allowed:
         if key in body.data:
             data[key] = body.data[key]
-    update_row("users", user["id"], data)
+    update_row("users", row["id"], data)
+    invalidate_user(row["id"])
     return {"ok": True}
 
 @router.put("/me/api-key")
-def update_api_key(request: Request, body: ApiKeyUpdate):
-    user = get_current_user(request)
-    row = get_row("users", user["id"])
+def update_api_key(body: ApiKeyUpdate, row: dict = Depends(current_user_row)):
     data = row["data"]
     data["openai_api_key"] = body.openai_api_key
-    update_row("users", user["id"], data)
+    update_row("users", row["id"], data)
+    invalidate_user(row["id"])
     return {"ok": True, "has_api_key": bool(body.openai_api_key)}
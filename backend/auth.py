@@ -1,10 +1,22 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import math
 import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from fastapi import Request, HTTPException
 import bcrypt
-from database import get_db, insert_row, get_rows, _now
-from config import SESSION_EXPIRE_HOURS
-import json
+from database import query_one, query_all, execute, insert_row, get_row, update_row, transaction, run_db, decode_json
+from config import (
+    SECRET_KEY, SESSION_MODE, SESSION_EXPIRE_HOURS, SESSION_CACHE_TTL, SESSION_CACHE_MAX, SESSION_SWEEP_MINUTES, SESSION_SWEEP_BATCH,
+    PASSWORD_WORKERS, PASSWORD_QUEUE_MAX,
+)
+from logging_service import log_info, log_error
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
@@ -12,7 +24,99 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return bcrypt.checkpw(password.encode(), password_hash.encode())
 
+
+# ---------------------------------------------------------------------------
+# Password pool
+#
+# bcrypt burns ~250 ms of CPU per call. Request handlers don't run it inline:
+# hash_password_async/verify_password_async queue it on a dedicated pool of
+# PASSWORD_WORKERS threads (bcrypt releases the GIL), so a burst of logins
+# can't take over the shared threadpool or the VM's CPU. At most
+# PASSWORD_QUEUE_MAX jobs wait behind the workers; past that the request is
+# turned away with a 429 and a Retry-After estimate. The sync functions
+# above remain for startup seeding.
+# ---------------------------------------------------------------------------
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_password_lock = threading.Lock()
+_password_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "pending": 0,
+    "pending_max": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "run_ms_total": 0.0,
+}
+
+
+def _retry_after_seconds() -> int:
+    # Caller holds _password_lock
+    done = _password_stats["completed"]
+    run_ms = _password_stats["run_ms_total"] / done if done else 250
+    return max(1, math.ceil(_password_stats["pending"] * run_ms / PASSWORD_WORKERS / 1000))
+
+
+async def _run_password_job(fn, *args):
+    with _password_lock:
+        if _password_stats["pending"] >= PASSWORD_WORKERS + PASSWORD_QUEUE_MAX:
+            _password_stats["rejected"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many sign-ins in progress, please retry shortly",
+                headers={"Retry-After": str(_retry_after_seconds())},
+            )
+        _password_stats["pending"] += 1
+        _password_stats["pending_max"] = max(_password_stats["pending_max"], _password_stats["pending"])
+    queued_at = time.monotonic()
+
+    def job():
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            # Accounted here, not in the awaiting coroutine, so a cancelled
+            # request still holds its slot until the work actually finishes
+            finished = time.monotonic()
+            with _password_lock:
+                waited_ms = (started - queued_at) * 1000
+                _password_stats["pending"] -= 1
+                _password_stats["completed"] += 1
+                _password_stats["wait_ms_total"] += waited_ms
+                _password_stats["wait_ms_max"] = max(_password_stats["wait_ms_max"], waited_ms)
+                _password_stats["run_ms_total"] += (finished - started) * 1000
+
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, job)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password pool. Raises 429 when the pool is saturated."""
+    return await _run_password_job(hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """verify_password on the password pool. Raises 429 when the pool is saturated."""
+    return await _run_password_job(verify_password, password, password_hash)
+
+
+def password_pool_stats() -> dict:
+    """Snapshot of password pool counters for the admin metrics endpoint."""
+    with _password_lock:
+        done = _password_stats["completed"]
+        return {
+            "workers": PASSWORD_WORKERS,
+            "queue_max": PASSWORD_QUEUE_MAX,
+            **_password_stats,
+            "wait_ms_total": round(_password_stats["wait_ms_total"], 2),
+            "wait_ms_max": round(_password_stats["wait_ms_max"], 2),
+            "run_ms_total": round(_password_stats["run_ms_total"], 2),
+            "wait_ms_avg": round(_password_stats["wait_ms_total"] / done, 2) if done else None,
+            "run_ms_avg": round(_password_stats["run_ms_total"] / done, 2) if done else None,
+        }
+
 def create_session(user_id: int) -> str:
+    if SESSION_MODE == "signed":
+        return _sign_session(user_id)
     token = secrets.token_urlsafe(32)
     expires_at = (datetime.now(timezone.utc) + timedelta(hours=SESSION_EXPIRE_HOURS)).isoformat()
     insert_row("sessions", {
@@ -22,42 +126,347 @@ def create_session(user_id: int) -> str:
     })
     return token
 
+
+# ---------------------------------------------------------------------------
+# Signed sessions (SESSION_MODE=signed)
+#
+# The cookie carries its own claims, HMAC-signed with SECRET_KEY like the
+# Discord OAuth state:  s1.<user_id>.<expires>.<session_version>.<jti>.<sig>
+# Checking one needs no sessions-table read — only the user row, which the
+# session cache below usually already has. A token is rejected when:
+#   - its jti is on the revocation list (logout of that one token), or
+#   - its session_version is behind the user's (password change, "log out
+#     everywhere"), see revoke_all_sessions().
+# The revocation list is held in memory and mirrored in revoked_tokens so it
+# survives restarts; entries are swept once the token would have expired.
+# Magic-link tokens stay in the sessions table in either mode, and
+# sessions-table tokens keep working after a switch to signed mode until they
+# expire. Signed tokens are only accepted while SESSION_MODE=signed, which
+# refuses to start with the default SECRET_KEY (check_session_config).
+# ---------------------------------------------------------------------------
+
+_SIGNED_PREFIX = "s1."
+_DEFAULT_SECRET_KEY = "dev-secret-key"
+
+
+def check_session_config():
+    """Called at startup: signed sessions are only as safe as SECRET_KEY."""
+    if SESSION_MODE == "signed" and SECRET_KEY == _DEFAULT_SECRET_KEY:
+        raise RuntimeError("SESSION_MODE=signed requires SECRET_KEY to be set to a private random value")
+
+_revoked: dict[str, float] = {}  # jti -> token expiry (epoch seconds)
+_revoked_lock = threading.Lock()
+_revoked_loaded = {"done": False}
+
+
+def _signature(payload: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), f"session:{payload}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def _sign_session(user_id: int, session_version: int | None = None) -> str:
+    if session_version is None:
+        row = query_one("SELECT json_extract(data, '$.session_version') FROM users WHERE id = ?", (user_id,))
+        session_version = (row[0] if row else None) or 0
+    expires = int(time.time() + SESSION_EXPIRE_HOURS * 3600)
+    payload = f"{user_id}.{expires}.{session_version}.{secrets.token_urlsafe(12)}"
+    return f"{_SIGNED_PREFIX}{payload}.{_signature(payload)}"
+
+
+def _signed_claims(token: str) -> dict | None:
+    """Claims of a well-formed, correctly signed token (expiry and revocation not checked)."""
+    try:
+        user_id, expires, version, jti, sig = token[len(_SIGNED_PREFIX):].split(".")
+        if not hmac.compare_digest(sig, _signature(f"{user_id}.{expires}.{version}.{jti}")):
+            return None
+        return {"user_id": int(user_id), "expires": int(expires), "session_version": int(version), "jti": jti}
+    except ValueError:
+        return None
+
+
+def _is_revoked(jti: str) -> bool:
+    with _revoked_lock:
+        loaded = _revoked_loaded["done"]
+    if not loaded:
+        rows = query_all("SELECT jti, json_extract(data, '$.expires') FROM revoked_tokens WHERE expires_at >= ?",
+                         (datetime.now(timezone.utc).isoformat(),))
+        with _revoked_lock:
+            for r in rows:
+                _revoked[r[0]] = r[1]
+            _revoked_loaded["done"] = True
+    with _revoked_lock:
+        return jti in _revoked
+
+
+def _revoke_signed(token: str):
+    claims = _signed_claims(token)
+    if claims is None or claims["expires"] < time.time():
+        return
+    with _revoked_lock:
+        _revoked[claims["jti"]] = claims["expires"]
+    insert_row("revoked_tokens", {
+        "jti": claims["jti"],
+        "user_id": claims["user_id"],
+        "expires": claims["expires"],
+        "expires_at": datetime.fromtimestamp(claims["expires"], timezone.utc).isoformat(),
+    })
+
+
+def _load_signed_session_user(token: str, loaded: dict | None = None) -> dict | None:
+    claims = _signed_claims(token)
+    if claims is None or claims["expires"] < time.time() or _is_revoked(claims["jti"]):
+        return None
+    user_data = _load_user(claims["user_id"], loaded)
+    if user_data is None or (user_data.get("session_version") or 0) != claims["session_version"]:
+        return None
+    _cache_put(token, datetime.fromtimestamp(claims["expires"], timezone.utc), user_data)
+    return user_data
+
+
+def revoke_all_sessions(user_id: int):
+    """Log a user out everywhere: bump session_version and drop their stored sessions."""
+    with transaction():
+        row = get_row("users", user_id)
+        if row is not None:
+            data = row["data"]
+            data["session_version"] = (data.get("session_version") or 0) + 1
+            update_row("users", user_id, data)
+        execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+    invalidate_user(user_id)
+
+# ---------------------------------------------------------------------------
+# Session cache
+#
+# token -> user, LRU-bounded at SESSION_CACHE_MAX entries, each trusted for
+# SESSION_CACHE_TTL seconds (and never past the session's own expiry). Code
+# that changes a user row or removes a session must call invalidate_user()
+# or delete_session() so the next request sees the change.
+# ---------------------------------------------------------------------------
+
+_session_cache: OrderedDict[str, tuple[float, datetime, dict]] = OrderedDict()
+_tokens_by_user: dict[int, set[str]] = {}
+_session_cache_lock = threading.Lock()
+_session_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _cache_get(token: str) -> dict | None:
+    with _session_cache_lock:
+        entry = _session_cache.get(token)
+        if entry is not None:
+            fresh_until, expires_at, user = entry
+            if time.monotonic() < fresh_until and datetime.now(timezone.utc) <= expires_at:
+                _session_cache.move_to_end(token)
+                _session_cache_stats["hits"] += 1
+                return dict(user)
+            _cache_drop(token)
+        _session_cache_stats["misses"] += 1
+        return None
+
+
+def _cache_put(token: str, expires_at: datetime, user: dict):
+    if SESSION_CACHE_TTL <= 0:
+        return
+    with _session_cache_lock:
+        _cache_drop(token)
+        _session_cache[token] = (time.monotonic() + SESSION_CACHE_TTL, expires_at, dict(user))
+        _tokens_by_user.setdefault(user["id"], set()).add(token)
+        while len(_session_cache) > SESSION_CACHE_MAX:
+            _cache_drop(next(iter(_session_cache)))
+            _session_cache_stats["evictions"] += 1
+
+
+def _cache_drop(token: str):
+    # Caller holds _session_cache_lock
+    entry = _session_cache.pop(token, None)
+    if entry is not None:
+        tokens = _tokens_by_user.get(entry[2]["id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del _tokens_by_user[entry[2]["id"]]
+
+
+def invalidate_user(user_id: int):
+    """Forget cached sessions for a user whose row changed (profile, API key, Discord link, deletion)."""
+    with _session_cache_lock:
+        for token in list(_tokens_by_user.get(user_id, ())):
+            _cache_drop(token)
+            _session_cache_stats["invalidations"] += 1
+
+
+def session_cache_stats() -> dict:
+    """Snapshot of session cache counters for the admin metrics endpoint."""
+    with _session_cache_lock:
+        lookups = _session_cache_stats["hits"] + _session_cache_stats["misses"]
+        return {
+            "session_mode": SESSION_MODE,
+            "revoked_tokens": len(_revoked),
+            "ttl_seconds": SESSION_CACHE_TTL,
+            "max_entries": SESSION_CACHE_MAX,
+            "entries": len(_session_cache),
+            **_session_cache_stats,
+            "hit_rate": round(_session_cache_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Expired-session sweeper
+#
+# Sessions that are never presented again (abandoned logins, unused 24-hour
+# magic links) would otherwise stay forever. Every SESSION_SWEEP_MINUTES the
+# sweeper deletes expired rows via the expires_at index, SESSION_SWEEP_BATCH
+# per write so it never holds the write lock for long.
+# ---------------------------------------------------------------------------
+
+_sweeper_stats = {"runs": 0, "deleted": 0, "last_run_at": None, "last_deleted": 0, "last_duration_ms": None}
+
+
+def sweep_expired_sessions() -> int:
+    """Delete every session whose expires_at has passed. Returns how many were removed."""
+    start = time.monotonic()
+    now = datetime.now(timezone.utc).isoformat()
+    deleted = 0
+    # Revocations only matter until the token they name would have expired
+    for table in ("sessions", "revoked_tokens"):
+        while True:
+            removed = execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE expires_at < ? LIMIT ?)",
+                (now, SESSION_SWEEP_BATCH),
+            )
+            if table == "sessions":
+                deleted += removed
+            if removed < SESSION_SWEEP_BATCH:
+                break
+    with _revoked_lock:
+        for jti in [j for j, expires in _revoked.items() if expires < time.time()]:
+            del _revoked[jti]
+    _sweeper_stats["runs"] += 1
+    _sweeper_stats["deleted"] += deleted
+    _sweeper_stats["last_run_at"] = now
+    _sweeper_stats["last_deleted"] = deleted
+    _sweeper_stats["last_duration_ms"] = round((time.monotonic() - start) * 1000, 2)
+    return deleted
+
+
+def session_sweeper_stats() -> dict:
+    """Sweeper counters for the admin metrics endpoint."""
+    return {"interval_minutes": SESSION_SWEEP_MINUTES, "batch": SESSION_SWEEP_BATCH, **_sweeper_stats}
+
+
+async def session_sweeper_loop():
+    """Background task: sweep at startup, then every SESSION_SWEEP_MINUTES."""
+    while True:
+        try:
+            deleted = await run_db(sweep_expired_sessions)
+            if deleted:
+                await run_db(log_info, "auth", "session_sweep", f"Deleted {deleted} expired sessions")
+        except Exception as e:
+            log_error("auth", "session_sweep", f"Session sweep failed: {e}")
+        await asyncio.sleep(SESSION_SWEEP_MINUTES * 60)
+
+
 def get_session_user(token: str) -> dict | None:
-    conn = get_db()
-    row = conn.execute(
-        "SELECT * FROM sessions WHERE json_extract(data, '$.session_token') = ?",
+    user = _cache_get(token)
+    return user if user is not None else _load_session_user(token)
+
+
+def _load_session_user(token: str, loaded: dict | None = None) -> dict | None:
+    """Session user for a token, from the database. See _load_user for `loaded`."""
+    if token.startswith(_SIGNED_PREFIX):
+        return _load_signed_session_user(token, loaded) if SESSION_MODE == "signed" else None
+    row = query_one(
+        "SELECT id, data, created_at, updated_at FROM sessions WHERE json_extract(data, '$.session_token') = ?",
         (token,)
-    ).fetchone()
+    )
     if row is None:
-        conn.close()
         return None
-    session_data = json.loads(row["data"])
+    session_data = decode_json(row["data"])
     expires_at = datetime.fromisoformat(session_data["expires_at"])
     if datetime.now(timezone.utc) > expires_at:
-        conn.execute("DELETE FROM sessions WHERE id = ?", (row["id"],))
-        conn.commit()
-        conn.close()
+        execute("DELETE FROM sessions WHERE id = ?", (row["id"],))
         return None
-    user_row = conn.execute(
-        "SELECT * FROM users WHERE id = ?",
-        (session_data["user_id"],)
-    ).fetchone()
-    conn.close()
+    user_data = _load_user(session_data["user_id"], loaded)
+    if user_data is None:
+        return None
+    _cache_put(token, expires_at, user_data)
+    return user_data
+
+
+def _load_user(user_id: int, loaded: dict | None = None) -> dict | None:
+    # The aspirational image (hundreds of KB) is only read by /api/users/me
+    # and the other current_user_row handlers — keep it out of the decode and
+    # the cache. Those pass `loaded`: the full row is read once, stored as
+    # loaded["row"], and the session user is built from it.
+    if loaded is not None:
+        row = loaded["row"] = get_row("users", user_id)
+        if row is None:
+            return None
+        user_data = dict(row["data"])
+        user_data.pop("aspirational_image_b64", None)
+        user_data["id"] = row["id"]
+        return user_data
+    user_row = query_one(
+        "SELECT id, json_remove(data, '$.aspirational_image_b64') AS data FROM users WHERE id = ?",
+        (user_id,)
+    )
     if user_row is None:
         return None
-    user_data = json.loads(user_row["data"])
+    user_data = decode_json(user_row["data"])
     user_data["id"] = user_row["id"]
     return user_data
 
 def get_current_user(request: Request) -> dict:
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
     token = request.cookies.get("session_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     user = get_session_user(token)
     if not user:
         raise HTTPException(status_code=401, detail="Session expired")
+    request.state.user = user
     return user
 
+async def get_current_user_async(request: Request, loaded: dict | None = None) -> dict:
+    """get_current_user for async routes — a cache miss runs the session lookup on the DB executor.
+
+    `loaded`, if given, receives the full users row when the lookup reads it.
+    """
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    token = request.cookies.get("session_token")
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = _cache_get(token)
+    if user is None:
+        user = await run_db(_load_session_user, token, loaded)
+    if not user:
+        raise HTTPException(status_code=401, detail="Session expired")
+    request.state.user = user
+    return user
+
+async def current_user_row(request: Request) -> dict:
+    """FastAPI dependency: the signed-in user's full users row (image included), read once per request.
+
+    The session user leaves out aspirational_image_b64; handlers that return
+    it or write the record back take this instead of calling get_row again.
+    On a session cache miss the lookup reads this row and derives the session
+    user from it; only a cached session user costs a get_row here.
+    """
+    row = getattr(request.state, "user_row", None)
+    if row is None:
+        loaded = {}
+        user = await get_current_user_async(request, loaded)
+        row = loaded.get("row")
+        if row is None:
+            row = await run_db(get_row, "users", user["id"])
+        if row is None:
+            raise HTTPException(status_code=401, detail="Session expired")
+        request.state.user_row = row
+    return row
+
 def require_admin(request: Request) -> dict:
     user = get_current_user(request)
     if not user.get("is_admin", False):
@@ -65,10 +474,12 @@ def require_admin(request: Request) -> dict:
     return user
 
 def delete_session(token: str):
-    conn = get_db()
-    conn.execute(
-        "DELETE FROM sessions WHERE json_extract(data, '$.session_token') = ?",
-        (token,)
-    )
-    conn.commit()
-    conn.close()
+    if token.startswith(_SIGNED_PREFIX):
+        _revoke_signed(token)
+    else:
+        execute(
+            "DELETE FROM sessions WHERE json_extract(data, '$.session_token') = ?",
+            (token,)
+        )
+    with _session_cache_lock:
+        _cache_drop(token)
@@ -12,6 +12,14 @@ TEST_USER_USERNAME = os.getenv("TEST_USER_USERNAME", "__test__")
 TEST_USER_PASSWORD = os.getenv("TEST_USER_PASSWORD", "test-password-dev")
 
 DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "life_agent.db"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "2"))
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))
+DB_WRITE_TIMEOUT_S = float(os.getenv("DB_WRITE_TIMEOUT_S", "30"))  # max wait for a queued write
+DB_JSON_CODEC = os.getenv("DB_JSON_CODEC", "auto")  # auto | orjson | json
+DB_ARCHIVE_PATH = os.getenv("DB_ARCHIVE_PATH", os.path.splitext(DB_PATH)[0] + "_archive.db")
 LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(__file__), "logs"))
 COOKIE_SECURE = os.getenv("COOKIE_SECURE", "false").lower() == "true"
 
@@ -23,6 +31,59 @@ MODEL_BIG = "gpt-5"
 MODEL_SMALL = "gpt-5-mini"
 
 SESSION_EXPIRE_HOURS = 72
+SESSION_MODE = os.getenv("SESSION_MODE", "db")  # db | signed (see auth.py)
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))  # seconds; 0 disables the cache
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "1024"))
+SESSION_SWEEP_MINUTES = float(os.getenv("SESSION_SWEEP_MINUTES", "15"))  # 0 disables the sweeper
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "200"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "1"))  # concurrent bcrypt jobs
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", "8"))  # waiting jobs before 429
+
+# Agent session store (see agents/session_store.py)
+AGENT_SESSION_TTL_MINUTES = float(os.getenv("AGENT_SESSION_TTL_MINUTES", "120"))  # idle time before eviction
+AGENT_SESSION_MAX = int(os.getenv("AGENT_SESSION_MAX", "200"))  # sessions held in memory
+AGENT_SESSION_MAX_MB = float(os.getenv("AGENT_SESSION_MAX_MB", "64"))  # estimated size of all sessions
+AGENT_SESSION_PERSIST_MESSAGES = int(os.getenv("AGENT_SESSION_PERSIST_MESSAGES", "20"))  # kept in each checkpoint
+AGENT_COALESCE_MESSAGES = os.getenv("AGENT_COALESCE_MESSAGES", "false").lower() == "true"  # see agents/turn_queue.py
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "4"))  # concurrent agent turns (see agents/executor.py)
+AGENT_QUEUE_MAX = int(os.getenv("AGENT_QUEUE_MAX", "16"))  # waiting turns before 429
+AGENT_QUEUE_TIMEOUT_S = float(os.getenv("AGENT_QUEUE_TIMEOUT_S", "60"))  # max wait for an interactive turn
+AGENT_BACKGROUND_TIMEOUT_S = float(os.getenv("AGENT_BACKGROUND_TIMEOUT_S", "600"))  # ... for a background one
+USER_CONTEXT_TTL = float(os.getenv("USER_CONTEXT_TTL", "300"))  # seconds a cached context entry is trusted
+USER_CONTEXT_MAX_USERS = int(os.getenv("USER_CONTEXT_MAX_USERS", "256"))  # see agents/user_context.py
+
+# Conversation windowing (see agents/history.py)
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))  # recent turns kept verbatim
+HISTORY_COMPACT_TURNS = int(os.getenv("HISTORY_COMPACT_TURNS", "4"))  # extra turns held before compacting
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", MODEL_SMALL)  # "" = extractive summary only
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "600"))
+# Estimated history tokens per agent call (summary + recent turns; the system prompt is extra)
+HISTORY_TOKEN_BUDGETS = {
+    "default": 4000,
+    "hydrogen": 3000,
+    "helium": 4000,
+    "lithium": 2000,
+    "beryllium": 4000,
+    "boron": 6000,
+    "carbon": 4000,
+}
+
+# Deterministic pre-routing (see agents/pre_router.py). A rule must reach the
+# confidence and beat every other agent by the margin to skip Hydrogen; 1.1 disables.
+PRE_ROUTER_MIN_CONFIDENCE = float(os.getenv("PRE_ROUTER_MIN_CONFIDENCE", "0.8"))
+PRE_ROUTER_MARGIN = float(os.getenv("PRE_ROUTER_MARGIN", "0.1"))
+
+# Follow-up after a specialist hands back (see agents/handoff.py). "" = templated
+# follow-up; a model name (e.g. gpt-5-mini) has that model write it instead.
+HANDOFF_FOLLOWUP_MODEL = os.getenv("HANDOFF_FOLLOWUP_MODEL", "")
+
+# Retention (see retention.py). Days a row is kept; 0 disables the table.
+RETENTION_LOGS_DAYS = int(os.getenv("RETENTION_LOGS_DAYS", "30"))
+RETENTION_CHAT_CONTEXTS_DAYS = int(os.getenv("RETENTION_CHAT_CONTEXTS_DAYS", "180"))
+RETENTION_DISCORD_SCHEDULES_DAYS = int(os.getenv("RETENTION_DISCORD_SCHEDULES_DAYS", "14"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE_MS = float(os.getenv("RETENTION_BATCH_PAUSE_MS", "50"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))  # 0 = admin-triggered only
 
 SMTP_HOST = os.getenv("MAIL_HOST", "smtp.hostinger.com")
 SMTP_PORT = int(os.getenv("MAIL_PORT", "587"))
@@ -1,169 +1,780 @@
 import sqlite3
+import asyncio
+import contextvars
+import functools
 import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-from config import DB_PATH
+from config import (
+    DB_PATH, DB_ARCHIVE_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_BUSY_TIMEOUT_MS, DB_GROUP_COMMIT_MS, DB_WRITE_BATCH_MAX, DB_WRITE_TIMEOUT_S, DB_JSON_CODEC,
+)
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+try:
+    import orjson
+except ImportError:  # optional — stdlib json is the fallback codec
+    orjson = None
+
+
+# ---------------------------------------------------------------------------
+# Connection pool
+#
+# Connections are opened once (PRAGMAs applied at connect time) and recycled.
+# A "scope" ties DB work to a unit of work — an HTTP request (request_db_scope
+# dependency) or an agent turn (connection_scope). Inside transaction() or
+# read_snapshot() every helper shares the scope's pinned connection; outside
+# them the connection goes back to the pool as soon as each helper call
+# returns, so a request that waits on SMTP or an LLM between queries doesn't
+# keep one borrowed.
+# ---------------------------------------------------------------------------
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool."""
+
+    # Nesting depth of transaction() blocks; helpers defer commit while > 0
+    tx_depth = 0
+
+    def close(self):
+        _release(self)
+
+
+_pool_cond = threading.Condition()
+_idle: list[PooledConnection] = []
+_pool = {"open": 0}
+_pool_stats = {
+    "hits": 0,
+    "misses": 0,
+    "waits": 0,
+    "timeouts": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+}
+
+
+def _connect() -> PooledConnection:
+    conn = sqlite3.connect(DB_PATH, factory=PooledConnection, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    # Lets retention hand freed pages back to the filesystem. Must precede the
+    # WAL switch, and only applies to a brand-new file; an existing database
+    # keeps its mode until a one-off VACUUM.
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
+
+def _acquire() -> PooledConnection:
+    with _pool_cond:
+        if _idle:
+            _pool_stats["hits"] += 1
+            return _idle.pop()
+        if _pool["open"] < DB_POOL_SIZE:
+            _pool_stats["misses"] += 1
+            _pool["open"] += 1
+        else:
+            _pool_stats["waits"] += 1
+            start = time.monotonic()
+            available = _pool_cond.wait_for(lambda: _idle, timeout=DB_POOL_TIMEOUT)
+            waited_ms = (time.monotonic() - start) * 1000
+            _pool_stats["wait_ms_total"] += waited_ms
+            _pool_stats["wait_ms_max"] = max(_pool_stats["wait_ms_max"], waited_ms)
+            if not available:
+                _pool_stats["timeouts"] += 1
+                raise sqlite3.OperationalError("database connection pool exhausted")
+            return _idle.pop()
+    try:
+        return _connect()
+    except Exception:
+        with _pool_cond:
+            _pool["open"] -= 1
+            _pool_cond.notify()
+        raise
+
+
+def _release(conn: PooledConnection):
+    conn.tx_depth = 0
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        # Broken connection — drop it rather than recycle it
+        sqlite3.Connection.close(conn)
+        with _pool_cond:
+            _pool["open"] -= 1
+            _pool_cond.notify()
+        return
+    with _pool_cond:
+        if conn not in _idle:
+            _idle.append(conn)
+            _pool_cond.notify()
+
+
+def pool_stats() -> dict:
+    """Snapshot of pool usage counters for the admin metrics endpoint."""
+    with _pool_cond:
+        lookups = _pool_stats["hits"] + _pool_stats["misses"] + _pool_stats["waits"]
+        return {
+            "size": DB_POOL_SIZE,
+            "open": _pool["open"],
+            "idle": len(_idle),
+            "in_use": _pool["open"] - len(_idle),
+            **_pool_stats,
+            "wait_ms_total": round(_pool_stats["wait_ms_total"], 2),
+            "wait_ms_max": round(_pool_stats["wait_ms_max"], 2),
+            "hit_rate": round(_pool_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+class _Scope:
+    """A unit of work's connection: borrowed on use, pinned while a transaction or snapshot is open."""
+
+    def __init__(self):
+        self.conn: PooledConnection | None = None
+        self.closed = False
+        self.depth = 0  # nested enter() calls in progress
+        self.lock = threading.RLock()
+
+    def enter(self) -> PooledConnection | None:
+        self.lock.acquire()
+        if self.closed:
+            self.lock.release()
+            return None
+        if self.conn is None:
+            try:
+                self.conn = _acquire()
+            except Exception:
+                self.lock.release()
+                raise
+        self.depth += 1
+        return self.conn
+
+    def exit(self):
+        try:
+            self.depth -= 1
+            conn = self.conn
+            if not self.depth and conn is not None and not conn.tx_depth and not conn.in_transaction:
+                # Outermost call done and nothing open: back to the pool until the next call
+                self.conn = None
+                _release(conn)
+        finally:
+            self.lock.release()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.conn is not None:
+                _release(self.conn)
+                self.conn = None
+
+
+_scope: ContextVar[_Scope | None] = ContextVar("db_scope", default=None)
+
+
+@contextmanager
+def connection_scope():
+    """Open a DB scope for a block of work on the current thread/context (see _Scope)."""
+    scope = _Scope()
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        scope.close()
+
+
+async def request_db_scope():
+    """FastAPI dependency: the request's DB helpers share one scope.
+
+    A connection is only borrowed while a helper, transaction() or
+    read_snapshot() is running, so requests that never touch the database, or
+    that wait on something else between queries, don't hold one.
+    """
+    scope = _Scope()
+    _scope.set(scope)
+    try:
+        yield
+    finally:
+        scope.close()
+
+
+def _scope_open() -> bool:
+    """True if the current context has a scope that can still lend its connection.
+
+    A closed scope (e.g. one captured by copy_context() and outlived) would
+    send each helper to its own connection, splitting a transaction from its
+    writes.
+    """
+    scope = _scope.get()
+    return scope is not None and not scope.closed
+
+
+@contextmanager
+def _connection():
+    scope = _scope.get()
+    conn = scope.enter() if scope is not None else None
+    if conn is not None:
+        try:
+            yield conn
+        finally:
+            scope.exit()
+        return
+    conn = _acquire()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+
+# ---------------------------------------------------------------------------
+# Async access
+#
+# sqlite3 calls block, so async code (streaming chat, Discord, onboarding)
+# must not call the helpers directly on the event loop. run_db() hands the
+# work to a dedicated executor sized to the pool — one worker per connection —
+# so DB calls never queue behind long-running agent turns on the default
+# executor. The caller's context is copied, so a request scope set by
+# request_db_scope is still shared.
+# ---------------------------------------------------------------------------
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking database function on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _db_executor, functools.partial(ctx.run, fn, *args, **kwargs)
+    )
+
+
+def get_db():
+    """Borrow a raw pooled connection. Callers must close() it to return it to the pool."""
+    return _acquire()
+
+
+def query_one(sql: str, params=()) -> sqlite3.Row | None:
+    with _connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def query_all(sql: str, params=()) -> list[sqlite3.Row]:
+    with _connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+# ---------------------------------------------------------------------------
+# Single writer
+#
+# Helper writes outside transaction() don't commit on the caller's
+# connection. They are queued to one writer thread that owns a dedicated
+# connection, so concurrent agent turns never race each other for the SQLite
+# write lock. The writer drains whatever arrives within DB_GROUP_COMMIT_MS
+# (up to DB_WRITE_BATCH_MAX ops) and commits the batch once; each op runs in
+# its own savepoint so one failing op doesn't take the rest of the batch down.
+# Callers block on a Future and get their result (lastrowid, rowcount) back,
+# or an OperationalError after DB_WRITE_TIMEOUT_S. A writer thread that died
+# is restarted by the next write.
+# ---------------------------------------------------------------------------
+
+_write_queue: queue.SimpleQueue = queue.SimpleQueue()
+_writer = {"thread": None}
+_writer_lock = threading.Lock()
+_writer_stats = {
+    "ops": 0,
+    "failed_ops": 0,
+    "commits": 0,
+    "failed_commits": 0,
+    "cancelled_ops": 0,
+    "timeouts": 0,
+    "restarts": 0,
+    "queue_depth": 0,
+    "queue_depth_max": 0,
+    "batch_max": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+}
+
+
+def _commit_batch(conn, batch) -> tuple[list[tuple], bool]:
+    """Run a batch of ops in one transaction. Returns ([(result, error)], committed).
+
+    Raises if the connection itself fails (e.g. the ROLLBACK).
+    """
+    outcomes = []
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for fn, _, _ in batch:
+            conn.execute("SAVEPOINT op")
+            try:
+                outcomes.append((fn(conn), None))
+                conn.execute("RELEASE op")
+            except Exception as e:
+                conn.execute("ROLLBACK TO op")
+                conn.execute("RELEASE op")
+                outcomes.append((None, e))
+        conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")  # if this fails too, the caller drops the connection
+        return [(None, e)] * len(batch), False
+    return outcomes, True
+
+
+def _writer_loop():
+    conn = None
+    window = DB_GROUP_COMMIT_MS / 1000
+    try:
+        while True:
+            taken = [_write_queue.get()]
+            deadline = time.monotonic() + window
+            while len(taken) < DB_WRITE_BATCH_MAX:
+                try:
+                    taken.append(_write_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            # Callers that gave up (see _submit_write) have cancelled their op; skip it
+            batch = [op for op in taken if op[1].set_running_or_notify_cancel()]
+            # Nothing below may kill the thread: every op's future must be settled
+            try:
+                if conn is None:
+                    conn = _connect()
+                    conn.isolation_level = None  # explicit BEGIN/COMMIT in _commit_batch
+                outcomes, committed = _commit_batch(conn, batch) if batch else ([], False)
+            except Exception as e:
+                # Couldn't connect, or the connection broke mid-rollback: fail the
+                # batch and start the next one on a fresh connection
+                if conn is not None:
+                    try:
+                        sqlite3.Connection.close(conn)
+                    except Exception:
+                        pass
+                    conn = None
+                outcomes, committed = [(None, e)] * len(batch), False
+            done = time.monotonic()
+            with _writer_lock:
+                _writer_stats["queue_depth"] -= len(taken)
+                _writer_stats["ops"] += len(batch)
+                _writer_stats["cancelled_ops"] += len(taken) - len(batch)
+                if batch:
+                    _writer_stats["commits" if committed else "failed_commits"] += 1
+                _writer_stats["batch_max"] = max(_writer_stats["batch_max"], len(batch))
+                for (_, _, queued_at), (_, err) in zip(batch, outcomes):
+                    waited_ms = (done - queued_at) * 1000
+                    _writer_stats["wait_ms_total"] += waited_ms
+                    _writer_stats["wait_ms_max"] = max(_writer_stats["wait_ms_max"], waited_ms)
+                    if err is not None:
+                        _writer_stats["failed_ops"] += 1
+            for (_, future, _), (result, err) in zip(batch, outcomes):
+                if err is not None:
+                    future.set_exception(err)
+                else:
+                    future.set_result(result)
+    finally:
+        # Only reached if the thread is dying (BaseException); closing rolls
+        # back any open batch so the write lock isn't held by a dead thread
+        if conn is not None:
+            sqlite3.Connection.close(conn)
+
+
+def _submit_write(fn):
+    future: Future = Future()
+    with _writer_lock:
+        thread = _writer["thread"]
+        if thread is None or not thread.is_alive():
+            if thread is not None:
+                _writer_stats["restarts"] += 1
+            _writer["thread"] = threading.Thread(target=_writer_loop, name="db-writer", daemon=True)
+            _writer["thread"].start()
+        _writer_stats["queue_depth"] += 1
+        _writer_stats["queue_depth_max"] = max(_writer_stats["queue_depth_max"], _writer_stats["queue_depth"])
+    _write_queue.put((fn, future, time.monotonic()))
+    try:
+        return future.result(timeout=DB_WRITE_TIMEOUT_S)
+    except FutureTimeoutError:
+        if future.cancel():  # still queued: it will never run
+            with _writer_lock:
+                _writer_stats["timeouts"] += 1
+            raise sqlite3.OperationalError(f"write not started within {DB_WRITE_TIMEOUT_S}s") from None
+    # Already running: the writer settles it once its batch finishes
+    try:
+        return future.result(timeout=DB_WRITE_TIMEOUT_S)
+    except FutureTimeoutError:
+        with _writer_lock:
+            _writer_stats["timeouts"] += 1
+        raise sqlite3.OperationalError(f"write not finished within {2 * DB_WRITE_TIMEOUT_S}s") from None
+
+
+def _write(fn):
+    """Run fn(conn) as a write: on the open transaction() if there is one, otherwise via the writer."""
+    scope = _scope.get()
+    if scope is not None and scope.conn is not None and scope.conn.tx_depth:
+        conn = scope.enter()
+        try:
+            if conn is not None and conn.tx_depth:
+                return fn(conn)
+        finally:
+            scope.exit()
+    return _submit_write(fn)
+
+
+def writer_stats() -> dict:
+    """Snapshot of writer queue/batching counters for the admin metrics endpoint."""
+    with _writer_lock:
+        commits = _writer_stats["commits"] + _writer_stats["failed_commits"]
+        ops = _writer_stats["ops"]
+        return {
+            "group_commit_ms": DB_GROUP_COMMIT_MS,
+            "batch_limit": DB_WRITE_BATCH_MAX,
+            **_writer_stats,
+            "batch_avg": round(ops / commits, 2) if commits else None,
+            "wait_ms_total": round(_writer_stats["wait_ms_total"], 2),
+            "wait_ms_max": round(_writer_stats["wait_ms_max"], 2),
+            "wait_ms_avg": round(_writer_stats["wait_ms_total"] / ops, 3) if ops else None,
+        }
+
+
+@contextmanager
+def transaction():
+    """Unit of work: every helper call inside the block commits (or rolls back) together.
+
+        with transaction():
+            task_id = insert_row("one_time_tasks", {...})
+            update_row("todo_lists", todo_id, data)
+
+    Takes the write lock up front (BEGIN IMMEDIATE) so read-modify-write
+    sequences can't interleave with another writer; helper writes inside the
+    block run on this connection rather than the writer queue. Nested blocks join the
+    outer transaction. Outside an open request/agent scope, one is opened for
+    the duration of the block.
+    """
+    if not _scope_open():
+        with connection_scope(), transaction() as conn:
+            yield conn
+        return
+    with _connection() as conn:
+        if conn.tx_depth:
+            conn.tx_depth += 1
+            try:
+                yield conn
+            finally:
+                conn.tx_depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        conn.tx_depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.tx_depth = 0
+            conn.rollback()
+            raise
+        conn.tx_depth = 0
+        conn.commit()
+
+
+@contextmanager
+def read_snapshot():
+    """Consistent read: every query in the block sees the database as of its first read.
+
+    A deferred BEGIN on the scope's connection — WAL readers take no lock, so
+    writers carry on meanwhile. Inside transaction() (or another snapshot) the
+    block simply joins it. Only reads belong here: helper writes still go
+    through the writer and won't be visible to the snapshot.
+    """
+    if not _scope_open():
+        with connection_scope(), read_snapshot():
+            yield
+        return
+    with _connection() as conn:
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            conn.rollback()  # nothing to commit; ends the snapshot
+
+
+def execute(sql: str, params=()) -> int:
+    """Run a single write statement and commit. Returns the affected row count."""
+    return _write(lambda conn: conn.execute(sql, params).rowcount)
+
+
+def incremental_vacuum(pages_per_step: int = 2000) -> int:
+    """Truncate free pages off the file (auto_vacuum=INCREMENTAL databases only).
+
+    Runs on the caller's connection rather than the writer queue: sqlite3's
+    execute() stops the pragma after its first page, and executescript()
+    commits whatever transaction is open, so it can't join a writer batch.
+    Works in steps so the write lock is only held briefly. Returns pages freed.
+    """
+    freed = 0
+    with _connection() as conn:
+        if conn.tx_depth:
+            raise sqlite3.OperationalError("incremental_vacuum() cannot run inside transaction()")
+        while True:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                return freed
+            conn.executescript(f"PRAGMA incremental_vacuum({min(free, pages_per_step)})")
+            freed += min(free, pages_per_step)
+
+
+@contextmanager
+def attached_archive():
+    """Attach the archive database (DB_ARCHIVE_PATH) as schema "archive" for the block.
+
+    Rows aged out by retention.py live there, keeping the main file small.
+    It is only attached while something reads or writes it; writes to
+    archive.* commit on this connection and never take the main write lock.
+    """
+    with _connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (DB_ARCHIVE_PATH,))
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DETACH DATABASE archive")
+
 def init_db():
-    conn = get_db()
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS life_goals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS user_states (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS one_time_tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS recurring_tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS todo_lists (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS help_articles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS chat_contexts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS weekly_reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS discord_schedules (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS journal_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data TEXT NOT NULL,
-            created_at TEXT,
-            updated_at TEXT
-        );
-    """)
-
-    # --- Indexes ---
-    conn.executescript("""
-        CREATE INDEX IF NOT EXISTS idx_sessions_token
-            ON sessions (json_extract(data, '$.session_token'));
-
-        CREATE INDEX IF NOT EXISTS idx_users_username
-            ON users (json_extract(data, '$.username'));
-
-        CREATE INDEX IF NOT EXISTS idx_chat_contexts_user_session
-            ON chat_contexts (json_extract(data, '$.user_id'), json_extract(data, '$.session_id'));
-
-        CREATE INDEX IF NOT EXISTS idx_one_time_tasks_user_completed
-            ON one_time_tasks (json_extract(data, '$.user_id'), json_extract(data, '$.completed'));
-
-        CREATE INDEX IF NOT EXISTS idx_one_time_tasks_from_recurring
-            ON one_time_tasks (json_extract(data, '$.from_recurring_id'));
-
-        CREATE INDEX IF NOT EXISTS idx_recurring_tasks_user_active
-            ON recurring_tasks (json_extract(data, '$.user_id'), json_extract(data, '$.active'));
-
-        CREATE INDEX IF NOT EXISTS idx_todo_lists_user_date
-            ON todo_lists (json_extract(data, '$.user_id'), json_extract(data, '$.date'));
-
-        CREATE INDEX IF NOT EXISTS idx_life_goals_user_id
-            ON life_goals (json_extract(data, '$.user_id'));
-
-        CREATE INDEX IF NOT EXISTS idx_user_states_user_id
-            ON user_states (json_extract(data, '$.user_id'));
-
-        CREATE INDEX IF NOT EXISTS idx_help_articles_slug
-            ON help_articles (json_extract(data, '$.slug'));
-
-        CREATE INDEX IF NOT EXISTS idx_logs_level
-            ON logs (json_extract(data, '$.level'));
-
-        CREATE INDEX IF NOT EXISTS idx_weekly_reviews_user_id
-            ON weekly_reviews (json_extract(data, '$.user_id'));
-
-        CREATE INDEX IF NOT EXISTS idx_journal_entries_user_id
-            ON journal_entries (json_extract(data, '$.user_id'));
-    """)
-
-    # --- Migrations ---
-    # Backfill session_id='default' on chat_contexts rows that don't have it
-    conn.execute("""
-        UPDATE chat_contexts
-        SET data = json_set(data, '$.session_id', 'default'),
-            updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
-        WHERE json_extract(data, '$.session_id') IS NULL
-    """)
-    conn.commit()
-
-    conn.close()
+    """Bring the schema up to date (see migrations.py).
+
+    Once every migration has been applied this is a single read of
+    schema_version, so boot time doesn't grow with the data.
+    """
+    from migrations import migrate
+    migrate()
+
+
+# Hot JSON fields exposed as VIRTUAL generated columns, so they can be indexed
+# and filtered on without running json_extract() over every row.
+# get_rows()/count_rows() use the column automatically when a filter key matches.
+GENERATED_COLUMNS = {
+    "users": ("email", "discord_user_id"),
+    "sessions": ("user_id", "expires_at"),
+    "life_goals": ("user_id",),
+    "user_states": ("user_id",),
+    "one_time_tasks": ("user_id", "completed", "completed_at", "from_recurring_id"),
+    "recurring_tasks": ("user_id", "active"),
+    "todo_lists": ("user_id", "date"),
+    "logs": ("user_id",),
+    "chat_contexts": ("user_id", "session_id", "role"),
+    "weekly_reviews": ("user_id",),
+    "discord_schedules": ("user_id", "type", "sent", "sent_date", "send_at"),
+    "journal_entries": ("user_id",),
+    "revoked_tokens": ("jti", "expires_at"),
+    "agent_sessions": ("user_id", "session_id"),
+}
+
+_ROW_COLUMNS = "id, data, created_at, updated_at"
+
+
+def _where(table, filters: dict | None) -> tuple[str, list]:
+    if not filters:
+        return "", []
+    columns = GENERATED_COLUMNS.get(table, ())
+    conditions = []
+    params = []
+    for key, value in filters.items():
+        if key in columns:
+            conditions.append(f"{key} = ?")
+        else:
+            conditions.append(f"json_extract(data, '$.{key}') = ?")
+        params.append(value)
+    return " WHERE " + " AND ".join(conditions), params
+
+
+# ---------------------------------------------------------------------------
+# JSON codec
+#
+# Every row's data column goes through encode_json/decode_json. orjson is used
+# when installed (several times faster on large chat context logs); stdlib
+# json is the fallback and also handles values orjson refuses (e.g. ints
+# beyond 64 bits). DB_JSON_CODEC=json forces the stdlib codec.
+# ---------------------------------------------------------------------------
+
+_USE_ORJSON = orjson is not None and DB_JSON_CODEC != "json"
+if DB_JSON_CODEC == "orjson" and orjson is None:
+    raise RuntimeError("DB_JSON_CODEC=orjson but orjson is not installed")
+
+
+def _orjson_default(value):
+    # Subclasses are passed through so lazy Rows get their data decoded first
+    if isinstance(value, dict):
+        return dict(value.items())
+    for base in (str, int, float, list):
+        if isinstance(value, base):
+            return base(value)
+    raise TypeError
+
+
+def encode_json(value) -> str:
+    if _USE_ORJSON:
+        try:
+            return orjson.dumps(
+                value,
+                default=_orjson_default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS,
+            ).decode()
+        except TypeError:
+            pass
+    return json.dumps(value)
+
+
+def decode_json(text):
+    """Decode a stored JSON document. Raises ValueError (json.JSONDecodeError) on bad input."""
+    if _USE_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+_PENDING = object()
+
+
+class Row(dict):
+    """A row dict whose "data" JSON is decoded on first access, not at fetch time.
+
+    Callers that only look at id/created_at (counting, id lists, ownership
+    pre-checks on other columns) never pay for the decode. Anything that views
+    the row as a whole — iteration, items(), len, ==, copy — decodes first, so
+    it behaves exactly like the plain dict it replaces.
+    """
+
+    __slots__ = ("_raw",)
+
+    def __init__(self, fields: dict, raw=_PENDING):
+        super().__init__(fields)
+        self._raw = raw
+
+    def _load(self):
+        raw = self._raw
+        if raw is _PENDING:
+            return
+        self._raw = _PENDING
+        if dict.__contains__(self, "data"):
+            return  # assigned before it was ever read
+        try:
+            value = decode_json(raw)
+        except (ValueError, TypeError):
+            value = raw
+        dict.__setitem__(self, "data", value)
+
+    def __missing__(self, key):
+        if key == "data" and self._raw is not _PENDING:
+            self._load()
+            return dict.__getitem__(self, "data")
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == "data":
+            self._load()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        self._load()
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self._load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._load()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self._load()
+        return dict.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._load()
+        return dict.__repr__(self)
+
+    def keys(self):
+        self._load()
+        return dict.keys(self)
+
+    def values(self):
+        self._load()
+        return dict.values(self)
+
+    def items(self):
+        self._load()
+        return dict.items(self)
+
+    def copy(self):
+        self._load()
+        return dict(dict.items(self))
+
+    def pop(self, key, *default):
+        self._load()
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._load()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._load()
+        return dict.setdefault(self, key, default)
+
+    def __delitem__(self, key):
+        self._load()
+        dict.__delitem__(self, key)
+
 
 def _now():
     return datetime.now(timezone.utc).isoformat()
 
 
+# ---------------------------------------------------------------------------
+# Loaded user
+#
+# The request or agent turn that already holds the user's record (the auth
+# dependency resolved it) makes it visible through user_scope, so per-user
+# lookups further down — user_today, agents.get_api_key — reuse it instead of
+# reading the users row again.
+# ---------------------------------------------------------------------------
+
+_user: ContextVar[dict | None] = ContextVar("current_user", default=None)
+
+
+@contextmanager
+def user_scope(user: dict | None):
+    """Expose an already-loaded user record (flat data plus "id") for a block of work."""
+    token = _user.set(user)
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+def scoped_user(user_id: int) -> dict | None:
+    """The record set by user_scope, if it belongs to user_id."""
+    user = _user.get()
+    return user if user is not None and user.get("id") == user_id else None
+
+
 def user_today(user_id: int) -> str:
     """Return the user's local date as YYYY-MM-DD, using their stored IANA timezone."""
-    conn = get_db()
-    row = conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
-    conn.close()
-    tz_str = "UTC"
-    if row:
-        try:
-            data = json.loads(row["data"])
-            tz_str = data.get("timezone") or "UTC"
-        except (json.JSONDecodeError, TypeError):
-            pass
+    user = scoped_user(user_id)
+    if user is not None:
+        tz_str = user.get("timezone") or "UTC"
+    else:
+        row = query_one("SELECT json_extract(data, '$.timezone') FROM users WHERE id = ?", (user_id,))
+        tz_str = (row[0] if row else None) or "UTC"
     try:
         tz = ZoneInfo(tz_str)
     except (ZoneInfoNotFoundError, Exception):
@@ -171,81 +782,114 @@ def user_today(user_id: int) -> str:
     return datetime.now(tz).date().isoformat()
 
 def insert_row(table, data: dict) -> int:
-    conn = get_db()
     now = _now()
-    cur = conn.execute(
-        f"INSERT INTO {table} (data, created_at, updated_at) VALUES (?, ?, ?)",
-        (json.dumps(data), now, now)
+    params = (encode_json(data), now, now)
+    return _write(lambda conn: conn.execute(
+        f"INSERT INTO {table} (data, created_at, updated_at) VALUES (?, ?, ?)", params
+    ).lastrowid)
+
+def insert_rows(table, rows: list[dict]) -> list[int]:
+    """Insert several rows with a single commit. Returns the new ids in order."""
+    now = _now()
+    params = [(encode_json(data), now, now) for data in rows]
+    sql = f"INSERT INTO {table} (data, created_at, updated_at) VALUES (?, ?, ?)"
+    return _write(lambda conn: [conn.execute(sql, p).lastrowid for p in params])
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _columns(table, fields: list[str] | None) -> str:
+    """SELECT list for a row; with fields, data is projected down to just those keys in SQL."""
+    if fields is None:
+        return _ROW_COLUMNS
+    for field in fields:
+        if not _FIELD_NAME.match(field):
+            raise ValueError(f"Invalid field name: {field!r}")
+    keys = ", ".join(f"'{field}'" for field in fields) or "NULL"
+    # -> keeps each value's JSON type; keys absent from the row stay absent
+    projected = (
+        f"(SELECT json_group_object(key, {table}.data -> fullkey) "
+        f"FROM json_each({table}.data) WHERE key IN ({keys}))"
     )
-    row_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return row_id
-
-def get_row(table, row_id: int) -> dict | None:
-    conn = get_db()
-    row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
-    conn.close()
+    return f"id, {projected} AS data, created_at, updated_at"
+
+
+def get_row(table, row_id: int, fields: list[str] | None = None) -> dict | None:
+    row = query_one(f"SELECT {_columns(table, fields)} FROM {table} WHERE id = ?", (row_id,))
     if row is None:
         return None
     return _row_to_dict(row)
 
-def get_rows(table, filters: dict = None, limit: int = 100, offset: int = 0, order_desc: bool = True) -> list[dict]:
-    conn = get_db()
-    query = f"SELECT * FROM {table}"
-    params = []
-    if filters:
-        conditions = []
-        for key, value in filters.items():
-            conditions.append(f"json_extract(data, '$.{key}') = ?")
-            params.append(value)
-        query += " WHERE " + " AND ".join(conditions)
-    order = "DESC" if order_desc else "ASC"
-    query += f" ORDER BY id {order} LIMIT ? OFFSET ?"
+def get_rows(table, filters: dict = None, limit: int = 100, offset: int = 0, order_desc: bool = True,
+             before_id: int | None = None, after_id: int | None = None,
+             fields: list[str] | None = None) -> list[dict]:
+    """Rows ordered by id. before_id/after_id give keyset pagination (id < / id > the key),
+    which stays constant-cost at any depth, unlike offset. fields=["title", ...] returns
+    only those data keys, extracted in SQL so the rest of the blob is never decoded."""
+    where, params = _where(table, filters)
+    bounds = []
+    if before_id is not None:
+        bounds.append("id < ?")
+        params.append(before_id)
+    if after_id is not None:
+        bounds.append("id > ?")
+        params.append(after_id)
+    if bounds:
+        where += (" AND " if where else " WHERE ") + " AND ".join(bounds)
+    # Walking backwards from after_id (desc) or before_id (asc): scan towards the
+    # key so LIMIT takes the nearest rows, then flip back to the requested order.
+    reverse = (after_id is not None and before_id is None) if order_desc else (before_id is not None and after_id is None)
+    scan_desc = order_desc != reverse
+    query = f"SELECT {_columns(table, fields)} FROM {table}{where}"
+    query += f" ORDER BY id {'DESC' if scan_desc else 'ASC'} LIMIT ? OFFSET ?"
     params.extend([limit, offset])
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return [_row_to_dict(r) for r in rows]
+    rows = [_row_to_dict(r) for r in query_all(query, params)]
+    if reverse:
+        rows.reverse()
+    return rows
 
 def update_row(table, row_id: int, data: dict) -> bool:
-    conn = get_db()
-    now = _now()
-    cur = conn.execute(
+    return execute(
         f"UPDATE {table} SET data = ?, updated_at = ? WHERE id = ?",
-        (json.dumps(data), now, row_id)
-    )
-    conn.commit()
-    changed = cur.rowcount > 0
-    conn.close()
-    return changed
+        (encode_json(data), _now(), row_id)
+    ) > 0
+
+def update_rows(table, rows: dict[int, dict]) -> int:
+    """Replace the data of several rows ({id: data}) with a single commit. Returns rows updated."""
+    if not rows:
+        return 0
+    now = _now()
+    params = [(encode_json(data), now, row_id) for row_id, data in rows.items()]
+    return _write(lambda conn: conn.executemany(
+        f"UPDATE {table} SET data = ?, updated_at = ? WHERE id = ?", params
+    ).rowcount)
 
 def delete_row(table, row_id: int) -> bool:
-    conn = get_db()
-    cur = conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
-    conn.commit()
-    changed = cur.rowcount > 0
-    conn.close()
-    return changed
-
-def count_rows(table, filters: dict = None) -> int:
-    conn = get_db()
-    query = f"SELECT COUNT(*) FROM {table}"
-    params = []
-    if filters:
-        conditions = []
-        for key, value in filters.items():
-            conditions.append(f"json_extract(data, '$.{key}') = ?")
-            params.append(value)
-        query += " WHERE " + " AND ".join(conditions)
-    count = conn.execute(query, params).fetchone()[0]
-    conn.close()
-    return count
+    return execute(f"DELETE FROM {table} WHERE id = ?", (row_id,)) > 0
+
+def count_rows(table, filters: dict = None, cap: int | None = None) -> int:
+    """Exact row count. With cap, stops counting at cap rows (bounded cost on large tables)."""
+    where, params = _where(table, filters)
+    if cap is None:
+        return query_one(f"SELECT COUNT(*) FROM {table}{where}", params)[0]
+    return query_one(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table}{where} LIMIT ?)", [*params, cap])[0]
+
+def estimate_rows(table, filters: dict = None, cap: int = 10000) -> int:
+    """Cheap row-count estimate, exact below cap rows.
+
+    Past cap, an unfiltered table is estimated from its id span (MAX - MIN + 1,
+    two rowid lookups) — tight while deletes come off the old end, as
+    retention's do — and a filtered count stops at cap.
+    """
+    counted = count_rows(table, filters, cap=cap)
+    if filters or counted < cap:
+        return counted
+    span = query_one(f"SELECT (SELECT MAX(id) FROM {table}) - (SELECT MIN(id) FROM {table}) + 1")[0]
+    return max(span, counted)
 
 def _row_to_dict(row) -> dict:
-    d = dict(row)
-    try:
-        d["data"] = json.loads(d["data"])
-    except (json.JSONDecodeError, TypeError):
-        pass
-    return d
+    # Only the stored columns — generated columns are an indexing detail
+    keys = row.keys()
+    fields = {k: row[k] for k in keys if k in ("id", "created_at", "updated_at")}
+    return Row(fields, row["data"]) if "data" in keys else Row(fields)
 
@@ -7,9 +7,9 @@ Proactive messages are triggered by /api/discord/tick.
 """
 
 import asyncio
-import json
 import re
 import discord
+from fastapi import HTTPException
 from file_logger import logger
 from config import DISCORD_BOT_TOKEN
 
@@ -21,18 +21,16 @@ graph_runner = None
 
 def _find_user_by_discord_id(discord_id: str) -> dict | None:
     """Look up a Life Agent user record by their Discord snowflake ID."""
-    from database import get_db
-    conn = get_db()
-    row = conn.execute(
-        "SELECT id, data FROM users WHERE json_extract(data, '$.discord_user_id') = ?",
+    from database import query_one, decode_json
+    row = query_one(
+        "SELECT id, data FROM users WHERE discord_user_id = ?",
         (discord_id,)
-    ).fetchone()
-    conn.close()
+    )
     if row is None:
         return None
     d = {"id": row["id"]}
     try:
-        d["data"] = json.loads(row["data"])
+        d["data"] = decode_json(row["data"])
     except Exception:
         d["data"] = {}
     return d
@@ -64,8 +62,9 @@ class LifeAgentBot(discord.Client):
         if message.author == self.user:
             return
 
+        from database import run_db
         discord_id = str(message.author.id)
-        app_user = _find_user_by_discord_id(discord_id)
+        app_user = await run_db(_find_user_by_discord_id, discord_id)
         if app_user is None:
             return  # Not a registered Life Agent user
 
@@ -75,18 +74,24 @@ class LifeAgentBot(discord.Client):
 
         logger.info(f"[discord] user={app_user['id']} received: {text[:80]}")
         async with message.channel.typing():
-            await self._handle_message(message.channel, app_user["id"], text)
+            await self._handle_message(message.channel, app_user, text)
 
-    async def _handle_message(self, channel, user_id: int, text: str):
+    async def _handle_message(self, channel, app_user: dict, text: str):
+        user_id = app_user["id"]
         if graph_runner is None:
             await channel.send("Agent system not ready yet, try again in a moment.")
             return
         try:
-            result = await graph_runner.run_stream(user_id, text, DISCORD_SESSION_ID)
+            result = await graph_runner.run_stream(user_id, text, DISCORD_SESSION_ID,
+                                                   user={**app_user["data"], "id": user_id})
             response = result.get("response", "")
             if response:
                 for chunk in _chunk(_format_for_discord(response)):
                     await channel.send(chunk)
+        except HTTPException as e:
+            # Agent pool saturated (agents/executor.py)
+            logger.info(f"[discord] Agent busy for user={user_id}: {e.detail}")
+            await channel.send("I'm a bit swamped right now, give me a minute and try again.")
         except Exception as e:
             logger.error(f"[discord] Agent error for user={user_id}: {e}", exc_info=True)
             await channel.send("Something went wrong on my end, sorry.")
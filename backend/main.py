@@ -1,24 +1,22 @@
 import asyncio
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from database import init_db, get_db, insert_row
-from config import ADMIN_USERNAME, ADMIN_PASSWORD, TEST_USER_USERNAME, TEST_USER_PASSWORD
-from auth import hash_password
+from database import init_db, query_one, insert_row, insert_rows, request_db_scope
+from config import ADMIN_USERNAME, ADMIN_PASSWORD, TEST_USER_USERNAME, TEST_USER_PASSWORD, RETENTION_INTERVAL_HOURS, SESSION_SWEEP_MINUTES
+from auth import hash_password, check_session_config
 from logging_service import log_info
 import json
 
 def seed_admin():
-    conn = get_db()
-    existing = conn.execute(
+    existing = query_one(
         "SELECT id FROM users WHERE json_extract(data, '$.username') = ?",
         (ADMIN_USERNAME,)
-    ).fetchone()
-    conn.close()
+    )
     if existing:
         return
     user_data = {
@@ -34,12 +32,10 @@ def seed_admin():
     log_info("system", "seed", "Admin user created")
 
 def seed_test_user():
-    conn = get_db()
-    existing = conn.execute(
+    existing = query_one(
         "SELECT id FROM users WHERE json_extract(data, '$.username') = ?",
         (TEST_USER_USERNAME,)
-    ).fetchone()
-    conn.close()
+    )
     if existing:
         return
     user_data = {
@@ -337,12 +333,12 @@ def seed_help_articles():
             ),
         },
     ]
-    for article in articles:
-        insert_row("help_articles", article)
+    insert_rows("help_articles", articles)
     log_info("system", "seed", f"Seeded {len(articles)} help articles")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    check_session_config()
     init_db()
     seed_admin()
     seed_test_user()
@@ -369,8 +365,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         log_info("system", "startup", f"Discord bot failed to start: {e}")
 
+    # Background cleanup: retention (logs/chat_contexts/discord_schedules) and expired sessions
+    cleanup_tasks = []
+    if RETENTION_INTERVAL_HOURS > 0:
+        from retention import retention_loop
+        cleanup_tasks.append(asyncio.create_task(retention_loop()))
+    if SESSION_SWEEP_MINUTES > 0:
+        from auth import session_sweeper_loop
+        cleanup_tasks.append(asyncio.create_task(session_sweeper_loop()))
+
     yield
 
+    for task in cleanup_tasks:
+        task.cancel()
+
     # Shutdown Discord bot
     if discord_task:
         try:
@@ -384,7 +392,7 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             log_info("system", "shutdown", f"Discord bot shutdown error: {e}")
 
-app = FastAPI(title="Life Agent", lifespan=lifespan)
+app = FastAPI(title="Life Agent", lifespan=lifespan, dependencies=[Depends(request_db_scope)])
 
 _default_origins = ["http://localhost:5173", "http://localhost:3000"]
 _env_origins = os.getenv("ALLOWED_ORIGINS", "")
@@ -0,0 +1,419 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once, in order, inside its own transaction, and is
+recorded in schema_version. init_db() calls migrate() on every boot; once
+the database is current that costs one read, no matter how much data there
+is. Migrations are also written to be idempotent, so a database that
+predates schema_version (where the baseline already exists) just converges.
+
+To change the schema, append a migration — never edit one that has shipped.
+
+Usage:
+    cd backend && venv/bin/python3 migrations.py [--status]
+"""
+
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from database import GENERATED_COLUMNS, get_db, encode_json, decode_json
+
+_TABLES = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS life_goals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS user_states (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS one_time_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS recurring_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS todo_lists (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS help_articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS chat_contexts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS weekly_reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS discord_schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS journal_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT
+    );
+"""
+
+_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_sessions_token
+        ON sessions (json_extract(data, '$.session_token'));
+
+    CREATE INDEX IF NOT EXISTS idx_sessions_user_id
+        ON sessions (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_users_username
+        ON users (json_extract(data, '$.username'));
+
+    CREATE INDEX IF NOT EXISTS idx_users_email
+        ON users (email);
+
+    CREATE INDEX IF NOT EXISTS idx_users_discord_linked
+        ON users (discord_user_id) WHERE discord_user_id IS NOT NULL;
+
+    CREATE INDEX IF NOT EXISTS idx_chat_contexts_session_created
+        ON chat_contexts (user_id, session_id, role, created_at);
+
+    CREATE INDEX IF NOT EXISTS idx_one_time_tasks_user_completed
+        ON one_time_tasks (user_id, completed);
+
+    CREATE INDEX IF NOT EXISTS idx_one_time_tasks_from_recurring
+        ON one_time_tasks (user_id, from_recurring_id, completed_at);
+
+    CREATE INDEX IF NOT EXISTS idx_one_time_tasks_user_completed_at
+        ON one_time_tasks (user_id, completed_at);
+
+    CREATE INDEX IF NOT EXISTS idx_recurring_tasks_user_active
+        ON recurring_tasks (user_id, active);
+
+    CREATE INDEX IF NOT EXISTS idx_todo_lists_user_date
+        ON todo_lists (user_id, date);
+
+    CREATE INDEX IF NOT EXISTS idx_life_goals_user_id
+        ON life_goals (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_user_states_user_id
+        ON user_states (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_help_articles_slug
+        ON help_articles (json_extract(data, '$.slug'));
+
+    CREATE INDEX IF NOT EXISTS idx_logs_level
+        ON logs (json_extract(data, '$.level'));
+
+    CREATE INDEX IF NOT EXISTS idx_logs_user_id
+        ON logs (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_weekly_reviews_user_id
+        ON weekly_reviews (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_journal_entries_user_id
+        ON journal_entries (user_id);
+
+    CREATE INDEX IF NOT EXISTS idx_discord_schedules_user_type_date
+        ON discord_schedules (user_id, type, sent_date);
+
+    CREATE INDEX IF NOT EXISTS idx_discord_schedules_due
+        ON discord_schedules (user_id, type, sent, send_at);
+"""
+
+# Expression indexes superseded by indexes on the generated columns
+_LEGACY_INDEXES = (
+    "idx_one_time_tasks_user_completed",
+    "idx_one_time_tasks_from_recurring",
+    "idx_recurring_tasks_user_active",
+    "idx_todo_lists_user_date",
+    "idx_life_goals_user_id",
+    "idx_user_states_user_id",
+    "idx_weekly_reviews_user_id",
+    "idx_journal_entries_user_id",
+)
+
+# Indexes replaced outright. The chat_contexts index gained created_at so
+# session listings are answered from the index alone, without walking the
+# large context_log blobs stored before created_at in each row. The Discord
+# index became partial: only linked users are indexed, and the planner will
+# use it for the "IS NOT NULL" sweep as well as for point lookups.
+_RETIRED_INDEXES = (
+    "idx_chat_contexts_user_session",
+    "idx_users_discord_user_id",
+)
+
+def _add_generated_columns(conn):
+    """Add any missing GENERATED_COLUMNS and drop the expression indexes they replace. Idempotent."""
+    for table, fields in GENERATED_COLUMNS.items():
+        existing = {r["name"] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if not existing:
+            continue  # table comes from a later migration
+        for field in fields:
+            if field not in existing:
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {field} "
+                    f"GENERATED ALWAYS AS (json_extract(data, '$.{field}')) VIRTUAL"
+                )
+    for name in _LEGACY_INDEXES:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if row and "json_extract" in row["sql"]:
+            conn.execute(f"DROP INDEX {name}")
+    for name in _RETIRED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _run_script(conn, script: str):
+    """Execute a multi-statement script inside the open transaction.
+
+    executescript() would commit first, so statements are run one by one.
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+def _baseline(conn):
+    """Tables, generated columns and indexes as of the introduction of schema_version."""
+    _run_script(conn, _TABLES)
+    _add_generated_columns(conn)
+    _run_script(conn, _INDEXES)
+
+
+def _chat_contexts_default_session(conn):
+    """Backfill session_id='default' on chat rows from before multi-session chat."""
+    conn.execute("""
+        UPDATE chat_contexts
+        SET data = json_set(data, '$.session_id', 'default'),
+            updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+        WHERE session_id IS NULL
+    """)
+
+
+def _one_time_tasks_completed_date(conn):
+    """Backfill completed_date (the user's local date) from completed_at (UTC) on old completions."""
+    rows = conn.execute("""
+        SELECT id, data FROM one_time_tasks
+        WHERE completed = 1
+          AND completed_at IS NOT NULL
+          AND json_extract(data, '$.completed_date') IS NULL
+    """).fetchall()
+    tz_cache: dict[int, ZoneInfo] = {}
+    for row in rows:
+        data = decode_json(row["data"])
+        user_id = data.get("user_id")
+        if not user_id:
+            continue
+        if user_id not in tz_cache:
+            tz_row = conn.execute(
+                "SELECT json_extract(data, '$.timezone') FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+            try:
+                tz_cache[user_id] = ZoneInfo((tz_row[0] if tz_row else None) or "UTC")
+            except (ZoneInfoNotFoundError, ValueError):
+                tz_cache[user_id] = ZoneInfo("UTC")
+        try:
+            completed_at = datetime.fromisoformat(data["completed_at"].replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            continue  # unparseable timestamp — leave the row alone
+        data["completed_date"] = completed_at.astimezone(tz_cache[user_id]).date().isoformat()
+        conn.execute("UPDATE one_time_tasks SET data = ? WHERE id = ?", (encode_json(data), row["id"]))
+
+
+def _sessions_expires_at(conn):
+    """Generated column + index on sessions.expires_at for the expired-session sweeper."""
+    _add_generated_columns(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+
+def _revoked_tokens(conn):
+    """Revocation list for signed session tokens (auth.py, SESSION_MODE=signed)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    _add_generated_columns(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens (expires_at)")
+
+
+def _agent_sessions(conn):
+    """Checkpointed agent session state (agents/session_store.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    _add_generated_columns(conn)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_sessions_user_session ON agent_sessions (user_id, session_id)"
+    )
+
+
+# Tables whose rows feed the agents' per-user context (agents/user_context.py)
+VERSIONED_TABLES = (
+    "user_states", "life_goals", "one_time_tasks", "recurring_tasks",
+    "todo_lists", "weekly_reviews", "journal_entries",
+)
+
+_VERSION_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{op} AFTER {op} ON {table}
+    WHEN {row}.user_id IS NOT NULL
+    BEGIN
+        INSERT INTO data_versions (user_id, tbl, version) VALUES ({row}.user_id, '{table}', 1)
+        ON CONFLICT (user_id, tbl) DO UPDATE SET version = version + 1;
+    END;
+"""
+
+
+def _data_versions(conn):
+    """Per-user, per-table change counters, bumped by triggers on every write."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER NOT NULL,
+            tbl TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (user_id, tbl)
+        ) WITHOUT ROWID
+    """)
+    for table in VERSIONED_TABLES:
+        for op, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            _run_script(conn, _VERSION_TRIGGER.format(table=table, op=op, row=row))
+
+
+# (version, name, fn) — append only
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "chat_contexts_default_session", _chat_contexts_default_session),
+    (3, "one_time_tasks_completed_date", _one_time_tasks_completed_date),
+    (4, "sessions_expires_at", _sessions_expires_at),
+    (5, "revoked_tokens", _revoked_tokens),
+    (6, "agent_sessions", _agent_sessions),
+    (7, "data_versions", _data_versions),
+]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _current_version(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL,
+            duration_ms REAL
+        )
+    """)
+    conn.commit()
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate() -> list[str]:
+    """Apply pending migrations in order. Returns the names of those applied."""
+    conn = get_db()
+    applied = []
+    try:
+        if _current_version(conn) >= MIGRATIONS[-1][0]:
+            return applied
+        for version, name, fn in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-checked under the write lock in case another process got here first
+                if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                    conn.rollback()
+                    continue
+                start = time.monotonic()
+                fn(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at, duration_ms) VALUES (?, ?, ?, ?)",
+                    (version, name, datetime.now(timezone.utc).isoformat(),
+                     round((time.monotonic() - start) * 1000, 1)),
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied.append(name)
+    finally:
+        conn.close()
+    if applied:
+        from logging_service import log_info
+        log_info("system", "migrate", f"Applied migrations: {', '.join(applied)}")
+    return applied
+
+
+def status() -> list[dict]:
+    """Every known migration with when it was applied (None if pending)."""
+    conn = get_db()
+    try:
+        _current_version(conn)
+        done = {r["version"]: r["applied_at"] for r in conn.execute("SELECT version, applied_at FROM schema_version")}
+    finally:
+        conn.close()
+    return [{"version": v, "name": n, "applied_at": done.get(v)} for v, n, _ in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    if "--status" not in sys.argv:
+        applied = migrate()
+        print(f"Applied {len(applied)} migration(s).")
+    for m in status():
+        print(f"  {m['version']:>3}  {m['name']:<36} {m['applied_at'] or 'pending'}")
@@ -0,0 +1,237 @@
+"""Retention — ages out rows from the tables that otherwise grow forever.
+
+  logs              — archived after RETENTION_LOGS_DAYS
+  chat_contexts     — archived after RETENTION_CHAT_CONTEXTS_DAYS
+                      (session_meta rows, one per live session, are kept)
+  discord_schedules — deleted after RETENTION_DISCORD_SCHEDULES_DAYS
+                      (pings still waiting to be sent are kept)
+
+Expired sessions are swept separately and more often (auth.sweep_expired_sessions).
+
+Archived rows are zlib-compressed into the archive database
+(DB_ARCHIVE_PATH), attached only while a run or an admin lookup needs it.
+
+Ids grow with created_at, so a run walks each table from its oldest id in
+batches of RETENTION_BATCH_SIZE and stops at the first row newer than the
+cutoff — no index on created_at needed. Each batch is one short delete on
+the writer queue with a pause in between, so chat writes never wait long
+behind a cleanup. The report includes how many bytes the deletes freed.
+"""
+
+import asyncio
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    RETENTION_LOGS_DAYS, RETENTION_CHAT_CONTEXTS_DAYS,
+    RETENTION_DISCORD_SCHEDULES_DAYS, RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE_MS,
+    RETENTION_INTERVAL_HOURS,
+)
+from database import (
+    Row, attached_archive, connection_scope, execute, incremental_vacuum, query_all, query_one,
+    decode_json,
+)
+from logging_service import log_info, log_error
+
+_ARCHIVE_DDL = """
+    CREATE TABLE IF NOT EXISTS archive.{table} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        data BLOB NOT NULL,
+        created_at TEXT,
+        updated_at TEXT,
+        archived_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS archive.idx_{table}_user_id ON {table} (user_id);
+"""
+
+ARCHIVED_TABLES = ("logs", "chat_contexts")
+
+_run_lock = threading.Lock()
+_last_report: dict | None = None
+
+
+def _unsent_ping(data: dict, now: str) -> bool:
+    return data.get("type") == "ping" and not data.get("sent") and (data.get("send_at") or "") > now
+
+
+def _policies(now: datetime) -> list[dict]:
+    """One entry per enabled table: walk rows created before `cutoff`, remove those `expired` accepts."""
+    now_iso = now.isoformat()
+    policies = []
+    if RETENTION_LOGS_DAYS > 0:
+        policies.append({"table": "logs", "archive": True,
+                         "cutoff": now - timedelta(days=RETENTION_LOGS_DAYS)})
+    if RETENTION_CHAT_CONTEXTS_DAYS > 0:
+        policies.append({"table": "chat_contexts", "archive": True,
+                         "cutoff": now - timedelta(days=RETENTION_CHAT_CONTEXTS_DAYS),
+                         "expired": lambda d: d.get("role") != "session_meta"})
+    if RETENTION_DISCORD_SCHEDULES_DAYS > 0:
+        policies.append({"table": "discord_schedules", "archive": False,
+                         "cutoff": now - timedelta(days=RETENTION_DISCORD_SCHEDULES_DAYS),
+                         "expired": lambda d: not _unsent_ping(d, now_iso)})
+    return policies
+
+
+def _page_stats() -> dict:
+    row = query_one("SELECT page_size, page_count, freelist_count FROM "
+                    "pragma_page_size(), pragma_page_count(), pragma_freelist_count()")
+    return {"page_size": row[0], "page_count": row[1], "freelist_count": row[2]}
+
+
+def _archive(table: str, rows: list[dict]) -> tuple[int, int]:
+    """Copy rows into archive.<table>, compressed. Returns (raw bytes, stored bytes)."""
+    archived_at = datetime.now(timezone.utc).isoformat()
+    values, raw_bytes, stored_bytes = [], 0, 0
+    for r in rows:
+        raw = r["raw"].encode() if isinstance(r["raw"], str) else r["raw"]
+        blob = zlib.compress(raw, 6)
+        raw_bytes += len(raw)
+        stored_bytes += len(blob)
+        values.append((r["id"], r["user_id"], blob, r["created_at"], r["updated_at"], archived_at))
+    with attached_archive() as conn:
+        conn.executescript(_ARCHIVE_DDL.format(table=table))
+        # INSERT OR IGNORE: a batch re-archived after a crash between the
+        # archive commit and the main delete is a no-op
+        conn.executemany(
+            f"INSERT OR IGNORE INTO archive.{table} "
+            "(id, user_id, data, created_at, updated_at, archived_at) VALUES (?, ?, ?, ?, ?, ?)",
+            values,
+        )
+        conn.commit()
+    return raw_bytes, stored_bytes
+
+
+def _sweep(policy: dict, dry_run: bool) -> dict:
+    table, cutoff = policy["table"], policy["cutoff"].isoformat()
+    expired = policy.get("expired")
+    result = {"scanned": 0, "removed": 0, "archived": 0, "raw_bytes": 0, "archived_bytes": 0, "batches": 0}
+    after_id = 0
+    while True:
+        rows = query_all(
+            f"SELECT id, user_id, data, created_at, updated_at FROM {table} "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, RETENTION_BATCH_SIZE),
+        )
+        batch, reached_cutoff = [], False
+        for row in rows:
+            if (row["created_at"] or "") >= cutoff:
+                reached_cutoff = True
+                break
+            after_id = row["id"]
+            result["scanned"] += 1
+            if expired is None or expired(decode_json(row["data"])):
+                batch.append({"id": row["id"], "user_id": row["user_id"], "raw": row["data"],
+                              "created_at": row["created_at"], "updated_at": row["updated_at"]})
+        if batch and not dry_run:
+            if policy["archive"]:
+                raw_bytes, stored_bytes = _archive(table, batch)
+                result["archived"] += len(batch)
+                result["raw_bytes"] += raw_bytes
+                result["archived_bytes"] += stored_bytes
+            ids = [r["id"] for r in batch]
+            result["removed"] += execute(
+                f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids
+            )
+            result["batches"] += 1
+            time.sleep(RETENTION_BATCH_PAUSE_MS / 1000)
+        elif batch:
+            result["removed"] += len(batch)
+        if reached_cutoff or len(rows) < RETENTION_BATCH_SIZE:
+            return result
+
+
+def run_retention(dry_run: bool = False) -> dict:
+    """Run every table's policy once and return a report. Concurrent calls are skipped."""
+    global _last_report
+    if not _run_lock.acquire(blocking=False):
+        return {"skipped": "a retention run is already in progress"}
+    try:
+        start = time.monotonic()
+        now = datetime.now(timezone.utc)
+        with connection_scope():
+            before = _page_stats()
+            tables = {p["table"]: _sweep(p, dry_run) for p in _policies(now)}
+            vacuumed = False
+            if not dry_run and query_one("PRAGMA auto_vacuum")[0] == 2:
+                # Incremental mode: return the freed pages to the filesystem
+                incremental_vacuum()
+                vacuumed = True
+            after = _page_stats()
+        page_size = before["page_size"]
+        freed_pages = ((before["page_count"] - after["page_count"])
+                       + (after["freelist_count"] - before["freelist_count"]))
+        report = {
+            "dry_run": dry_run,
+            "started_at": now.isoformat(),
+            "duration_ms": round((time.monotonic() - start) * 1000, 1),
+            "tables": tables,
+            "bytes_reclaimed": max(freed_pages, 0) * page_size,
+            "bytes_returned_to_fs": max(before["page_count"] - after["page_count"], 0) * page_size,
+            "incremental_vacuum": vacuumed,
+            "db_bytes": after["page_count"] * page_size,
+        }
+        if not dry_run:
+            _last_report = report
+            removed = sum(t["removed"] for t in tables.values())
+            log_info("system", "retention", f"Removed {removed} rows, reclaimed {report['bytes_reclaimed']} bytes",
+                     details=report)
+        return report
+    finally:
+        _run_lock.release()
+
+
+def retention_stats() -> dict:
+    """Policy settings plus the last completed run, for the admin metrics endpoint."""
+    return {
+        "days": {
+            "logs": RETENTION_LOGS_DAYS,
+            "chat_contexts": RETENTION_CHAT_CONTEXTS_DAYS,
+            "discord_schedules": RETENTION_DISCORD_SCHEDULES_DAYS,
+        },
+        "interval_hours": RETENTION_INTERVAL_HOURS,
+        "running": _run_lock.locked(),
+        "last_run": _last_report,
+    }
+
+
+def get_archived_rows(table: str, user_id: int | None = None, before_id: int | None = None,
+                      limit: int = 50) -> list[dict]:
+    """Newest-first archived rows, shaped like get_rows() results."""
+    if table not in ARCHIVED_TABLES:
+        raise ValueError(f"Unknown archive table '{table}'. Valid: {list(ARCHIVED_TABLES)}")
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    with attached_archive() as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if not exists:
+            return []
+        rows = conn.execute(
+            f"SELECT id, data, created_at, updated_at FROM archive.{table}{where} ORDER BY id DESC LIMIT ?",
+            [*params, limit],
+        ).fetchall()
+    return [Row({"id": r["id"], "created_at": r["created_at"], "updated_at": r["updated_at"]},
+                zlib.decompress(r["data"]).decode()) for r in rows]
+
+
+async def retention_loop():
+    """Background task: first run shortly after startup, then every RETENTION_INTERVAL_HOURS."""
+    await asyncio.sleep(60)
+    while True:
+        try:
+            # Default executor, not run_db: a run paces itself with sleeps
+            # and shouldn't hold a DB worker for its whole duration
+            await asyncio.to_thread(run_retention)
+        except Exception as e:
+            log_error("system", "retention", f"Retention run failed: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_HOURS * 3600)
@@ -0,0 +1,134 @@
+"""
+Benchmark: event-loop lag under concurrent chat streams.
+
+Simulates N concurrent streaming chats doing the DB work an async route does
+per turn (session lookup, user message insert, history read, assistant insert,
+log row) while a background writer keeps the WAL busy and checkpoints it.
+A monitor task measures how late the event loop wakes up from short sleeps.
+
+Runs twice against a throwaway database:
+  sync      — helpers called directly on the event loop (previous behaviour)
+  executor  — helpers awaited through run_db() on the DB executor
+
+No server needed. Run with:
+  cd backend && venv/bin/python3 tests/bench_event_loop_lag.py [streams] [turns]
+"""
+
+import os
+import sys
+import asyncio
+import statistics
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_loop_lag_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database import init_db, insert_row, query_all, get_db, run_db, _row_to_dict  # noqa: E402
+from auth import create_session, get_session_user  # noqa: E402
+from logging_service import log_info  # noqa: E402
+
+STREAMS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TURNS = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+TICK = 0.005
+
+
+def setup() -> list[str]:
+    init_db()
+    tokens = []
+    for i in range(STREAMS):
+        uid = insert_row("users", {"username": f"bench{i}", "timezone": "UTC"})
+        tokens.append(create_session(uid))
+        for j in range(50):
+            insert_row("chat_contexts", {"user_id": uid, "session_id": "default",
+                                         "role": "user", "content": f"history {j} " * 20})
+    return tokens
+
+
+def turn(token: str, n: int):
+    """One chat turn's worth of DB work (mirrors chat_stream + _run_core)."""
+    user = get_session_user(token)
+    uid = user["id"]
+    insert_row("chat_contexts", {"user_id": uid, "session_id": "default", "role": "user", "content": f"msg {n}"})
+    rows = query_all("""
+        SELECT id, data, created_at, updated_at FROM chat_contexts
+        WHERE user_id = ? AND session_id = ? AND role != 'session_meta'
+        ORDER BY id DESC LIMIT 40
+    """, (uid, "default"))
+    [_row_to_dict(r) for r in rows]
+    insert_row("chat_contexts", {"user_id": uid, "session_id": "default", "role": "assistant", "content": "ok " * 100})
+    log_info("chat", "stream", "bench turn", user_id=uid)
+
+
+def background_writer(stop: threading.Event):
+    """Keeps the WAL growing and periodically forces a full checkpoint."""
+    conn = get_db()
+    payload = "x" * 4000
+    try:
+        while not stop.is_set():
+            for _ in range(200):
+                conn.execute("INSERT INTO logs (data, created_at, updated_at) VALUES (json_object('blob', ?), '', '')",
+                             (payload,))
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            time.sleep(0.02)
+    finally:
+        conn.close()
+
+
+async def monitor(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - start - TICK) * 1000)
+
+
+async def stream(token: str, mode: str):
+    for n in range(TURNS):
+        if mode == "sync":
+            turn(token, n)
+        else:
+            await run_db(turn, token, n)
+        await asyncio.sleep(0.002)  # token streaming gap
+
+
+async def run_mode(mode: str, tokens: list[str]) -> dict:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    writer_stop = threading.Event()
+    writer = threading.Thread(target=background_writer, args=(writer_stop,), daemon=True)
+    writer.start()
+    mon = asyncio.create_task(monitor(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(stream(t, mode) for t in tokens))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await mon
+    writer_stop.set()
+    writer.join()
+    lags.sort()
+    return {
+        "turns/s": round(STREAMS * TURNS / elapsed, 1),
+        "lag_p50_ms": round(statistics.median(lags), 2),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1], 2),
+        "lag_max_ms": round(lags[-1], 2),
+        "samples": len(lags),
+    }
+
+
+def main():
+    print(f"\n  Event-loop lag: {STREAMS} concurrent streams x {TURNS} turns  (db: {os.environ['DB_PATH']})")
+    tokens = setup()
+    results = {mode: asyncio.run(run_mode(mode, tokens)) for mode in ("sync", "executor")}
+    print(f"\n  {'mode':<10}" + "".join(f"{k:>14}" for k in results["sync"]))
+    for mode, r in results.items():
+        print(f"  {mode:<10}" + "".join(f"{v:>14}" for v in r.values()))
+    before, after = results["sync"]["lag_p99_ms"], results["executor"]["lag_p99_ms"]
+    print(f"\n  p99 lag: {before}ms -> {after}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Microbenchmark: row JSON codec (stdlib json vs orjson) and lazy vs eager row decode.
+
+Uses realistic row shapes:
+  chat_context — assistant turn with a context_log (system prompt, messages,
+                 tool calls with JSON results), ~30 KB
+  user         — user record carrying an aspirational_image_b64 (~400 KB)
+  task         — small one-time task (~300 B)
+
+For each shape it times encode and decode with both codecs, then times
+fetching rows through get_rows() when callers only read ids (lazy rows skip
+the decode) versus when they read data.
+
+No server needed. Run with:
+  cd backend && venv/bin/python3 tests/bench_json_codec.py [iterations]
+"""
+
+import os
+import sys
+import base64
+import json
+import random
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench_json_codec_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database  # noqa: E402
+from database import init_db, insert_rows, get_rows  # noqa: E402
+
+ITER = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+random.seed(7)
+
+
+def _words(n):
+    vocab = ["focus", "energy", "habit", "run", "sleep", "plan", "review", "goal", "task", "week", "morning"]
+    return " ".join(random.choice(vocab) for _ in range(n))
+
+
+def chat_context_row():
+    tasks = [{"id": i, "title": _words(5), "deadline": None, "estimated_minutes": 30,
+              "cognitive_load": 5, "life_goal_ids": [1, 2]} for i in range(25)]
+    log = [{"type": "system", "agent": "helium", "content": _words(900)}]
+    for i in range(12):
+        log.append({"type": "human" if i % 2 == 0 else "ai", "agent": "helium", "content": _words(60)})
+    for name in ("get_tasks", "get_habit_progress", "create_todo_list"):
+        log.append({"type": "tool_call", "name": name, "agent": "helium",
+                    "args": {"date": "2026-10-18", "items": tasks[:5]}, "result": json.dumps(tasks)})
+    return {"user_id": 1, "session_id": "default", "role": "assistant",
+            "content": _words(120), "context_log": log, "agent": "helium"}
+
+
+def user_row():
+    return {"username": "bench", "email": "bench@example.com", "display_name": "Bench",
+            "password_hash": "$2b$12$" + "x" * 53, "is_admin": False, "openai_api_key": None,
+            "theme": "dark", "settings": {"notifications": True}, "timezone": "America/New_York",
+            "aspirational_image_b64": base64.b64encode(random.randbytes(300_000)).decode()}
+
+
+def task_row():
+    return {"user_id": 1, "title": _words(6), "description": _words(20), "deadline": None,
+            "estimated_minutes": 25, "cognitive_load": 4, "life_goal_ids": [3],
+            "completed": False, "completed_at": None, "from_recurring_id": None}
+
+
+def timeit(fn, n=ITER):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6  # µs per call
+
+
+def bench_codecs():
+    print(f"\n  Codec: µs per row ({ITER} iterations)")
+    print(f"  {'row':<14}{'size':>10}{'json enc':>12}{'orjson enc':>12}{'json dec':>12}{'orjson dec':>12}")
+    orjson = database.orjson
+    for name, make in (("chat_context", chat_context_row), ("user", user_row), ("task", task_row)):
+        value = make()
+        text = json.dumps(value)
+        cols = [timeit(lambda: json.dumps(value))]
+        cols.append(timeit(lambda: orjson.dumps(value).decode()) if orjson else float("nan"))
+        cols.append(timeit(lambda: json.loads(text)))
+        cols.append(timeit(lambda: orjson.loads(text)) if orjson else float("nan"))
+        print(f"  {name:<14}{len(text):>10}" + "".join(f"{c:>12.1f}" for c in cols))
+
+
+def bench_lazy_rows():
+    init_db()
+    insert_rows("chat_contexts", [chat_context_row() for _ in range(100)])
+    n = max(ITER // 10, 5)
+
+    def ids_only():
+        return [r["id"] for r in get_rows("chat_contexts", limit=100)]
+
+    def with_data():
+        return [r["data"]["role"] for r in get_rows("chat_contexts", limit=100)]
+
+    def eager():
+        # previous behaviour: decode every row at fetch time
+        return [{**dict(r.items())} for r in get_rows("chat_contexts", limit=100)]
+
+    print(f"\n  get_rows(chat_contexts, limit=100): ms per call ({n} iterations, codec={'orjson' if database._USE_ORJSON else 'json'})")
+    print(f"  {'eager decode':<28}{timeit(eager, n) / 1000:>10.2f}")
+    print(f"  {'lazy, ids only':<28}{timeit(ids_only, n) / 1000:>10.2f}")
+    print(f"  {'lazy, data accessed':<28}{timeit(with_data, n) / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    bench_codecs()
+    bench_lazy_rows()
@@ -0,0 +1,114 @@
+"""
+Benchmark: login throughput vs chat latency under mixed load.
+
+Drives the app in-process (httpx ASGITransport) with LOGINS concurrent
+clients hammering POST /api/auth/login while CHATS clients page through
+GET /api/chat/history, and reports login throughput, 429s and the chat
+request latency distribution.
+
+Runs each mode in its own process against a throwaway database:
+  inline — bcrypt on the shared request threadpool (previous behaviour)
+  pool   — bcrypt on the bounded password pool (PASSWORD_WORKERS /
+           PASSWORD_QUEUE_MAX), 429 + Retry-After when saturated
+
+No server needed. Run with:
+  cd backend && venv/bin/python3 tests/bench_password_pool.py [logins] [chats] [seconds]
+"""
+
+import os
+import sys
+import asyncio
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else 16
+CHATS = int(sys.argv[2]) if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else 8
+SECONDS = float(sys.argv[3]) if len(sys.argv) > 3 and not sys.argv[3].startswith("--") else 10
+
+
+def run_mode(mode: str) -> dict:
+    _tmp = tempfile.mkdtemp(prefix="bench_password_pool_")
+    os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+    os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+    sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+    import anyio
+    import httpx
+    import main
+    import auth
+    import api.auth_routes as auth_routes
+    from database import init_db, insert_rows
+
+    if mode == "inline":
+        # What a sync def endpoint did: bcrypt on the shared anyio threadpool
+        async def verify_inline(password, password_hash):
+            return await anyio.to_thread.run_sync(auth.verify_password, password, password_hash)
+        auth_routes.verify_password_async = verify_inline
+
+    init_db()
+    main.seed_admin()
+    user_id = main.insert_row("users", {"username": "chatter", "timezone": "UTC"})
+    insert_rows("chat_contexts", [{"user_id": user_id, "session_id": "default", "role": "user",
+                                   "content": f"message {i} " * 20} for i in range(100)])
+    token = auth.create_session(user_id)
+
+    logins = {"ok": 0, "rejected": 0}
+    chat_ms: list[float] = []
+
+    async def login_client(client, stop):
+        while time.monotonic() < stop:
+            r = await client.post("/api/auth/login", json={"username": main.ADMIN_USERNAME,
+                                                           "password": main.ADMIN_PASSWORD})
+            if r.status_code == 429:
+                logins["rejected"] += 1
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+            else:
+                logins["ok"] += 1
+
+    async def chat_client(client, stop):
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            r = await client.get("/api/chat/history", cookies={"session_token": token})
+            r.raise_for_status()
+            chat_ms.append((time.perf_counter() - start) * 1000)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stop = time.monotonic() + SECONDS
+            await asyncio.gather(*[login_client(client, stop) for _ in range(LOGINS)],
+                                 *[chat_client(client, stop) for _ in range(CHATS)])
+
+    asyncio.run(run())
+    chat_ms.sort()
+    pct = lambda p: chat_ms[min(int(len(chat_ms) * p), len(chat_ms) - 1)]  # noqa: E731
+    return {
+        "mode": mode,
+        "logins_per_s": logins["ok"] / SECONDS,
+        "rejected": logins["rejected"],
+        "chat_per_s": len(chat_ms) / SECONDS,
+        "chat_p50": statistics.median(chat_ms),
+        "chat_p95": pct(0.95),
+        "chat_p99": pct(0.99),
+        "chat_max": chat_ms[-1],
+    }
+
+
+if __name__ == "__main__":
+    if "--mode" in sys.argv:
+        print(json.dumps(run_mode(sys.argv[sys.argv.index("--mode") + 1])))
+        sys.exit(0)
+
+    print(f"\n  {LOGINS} login clients + {CHATS} chat clients for {SECONDS:.0f}s per mode, {os.cpu_count()} CPU(s)")
+    results = []
+    for mode in ("inline", "pool"):
+        out = subprocess.run([sys.executable, __file__, str(LOGINS), str(CHATS), str(SECONDS), "--mode", mode],
+                             capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    print(f"\n  {'mode':<8}{'logins/s':>10}{'429s':>7}{'chat/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for r in results:
+        print(f"  {r['mode']:<8}{r['logins_per_s']:>10.1f}{r['rejected']:>7}{r['chat_per_s']:>9.1f}"
+              f"{r['chat_p50']:>9.1f}{r['chat_p95']:>9.1f}{r['chat_p99']:>9.1f}{r['chat_max']:>9.1f}")
@@ -0,0 +1,107 @@
+"""
+Benchmark: agent context prefetch (the DB work before a turn's first LLM call).
+
+Seeds one user with a realistic amount of data, then times loading the six
+context entries an agent prompt needs, the way a turn does it:
+  threads  — previous behaviour: a fresh ThreadPoolExecutor per turn, one
+             fetcher per worker, each borrowing its own pooled connection
+  snapshot — graph.prefetch_context on a cold cache: the turn's connection,
+             one read transaction, fetchers run back to back
+  cached   — graph.prefetch_context with the user's context already cached
+             and unchanged (every turn after the first): one version read
+
+Each mode runs idle and with a background writer inserting logs rows, the
+usual state of a live server.
+
+No server needed. Run with:
+  cd backend && venv/bin/python3 tests/bench_prefetch.py [iterations]
+"""
+
+import os
+import sys
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmp = tempfile.mkdtemp(prefix="bench_prefetch_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database import init_db, insert_row, insert_rows, connection_scope  # noqa: E402
+from agents.graph import PREFETCH, prefetch_context  # noqa: E402
+from agents import user_context  # noqa: E402
+
+ITER = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+
+def seed() -> int:
+    init_db()
+    user_id = insert_row("users", {"username": "bench", "timezone": "UTC"})
+    insert_rows("life_goals", [{"user_id": user_id, "title": f"Goal {i}", "description": "x" * 200,
+                                "priority": 5, "stress": 5, "status": "active"} for i in range(12)])
+    insert_rows("user_states", [{"user_id": user_id, "energy": 6, "soreness": 2, "sickness": 0,
+                                 "notes": "fine"} for _ in range(60)])
+    insert_rows("one_time_tasks", [{"user_id": user_id, "title": f"Task {i}", "completed": i % 3 == 0,
+                                    "estimated_minutes": 30, "cognitive_load": 5} for i in range(300)])
+    insert_rows("recurring_tasks", [{"user_id": user_id, "title": f"Habit {i}", "active": True,
+                                     "frequency": "daily"} for i in range(25)])
+    insert_rows("todo_lists", [{"user_id": user_id, "date": f"2026-09-{d:02d}", "items": []} for d in range(1, 29)])
+    insert_rows("journal_entries", [{"user_id": user_id, "what_worked": "x" * 100, "what_discouraged": "y" * 100}
+                                    for _ in range(40)])
+    insert_rows("weekly_reviews", [{"user_id": user_id, "summary": "z" * 500} for _ in range(8)])
+    return user_id
+
+
+def prefetch_threads(user_id: int) -> dict:
+    with ThreadPoolExecutor(max_workers=len(PREFETCH)) as pool:
+        futures = {k: pool.submit(fn, user_id) for k, fn in PREFETCH.items()}
+        return {k: f.result() for k, f in futures.items()}
+
+
+def prefetch_snapshot(user_id: int) -> dict:
+    user_context.clear(user_id)
+    with connection_scope():
+        return prefetch_context(user_id)
+
+
+def prefetch_cached(user_id: int) -> dict:
+    with connection_scope():
+        return prefetch_context(user_id)
+
+
+def measure(fn, user_id: int) -> list[float]:
+    fn(user_id)  # warm up
+    samples = []
+    for _ in range(ITER):
+        start = time.perf_counter()
+        fn(user_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)
+
+
+def background_writer(stop: threading.Event):
+    while not stop.is_set():
+        insert_row("logs", {"level": "info", "source": "bench", "message": "tick"})
+        time.sleep(0.002)
+
+
+if __name__ == "__main__":
+    user_id = seed()
+    assert prefetch_threads(user_id).keys() == prefetch_snapshot(user_id).keys()
+    print(f"\n  Context prefetch: ms per turn ({ITER} iterations)")
+    print(f"  {'mode':<10}{'load':<8}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for load in ("idle", "writes"):
+        stop = threading.Event()
+        writer = threading.Thread(target=background_writer, args=(stop,), daemon=True)
+        if load == "writes":
+            writer.start()
+        for name, fn in (("threads", prefetch_threads), ("snapshot", prefetch_snapshot), ("cached", prefetch_cached)):
+            s = measure(fn, user_id)
+            pct = lambda p: s[min(int(len(s) * p), len(s) - 1)]  # noqa: E731
+            print(f"  {name:<10}{load:<8}{statistics.median(s):>8.2f}{pct(0.95):>8.2f}{pct(0.99):>8.2f}{s[-1]:>8.2f}")
+        stop.set()
+        if load == "writes":
+            writer.join()
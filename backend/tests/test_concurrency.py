@@ -0,0 +1,217 @@
+"""
+Concurrency behaviour test: agent pool admission, turn queue coalescing and
+the database writer's group commit.
+
+  admission — with every worker busy, waiting turns start interactive first,
+              a full queue or an expired wait is refused with a 429 and a
+              Retry-After, and a caller that goes away keeps its worker busy
+              until the thread actually finishes
+  coalesce  — messages that queue behind a running turn are merged into one
+              turn (AGENT_COALESCE_MESSAGES), or run one by one in order;
+              deferred work (history compaction) runs between turns
+  writer    — concurrent helper writes share commits, a failing op doesn't
+              fail its batch, and a dead writer thread is replaced
+
+No server or model needed. Run with:
+  cd backend && venv/bin/python3 tests/test_concurrency.py
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+_tmp = tempfile.mkdtemp(prefix="test_concurrency_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "concurrency.db")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+os.environ["AGENT_WORKERS"] = "2"
+os.environ["AGENT_QUEUE_MAX"] = "2"
+os.environ["AGENT_QUEUE_TIMEOUT_S"] = "0.3"
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import HTTPException  # noqa: E402
+
+import database  # noqa: E402
+from agents import executor  # noqa: E402
+from agents.executor import run_agent_job, agent_executor_stats  # noqa: E402
+from agents.turn_queue import TurnQueue  # noqa: E402
+
+
+def check(condition, label):
+    status = "PASS" if condition else "FAIL"
+    print(f"  [{status}] {label}")
+    if not condition:
+        sys.exit(1)
+
+
+# ── Agent pool admission ──────────────────────────────────────────────────────
+
+async def test_admission():
+    release = threading.Event()
+    started = []
+
+    def turn(name):
+        started.append(name)
+        release.wait(5)
+        return name
+
+    # Fill both workers, then queue background before interactive
+    busy = [asyncio.create_task(run_agent_job(turn, f"busy{i}")) for i in range(2)]
+    await asyncio.sleep(0.05)
+    background = asyncio.create_task(run_agent_job(turn, "background", priority="background"))
+    await asyncio.sleep(0.01)
+    interactive = asyncio.create_task(run_agent_job(turn, "interactive"))
+    await asyncio.sleep(0.01)
+    check(agent_executor_stats()["waiting"] == 2, "two turns wait while both workers are busy")
+
+    try:
+        await run_agent_job(turn, "overflow")
+        refused = None
+    except HTTPException as e:
+        refused = e
+    check(refused is not None and refused.status_code == 429, "a full queue refuses with 429")
+    check(int(refused.headers["Retry-After"]) >= 1, "429 carries a Retry-After estimate")
+
+    release.set()
+    await asyncio.gather(*busy, background, interactive)
+    check(started.index("interactive") < started.index("background"), "interactive turn starts before background")
+
+    # An interactive wait that outlives AGENT_QUEUE_TIMEOUT_S is refused
+    release.clear()
+    busy = [asyncio.create_task(run_agent_job(turn, f"busy{i}")) for i in range(2)]
+    await asyncio.sleep(0.05)
+    try:
+        await run_agent_job(turn, "late")
+        timed_out = False
+    except HTTPException as e:
+        timed_out = e.status_code == 429
+    check(timed_out, "a wait past the deadline is refused with 429")
+    release.set()
+    await asyncio.gather(*busy)
+
+    # A caller that goes away doesn't free its worker while the thread runs
+    release.clear()
+    job = asyncio.create_task(run_agent_job(turn, "abandoned"))
+    await asyncio.sleep(0.05)
+    job.cancel()
+    await asyncio.sleep(0.05)
+    check(executor._running == 1, "cancelled caller's worker stays counted while its thread runs")
+    release.set()
+    for _ in range(50):
+        if executor._running == 0:
+            break
+        await asyncio.sleep(0.01)
+    check(executor._running == 0, "worker is released once the thread finishes")
+
+
+# ── Turn queue coalescing ─────────────────────────────────────────────────────
+
+async def test_coalescing():
+    for coalesce in (True, False):
+        queue = TurnQueue(coalesce=coalesce)
+        seen = []
+
+        async def run(message, on_event):
+            seen.append(message)
+            await asyncio.sleep(0.05)
+            return {"response": message}
+
+        key = (1, "default")
+        first = asyncio.create_task(queue.turn(key, "one", run))
+        await asyncio.sleep(0.01)
+        rest = [asyncio.create_task(queue.turn(key, m, run)) for m in ("two", "three")]
+        results = await asyncio.gather(first, *rest)
+        if coalesce:
+            check(seen == ["one", "two\n\nthree"], "queued messages are merged into one turn")
+            check(results[1] is results[2] or results[1] == results[2], "merged callers share one result")
+            check(results[1].get("coalesced") == 2 and "coalesced" not in results[0],
+                  "merged result reports how many messages it covers")
+        else:
+            check(seen == ["one", "two", "three"], "without coalescing, turns run one by one in order")
+        check(queue.stats()["active_sessions"] == 0, "the session's queue is dropped once drained")
+
+    # Deferred work runs after the turn has answered, before the next turn
+    queue = TurnQueue(coalesce=True)
+    order = []
+    key = (1, "default")
+
+    async def deferred():
+        await asyncio.sleep(0.05)
+        order.append("deferred")
+
+    queued = asyncio.Event()
+
+    async def first(message, on_event):
+        await queued.wait()
+        queue.defer(key, deferred)
+        return {"response": message}
+
+    async def second(message, on_event):
+        order.append(message)
+        return {"response": message}
+
+    answered = asyncio.create_task(queue.turn(key, "one", first))
+    await asyncio.sleep(0)
+    following = asyncio.create_task(queue.turn(key, "two", second))
+    await asyncio.sleep(0)
+    queued.set()
+    await answered
+    check(order == [], "the turn answers without waiting for its deferred work")
+    await following
+    check(order == ["deferred", "two"], "deferred work runs ahead of the turn already waiting")
+
+
+# ── Writer group commit ───────────────────────────────────────────────────────
+
+def test_writer():
+    database.init_db()
+    before = database.writer_stats()
+    ids, errors = [], []
+
+    def worker(n):
+        for i in range(50):
+            ids.append(database.insert_row("logs", {"source": f"w{n}", "message": str(i)}))
+            if i % 10 == 0:
+                try:
+                    database.execute("INSERT INTO no_such_table VALUES (1)")
+                except sqlite3.OperationalError as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    after = database.writer_stats()
+    commits = (after["commits"] + after["failed_commits"]) - (before["commits"] + before["failed_commits"])
+    ops = after["ops"] - before["ops"]
+    check(len(ids) == 400 and len(set(ids)) == 400, "every concurrent insert gets its own id")
+    check(database.count_rows("logs") >= 400, "every insert is committed")
+    check(len(errors) == 40, "failing ops raise to their own caller")
+    check(commits < ops, f"writes share commits ({ops} ops in {commits} commits)")
+
+    # A writer thread that died is replaced by the next write
+    def fatal(conn):
+        raise SystemExit  # not an Exception: ends the writer thread
+    writer = database._writer["thread"]
+    database._write_queue.put((fatal, Future(), time.monotonic()))
+    writer.join(5)
+    check(not writer.is_alive(), "writer thread is gone")
+    start = time.monotonic()
+    row_id = database.insert_row("logs", {"source": "after", "message": "restart"})
+    check(row_id is not None and time.monotonic() - start < 5, "a dead writer is restarted by the next write")
+    check(database.writer_stats()["restarts"] >= 1, "the restart is counted")
+
+if __name__ == "__main__":
+    print("\n=== Test: concurrency behaviour ===\n")
+    print("Agent pool admission:")
+    asyncio.run(test_admission())
+    print("\nTurn queue coalescing:")
+    asyncio.run(test_coalescing())
+    print("\nWriter group commit:")
+    test_writer()
+    print("\n  All concurrency checks passed.\n")
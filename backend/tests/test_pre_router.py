@@ -0,0 +1,101 @@
+"""
+Pre-router rule test: which messages skip Hydrogen, and where they go.
+
+Runs agents/pre_router.evaluate() over a table of messages and contexts and
+checks each decision. Cases that must fall back to the Hydrogen LLM expect
+None. Also checks agents/handoff.decide(): when a specialist hands back,
+which follow-ups still need Hydrogen. No server, database or model needed.
+Run with:
+  cd backend && venv/bin/python3 tests/test_pre_router.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone, timedelta
+
+_tmp = tempfile.mkdtemp(prefix="test_pre_router_")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agents.pre_router import Rule, evaluate, phrases  # noqa: E402
+from agents.handoff import decide  # noqa: E402
+
+_fresh = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+_stale = (datetime.now(timezone.utc) - timedelta(hours=9)).isoformat()
+
+GOALS = [{"id": 1, "title": "Run a marathon"}]
+FRESH = {"life_goals": GOALS, "recent_states": [{"created_at": _fresh}], "first_message": False}
+STALE_START = {"life_goals": GOALS, "recent_states": [{"created_at": _stale}], "first_message": True}
+NO_GOALS = {"life_goals": [], "recent_states": [], "first_message": True}
+
+# (message, context, expected agent or None for Hydrogen)
+CASES = [
+    # Existing shortcuts
+    ("hi", NO_GOALS, "helium"),
+    ("I'm overwhelmed", NO_GOALS, "helium"),
+    ("hi", STALE_START, "lithium"),
+    ("hi", FRESH, None),
+    # Explicit requests
+    ("Let's do my weekly review", FRESH, "boron"),
+    ("can we review my week?", FRESH, "boron"),
+    ("I want to journal about today", FRESH, "carbon"),
+    ("time for my evening check-in", FRESH, "carbon"),
+    ("log my workout: 5k run", FRESH, "beryllium"),
+    ("log what I ate for lunch", FRESH, "beryllium"),
+    ("add a task to call the dentist", FRESH, "beryllium"),
+    ("mark the laundry task complete", FRESH, "beryllium"),
+    ("I want to update my goals", FRESH, "helium"),
+    ("check my state", FRESH, "lithium"),
+    # Explicit requests beat the stale-state shortcut
+    ("weekly review please", STALE_START, "boron"),
+    # Must reach Hydrogen
+    ("I'm feeling demotivated by all these tasks", FRESH, None),
+    ("I'm overwhelmed", STALE_START, None),
+    ("don't add a task yet", FRESH, None),
+    ("add a task and check in on how I'm feeling", FRESH, None),
+    ("what tasks do I have today?", FRESH, None),
+    ("yes", FRESH, None),
+    ("sounds good, make me a plan", FRESH, None),
+]
+
+
+def check(condition, label):
+    status = "PASS" if condition else "FAIL"
+    print(f"  [{status}] {label}")
+    if not condition:
+        sys.exit(1)
+
+
+print("\n=== Test: deterministic pre-routing ===\n")
+
+for message, context, expected in CASES:
+    decision = evaluate(message, context)
+    check(decision.agent == expected,
+          f"{message!r} -> {expected or 'hydrogen'} (got {decision.agent or 'hydrogen'}: "
+          f"{decision.reason}, {decision.rule})")
+
+print("\nThresholds:")
+custom = [Rule("weak", "boron", 0.7, phrases(r"\bweek\b")), Rule("strong", "carbon", 0.9, phrases(r"\bday\b"))]
+check(evaluate("my week", {}, custom).reason == "below_threshold", "weak match alone falls back")
+check(evaluate("my week", {}, custom, min_confidence=0.6).agent == "boron", "lower threshold accepts it")
+check(evaluate("my day and week", {}, custom).agent == "carbon", "clear winner beats weak runner-up")
+check(evaluate("my day and week", {}, custom, margin=0.3).reason == "ambiguous", "wider margin makes it ambiguous")
+check(evaluate("nothing", {}, custom).reason == "no_match", "no rule matched")
+
+print("\nHandoff follow-ups:")
+READY = {**FRESH, "has_tasks": True}
+HANDOFFS = [
+    # (finished specialist, user's message, context, expected path)
+    ("boron", "weekly review please", READY, "template"),
+    ("carbon", "I want to journal", READY, "template"),
+    ("boron", "weekly review and then add a task", READY, "hydrogen"),
+    ("carbon", "journal time, I'm so overwhelmed", READY, "hydrogen"),
+    ("helium", "set up my goals", {**READY, "has_tasks": False}, "hydrogen"),
+    ("boron", "weekly review please", {**STALE_START, "has_tasks": True}, "hydrogen"),
+]
+for finished, message, context, expected in HANDOFFS:
+    path, reason = decide(finished, message, context)
+    check(path == expected, f"{finished} done on {message!r} -> {expected} (got {path}: {reason})")
+
+print("\n  All pre-routing checks passed.\n")
@@ -0,0 +1,332 @@
+"""
+Query-plan regression suite: no hot query may full-scan a large table.
+
+Seeds a throwaway database at realistic scale, then drives the API routes,
+agent tools, Discord helpers and prompt-snapshot fetches in-process while a
+trace callback records every statement the database layer issues. Each
+distinct statement is then run through EXPLAIN QUERY PLAN; any SCAN of a
+seeded (large) table fails the suite unless it is listed in ALLOWED_SCANS.
+Read statements are also re-executed to report per-query timings.
+
+No server needed. Run with:
+  cd backend && venv/bin/python3 tests/test_query_plans.py
+"""
+
+import os
+import sys
+import json
+import random
+import re
+import tempfile
+import time
+from datetime import datetime, timezone, timedelta
+
+_tmp = tempfile.mkdtemp(prefix="test_query_plans_")
+os.environ["DB_PATH"] = os.path.join(_tmp, "plans.db")
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+os.environ["MAIL_HOST"] = "localhost"  # onboarding email fails fast; DB work still runs
+os.environ["MAIL_PORT"] = "1"
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database  # noqa: E402
+
+# Tables seeded past this size count as large
+LARGE = 1000
+
+# Hot queries that must show up in the capture (guards against the workload
+# silently skipping them)
+EXPECTED = [
+    r"FROM discord_schedules WHERE user_id = \? AND type = \? AND sent_date = \?",
+    r"FROM discord_schedules WHERE user_id = \? AND type = \? AND sent = \? AND send_at <= \?",
+    r"FROM users WHERE discord_user_id = \?",
+    r"FROM users WHERE email = \?",
+    r"AND completed_at >= \? ORDER BY completed_at DESC",
+    r"FROM sessions WHERE json_extract\(data, \?\) = \?",
+    r"FROM chat_contexts WHERE user_id = \? AND session_id != \?",
+    r"FROM sessions WHERE expires_at < \?",
+]
+
+# Whole-table scans that are intended, with the reason
+ALLOWED_SCANS = [
+    # Admin listings page by id: the scan walks the rowid b-tree and stops at LIMIT
+    (r"FROM users\s+ORDER BY id", "admin user list, rowid order + LIMIT"),
+    (r"FROM logs\s+ORDER BY id", "admin log list, rowid order + LIMIT"),
+    (r"^SELECT COUNT\(\*\) FROM \(SELECT \? FROM \w+ LIMIT \?\)$", "approx total, count stops at the cap"),
+    (r"^SELECT COUNT\(\*\) FROM users$", "admin exact user total"),
+    # Data migrations run once per database (migrations.py), not per boot
+    (r"^UPDATE chat_contexts SET data = json_set\(data, \?, \?\)", "one-off migration"),
+    (r"FROM one_time_tasks WHERE completed = \? AND completed_at IS NOT NULL", "one-off migration"),
+]
+
+PASS = "[PASS]"
+FAIL = "[FAIL]"
+
+_results = {"pass": 0, "fail": 0}
+
+
+def check(condition, label):
+    if condition:
+        _results["pass"] += 1
+        print(f"  {PASS} {label}")
+    else:
+        _results["fail"] += 1
+        print(f"  {FAIL} {label}")
+    return condition
+
+
+# ── Statement capture ────────────────────────────────────────────────────────
+
+_captured: dict[str, str] = {}   # normalized sql -> one concrete (expanded) statement
+_capturing = {"on": False}
+_original_connect = database._connect
+
+
+def _traced_connect():
+    conn = _original_connect()
+
+    def trace(sql):
+        if not _capturing["on"]:
+            return
+        stripped = sql.strip()
+        if not re.match(r"(?is)^(SELECT|UPDATE|DELETE|INSERT)\b", stripped):
+            return
+        key = re.sub(r"\s+", " ", re.sub(r"'[^']*'|\b\d+(\.\d+)?\b", "?", stripped))
+        _captured.setdefault(key, stripped)
+
+    conn.set_trace_callback(trace)
+    return conn
+
+
+database._connect = _traced_connect
+
+
+# ── Seed ─────────────────────────────────────────────────────────────────────
+
+SIZES = {
+    "users": 3000,
+    "sessions": 6000,
+    "one_time_tasks": 60000,
+    "recurring_tasks": 6000,
+    "todo_lists": 20000,
+    "chat_contexts": 60000,
+    "logs": 60000,
+    "discord_schedules": 20000,
+    "life_goals": 6000,
+    "user_states": 12000,
+    "weekly_reviews": 4000,
+    "journal_entries": 8000,
+}
+
+
+def _iso(days_ago: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+
+def seed():
+    random.seed(11)
+    database.init_db()
+    conn = database.get_db()
+    users = SIZES["users"]
+
+    def rows(table, make):
+        conn.executemany(
+            f"INSERT INTO {table} (data, created_at, updated_at) VALUES (?, ?, ?)",
+            ((json.dumps(d), ts, ts) for d, ts in (make(i) for i in range(SIZES[table]))),
+        )
+
+    uid = lambda: random.randint(1, users)  # noqa: E731
+    rows("users", lambda i: ({
+        "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x",
+        "timezone": random.choice(["UTC", "America/New_York", "Europe/Berlin"]),
+        **({"discord_user_id": str(10**17 + i)} if i % 50 == 0 else {}),
+    }, _iso(400)))
+    rows("sessions", lambda i: ({"user_id": uid(), "session_token": f"tok{i}", "expires_at": _iso(-1)}, _iso(1)))
+    rows("one_time_tasks", lambda i: ({
+        "user_id": uid(), "title": f"task {i}", "completed": i % 3 == 0,
+        "completed_at": _iso(random.random() * 60) if i % 3 == 0 else None,
+        "from_recurring_id": random.randint(1, SIZES["recurring_tasks"]) if i % 2 == 0 else None,
+    }, _iso(random.random() * 90)))
+    rows("recurring_tasks", lambda i: ({"user_id": uid(), "title": f"habit {i}", "active": i % 5 != 0,
+                                        "interval_days": 1, "status": "active"}, _iso(120)))
+    rows("todo_lists", lambda i: ({"user_id": uid(), "date": _iso(i % 365)[:10], "items": []}, _iso(i % 365)))
+    rows("chat_contexts", lambda i: ({
+        "user_id": uid(), "session_id": random.choice(["default", "discord", f"s{i % 7}"]),
+        "role": random.choice(["user", "assistant"]), "content": "hi", "context_log": None,
+    }, _iso(random.random() * 30)))
+    rows("logs", lambda i: ({"user_id": uid(), "level": random.choice(["info", "info", "warn", "error"]),
+                             "source": random.choice(["chat", "system", "auth"]), "event": "e",
+                             "message": "m", "details": {}}, _iso(random.random() * 30)))
+    rows("discord_schedules", lambda i: ({
+        "user_id": uid(), "type": random.choice(["morning", "evening", "ping"]),
+        "sent_date": _iso(i % 60)[:10], "sent": i % 4 != 0, "send_at": _iso(random.random() * 10 - 5),
+        "message": "ping",
+    }, _iso(i % 60)))
+    rows("life_goals", lambda i: ({"user_id": uid(), "title": f"goal {i}", "status": "active"}, _iso(200)))
+    rows("user_states", lambda i: ({"user_id": uid(), "energy": 5}, _iso(random.random() * 60)))
+    rows("weekly_reviews", lambda i: ({"user_id": uid(), "wins": []}, _iso(random.random() * 200)))
+    rows("journal_entries", lambda i: ({"user_id": uid(), "notes": "n"}, _iso(random.random() * 60)))
+    conn.commit()
+    conn.close()
+
+
+# ── Workload ─────────────────────────────────────────────────────────────────
+
+def exercise():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as c:
+        c.post("/api/auth/register", json={"username": "planner", "password": "pw12345678"})
+        me = c.get("/api/users/me").json()
+        user_id = me["id"]
+        today = datetime.now(timezone.utc).date().isoformat()
+
+        c.post("/api/life-goals", json={"title": "Run", "description": "", "priority": 5, "stress": 5}).json()
+        task = c.post("/api/tasks/one-time", json={"title": "x"}).json()
+        habit = c.post("/api/tasks/recurring", json={"title": "run", "interval_days": 1}).json()
+        c.post("/api/user-states", json={"energy": 5})
+        todo_id = database.insert_row("todo_lists", {"user_id": user_id, "date": today, "items": [
+            {"title": "run", "source_type": "recurring", "source_task_id": habit["id"]},
+            {"title": "x", "source_type": "one_time", "source_task_id": task["id"]},
+        ]})
+
+        first = c.get("/api/tasks/one-time", params={"limit": 5}).json()
+        c.get("/api/tasks/one-time", params={"limit": 5, "cursor": first["next_cursor"] or ""})
+        for path in ("/api/tasks/recurring", "/api/user-states", "/api/life-goals", "/api/todo-lists",
+                     f"/api/todo-lists/by-date/{today}", "/api/chat/history", "/api/chat/sessions",
+                     "/api/help/articles", "/api/auth/me", f"/api/tasks/one-time/{task['id']}"):
+            c.get(path)
+        c.put(f"/api/tasks/one-time/{task['id']}", json={"data": {"title": "y"}})
+        c.post(f"/api/todo-lists/{todo_id}/complete-item", json={"item_index": 0})
+        c.post(f"/api/todo-lists/{todo_id}/uncomplete-item", json={"item_index": 0})
+        c.post(f"/api/tasks/recurring/{habit['id']}/complete", json={})
+        c.patch("/api/chat/sessions/s1/rename", json={"name": "Plans"})
+        c.post("/api/discord/schedule", params={"minutes": 5})
+        c.delete("/api/chat/history", params={"session_id": "s1"})
+        c.post("/api/onboarding/claim", json={"email": "user5@example.com", "goal": "g"})
+        c.post("/api/onboarding/claim", json={"email": "new@example.com", "goal": "g"})
+        c.post("/api/auth/request-magic-link", json={"email": "user7@example.com"})
+        c.post("/api/auth/logout")
+
+        c.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        c.get("/api/admin/users")
+        logs = c.get("/api/admin/logs", params={"limit": 50}).json()
+        c.get("/api/admin/logs", params={"limit": 50, "cursor": logs["next_cursor"] or ""})
+        c.get("/api/admin/logs", params={"level": "error", "total": "exact"})
+        c.get("/api/admin/metrics")
+
+        # Background sweeps
+        import auth
+        auth.sweep_expired_sessions()
+
+        # Discord helpers
+        from api import discord_routes as dr
+        import discord_bot
+        # open the send windows so the sent-today lookups run at any wall-clock hour
+        dr.MORNING_HOUR_START, dr.MORNING_HOUR_END = 0, 24
+        dr.EVENING_HOUR_START, dr.EVENING_HOUR_END = 0, 24
+        for u in dr._discord_users()[:3]:
+            dr._should_send_morning(u["id"])
+            dr._should_send_evening(u["id"])
+            dr._due_pings(u["id"])
+            dr._user_local_hour(u["id"])
+            discord_bot._find_user_by_discord_id(u["data"]["discord_user_id"])
+
+        # Prompt snapshot fetches + agent tools
+        from agents import graph
+        from agents.tools import task_tools, todo_tools, review_tools, journal_tools, state_tools, life_goal_tools
+        task_tools.fetch_tasks(user_id)
+        life_goal_tools.fetch_life_goals(user_id)
+        state_tools.fetch_recent_states(user_id)
+        review_tools.fetch_last_weekly_review(user_id)
+        journal_tools.fetch_recent_journal_entries(user_id)
+        graph._fetch_oldest_todo_date(user_id)
+        database.user_today(user_id)
+
+        tools = {t.name: t for t in (
+            task_tools.make_task_tools(user_id) + todo_tools.make_todo_tools(user_id)
+            + review_tools.make_review_tools(user_id) + journal_tools.make_journal_tools(user_id)
+        )}
+        tools["get_habit_progress"].invoke({})
+        tools["get_tasks"].invoke({})
+        tools["complete_recurring_task"].invoke({"task_id": habit["id"]})
+        tools["complete_one_time_task"].invoke({"task_id": task["id"]})
+        tools["get_week_completions"].invoke({})
+        tools["get_week_incomplete"].invoke({})
+        tools["get_completed_tasks_recent"].invoke({})
+        tools["create_todo_list"].invoke({"date": today, "items": "[]"})
+        tools["get_journal_entries"].invoke({})
+
+
+# ── Analysis ─────────────────────────────────────────────────────────────────
+
+def _allowed(sql: str) -> str | None:
+    for pattern, reason in ALLOWED_SCANS:
+        if re.search(pattern, sql):
+            return reason
+    return None
+
+
+def analyze():
+    conn = database.get_db()
+    large = {t for t, n in SIZES.items() if n >= LARGE}
+    report = []
+    try:
+        for key, sql in sorted(_captured.items()):
+            plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+            scans = [
+                d for d in plan
+                if (m := re.match(r"SCAN (\w+)", d)) and m.group(1) in large
+            ]
+            elapsed = None
+            if sql.upper().startswith("SELECT"):
+                start = time.perf_counter()
+                for _ in range(5):
+                    conn.execute(sql).fetchall()
+                elapsed = (time.perf_counter() - start) / 5 * 1000
+            report.append((key, plan, scans, elapsed))
+    finally:
+        conn.close()
+    return report
+
+
+def main():
+    print(f"\n  Seeding {sum(SIZES.values()):,} rows into {os.environ['DB_PATH']}")
+    start = time.perf_counter()
+    seed()
+    print(f"  Seeded in {time.perf_counter() - start:.1f}s")
+
+    _capturing["on"] = True
+    exercise()
+    _capturing["on"] = False
+    print(f"  Captured {len(_captured)} distinct statements\n")
+
+    for pattern in EXPECTED:
+        check(any(re.search(pattern, " ".join(k.split())) for k in _captured), f"captured: {pattern}")
+
+    report = analyze()
+    for key, plan, scans, elapsed in report:
+        label = key if len(key) <= 110 else key[:107] + "..."
+        timing = f"{elapsed:7.2f}ms" if elapsed is not None else "   write "
+        reason = _allowed(key)
+        if scans and reason:
+            print(f"  [ OK ] {timing}  {label}\n           allowed scan: {reason}")
+            _results["pass"] += 1
+        elif scans:
+            check(False, f"{timing}  {label}")
+            for d in plan:
+                print(f"           {d}")
+        else:
+            check(True, f"{timing}  {label}")
+
+    slowest = sorted((r for r in report if r[3] is not None), key=lambda r: -r[3])[:5]
+    print("\n  Slowest reads:")
+    for key, _, _, elapsed in slowest:
+        print(f"    {elapsed:7.2f}ms  {key[:100]}")
+
+    print(f"\n  {_results['pass']} passed, {_results['fail']} failed")
+    sys.exit(1 if _results["fail"] else 0)
+
+
+if __name__ == "__main__":
+    main()